@@ -16,8 +16,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.###
 ###
 
+import os
+import sys
+import math
+import time
+import typing
+
 import bpy
 
+from . import jobs
+from . import rig_cache
+
 
 def property_get_bool(object: bpy.types.Object, property: str) -> bool:
     return bool(object[property])
@@ -31,9 +40,99 @@ def property_set_float(object: bpy.types.Object, property: str, value: bool):
     object[property] = float(value)
 
 
+def iter_selected_armatures(context: bpy.types.Context) -> typing.Iterator[bpy.types.Object]:
+    """Yields armatures to be processed by operators.
+
+    Active armature goes first, followed by other selected armatures,
+    or other armatures in pose mode while in pose mode.
+    """
+    active_object = context.view_layer.objects.active
+    if active_object is not None and active_object.type == 'ARMATURE':
+        yield active_object
+    objects = context.objects_in_mode if context.mode == 'POSE' else context.selected_objects
+    for selected_object in objects:
+        if selected_object.type == 'ARMATURE' and selected_object != active_object:
+            yield selected_object
+
+
+def get_live_link():
+    """Returns live_link module if live link has been used, panel drawing does not import it."""
+    return sys.modules.get(__package__ + '.live_link')
+
+
+class DrawTimer:
+    """Collects statistics of panel draw durations."""
+    __slots__ = ('budget', 'count', 'total', 'worst', 'over_budget')
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.over_budget = 0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.worst = max(self.worst, elapsed)
+        if elapsed > self.budget:
+            self.over_budget += 1
+
+
+# animation panel is expected to draw within 1 ms
+_draw_timer = DrawTimer(budget=0.001)
+
+
 class UE4_TOOLS_ANIMATION_prefs(bpy.types.PropertyGroup):
     """Animation tools preferences."""
-    pass
+    export_path: bpy.props.StringProperty(
+        name='Export path',
+        description='Directory to export FBX files to.',
+        default='//',
+        subtype='DIR_PATH'
+    )
+    export_workers: bpy.props.IntProperty(
+        name='Workers',
+        description='Number of background Blender processes used for export. If set to 0, number of CPUs is used.',
+        default=0,
+        min=0
+    )
+    export_include_mesh: bpy.props.BoolProperty(
+        name='Include mesh',
+        description='If set to True, child meshes of the armature are exported along with each action.',
+        default=False
+    )
+    export_incremental: bpy.props.BoolProperty(
+        name='Skip unchanged',
+        description='If set to True, actions are not exported again if neither they nor exported armature '
+                    'and meshes have changed since previous export to the same directory.',
+        default=True
+    )
+    live_link_host: bpy.props.StringProperty(
+        name='Host',
+        description='Address of the live link endpoint.',
+        default='127.0.0.1'
+    )
+    live_link_port: bpy.props.IntProperty(
+        name='Port',
+        description='Port of the live link endpoint.',
+        default=54321,
+        min=1,
+        max=65535
+    )
+    live_link_transport: bpy.props.EnumProperty(
+        name='Transport',
+        description='Protocol poses are sent over.',
+        items=[
+            ('UDP', 'UDP', 'Lowest latency, lost packets are skipped.'),
+            ('TCP', 'TCP', 'Every packet arrives, endpoint must be listening before streaming starts.'),
+        ],
+        default='UDP'
+    )
 
 
 class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
@@ -44,6 +143,7 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
     bl_space_type = 'VIEW_3D'
 
     def draw(self, context: bpy.types.Context):
+        start = time.perf_counter()
         layout: bpy.types.UILayout = self.layout
         layout.use_property_split = True
 
@@ -54,6 +154,7 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
         if active_object is not None:
             if active_object.type == 'ARMATURE':
                 self.__draw_armature(context, active_object)
+        _draw_timer.add(time.perf_counter() - start)
 
     def __draw_armature(self, context: bpy.types.Context, active_object: bpy.types.Object):
         if context.mode == 'OBJECT':
@@ -62,8 +163,21 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
             self.__draw_armature_in_pose_mode(context, active_object)
 
     def __draw_armature_in_object_mode(self, context: bpy.types.Context, active_object: bpy.types.Object):
-        if 'DeformBones' in active_object.pose.bone_groups:
-            self.layout.label(text='TODO', icon='SCRIPT')
+        state = rig_cache.get_rig_state(active_object)
+        if state.has_deform_bones:
+            prefs = context.scene.ue4_tools_animation
+            self.layout.label(text='Export')
+            self.layout.prop(prefs, 'export_path')
+            self.layout.prop(prefs, 'export_workers')
+            self.layout.prop(prefs, 'export_include_mesh')
+            self.layout.prop(prefs, 'export_incremental')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_retarget.bl_idname, icon='ARMATURE_DATA')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_extract_root_motion.bl_idname, icon='CON_LOCLIKE')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_reduce_keyframes.bl_idname, icon='IPO_LINEAR')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_optimize_weights.bl_idname, icon='MOD_VERTEX_WEIGHT')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_prune_shape_keys.bl_idname, icon='SHAPEKEY_DATA')
+            self.layout.operator(UE4_TOOLS_ANIMATION_OT_export_actions.bl_idname, icon='EXPORT')
+            self.__draw_live_link(context)
         else:
             self.layout.label(text='Incompatible armature', icon='ERROR')
             self.layout.label(text='Selected armature must')
@@ -74,8 +188,9 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
         pass
 
     def __draw_armature_in_pose_mode(self, context: bpy.types.Context, active_object: bpy.types.Object):
+        state = rig_cache.get_rig_state(active_object)
         # check if this is a compatible armature
-        if 'DeformBones' not in active_object.pose.bone_groups:
+        if not state.has_deform_bones:
             self.layout.label(text='Incompatible armature', icon='ERROR')
             self.layout.label(text='Selected armature must')
             self.layout.label(text='have a bone group called')
@@ -106,80 +221,124 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
         # constraints and ik
         self.layout.label(text='Constraints and IK')
         # toggle constraints on/off
-        self.prop_toggle(active_object, 'Constraints_ON_OFF', text='Enable Constraints', icon='CONSTRAINT')
+        self.prop_toggle(state, 'Constraints_ON_OFF', text='Enable Constraints', icon='CONSTRAINT')
         # draw sublayout for ik
-        self.prop_toggle(active_object, 'IKMAIN', text='Enable IK', icon='LINKED', icon_off='UNLINKED')
+        self.prop_toggle(state, 'IKMAIN', text='Enable IK', icon='LINKED', icon_off='UNLINKED')
         layout_ik = self.layout.column()
-        layout_ik.enabled = property_get_bool(active_object, 'IKMAIN')
+        layout_ik.enabled = state.get_bool('IKMAIN')
         # draw sublayout for arms ik
         layout_ik_arms_root = layout_ik.box()
-        self.prop_toggle(active_object, 'IKARMS', text='Enable Arms IK', layout=layout_ik_arms_root, icon='LINKED', icon_off='UNLINKED')
+        self.prop_toggle(state, 'IKARMS', text='Enable Arms IK', layout=layout_ik_arms_root, icon='LINKED', icon_off='UNLINKED')
         layout_ik_arms = layout_ik_arms_root.column()
-        layout_ik_arms.enabled = property_get_bool(active_object, 'IKARMS')
+        layout_ik_arms.enabled = state.get_bool('IKARMS')
         layout_ik_arms_row = layout_ik_arms.row()
         layout_ik_arms_row.use_property_split = False
-        if not property_get_bool(active_object, 'ShowAdvancedProps'):
-            self.prop_toggle(active_object, 'Ik Arm R', text='Arm R', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'IK Arm L', text='Arm L', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
+        if not state.get_bool('ShowAdvancedProps'):
+            self.prop_toggle(state, 'Ik Arm R', text='Arm R', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'IK Arm L', text='Arm L', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
         else:
             layout_ik_arms_row.prop(active_object, '["Ik Arm R"]', text='Arm R', slider=True)
             layout_ik_arms_row.prop(active_object, '["IK Arm L"]', text='Arm L', slider=True)
         layout_ik_arms_row = layout_ik_arms.row()
         layout_ik_arms_row.use_property_split = False
-        if not property_get_bool(active_object, 'ShowAdvancedProps'):
-            self.prop_toggle(active_object, 'Ik hand R Lock', text='Hand R', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'Ik Hand L Lock', text='Hand L', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
+        if not state.get_bool('ShowAdvancedProps'):
+            self.prop_toggle(state, 'Ik hand R Lock', text='Hand R', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'Ik Hand L Lock', text='Hand L', type='float', layout=layout_ik_arms_row, icon='LOCKED', icon_off='UNLOCKED')
         else:
             layout_ik_arms_row.prop(active_object, '["Ik hand R Lock"]', text='Hand R', slider=True)
             layout_ik_arms_row.prop(active_object, '["Ik Hand L Lock"]', text='Hand L', slider=True)
         # draw sublayout for legs ik
         layout_ik_legs_root = layout_ik.box()
-        self.prop_toggle(active_object, 'IKLEGS', text='Enable Legs IK', layout=layout_ik_legs_root, icon='LINKED', icon_off='UNLINKED')
+        self.prop_toggle(state, 'IKLEGS', text='Enable Legs IK', layout=layout_ik_legs_root, icon='LINKED', icon_off='UNLINKED')
         layout_ik_legs = layout_ik_legs_root.column()
-        layout_ik_legs.enabled = property_get_bool(active_object, 'IKLEGS')
+        layout_ik_legs.enabled = state.get_bool('IKLEGS')
         layout_ik_legs_row = layout_ik_legs.row()
         layout_ik_legs_row.use_property_split = False
-        if not property_get_bool(active_object, 'ShowAdvancedProps'):
-            self.prop_toggle(active_object, 'Ik Leg R', text='Leg R', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'Ik Leg L', text='Leg L', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
+        if not state.get_bool('ShowAdvancedProps'):
+            self.prop_toggle(state, 'Ik Leg R', text='Leg R', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'Ik Leg L', text='Leg L', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
         else:
             layout_ik_legs_row.prop(active_object, '["Ik Leg R"]', text='Leg R', slider=True)
             layout_ik_legs_row.prop(active_object, '["Ik Leg L"]', text='Leg L', slider=True)
         layout_ik_legs_row = layout_ik_legs.row()
         layout_ik_legs_row.use_property_split = False
-        if not property_get_bool(active_object, 'ShowAdvancedProps'):
-            self.prop_toggle(active_object, 'Foot Lock R', text='Foot R', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'Foot Lock L', text='Foot L', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
+        if not state.get_bool('ShowAdvancedProps'):
+            self.prop_toggle(state, 'Foot Lock R', text='Foot R', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'Foot Lock L', text='Foot L', type='float', layout=layout_ik_legs_row, icon='LOCKED', icon_off='UNLOCKED')
         else:
             layout_ik_legs_row.prop(active_object, '["Foot Lock R"]', text='Foot R', slider=True)
             layout_ik_legs_row.prop(active_object, '["Foot Lock L"]', text='Foot L', slider=True)
 
+        # bake constraints and ik to deform bones
+        self.layout.operator(UE4_TOOLS_ANIMATION_OT_bake_deform_bones.bl_idname, icon='REC')
+
         # rotation inheritance
         self.layout.label(text='Inherit Rotation')
         layout_rotation = self.layout.column()
         layout_rotation.use_property_split = False
-        if not property_get_bool(active_object, 'ShowAdvancedProps'):
-            self.prop_toggle(active_object, 'Head inherit Rotation', text='Head', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'Arms inherit Rotation', text='Arms', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
-            self.prop_toggle(active_object, 'Waist Inherit Rotation', text='Waist', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
+        if not state.get_bool('ShowAdvancedProps'):
+            self.prop_toggle(state, 'Head inherit Rotation', text='Head', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'Arms inherit Rotation', text='Arms', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
+            self.prop_toggle(state, 'Waist Inherit Rotation', text='Waist', type='float', layout=layout_rotation, icon='LOCKED', icon_off='UNLOCKED')
         else:
             layout_rotation.prop(active_object, '["Head inherit Rotation"]', text='Head', slider=True)
             layout_rotation.prop(active_object, '["Arms inherit Rotation"]', text='Arms', slider=True)
             layout_rotation.prop(active_object, '["Waist Inherit Rotation"]', text='Waist', slider=True)
 
+        if state.has_deform_bones:
+            self.layout.separator()
+            self.__draw_live_link(context)
+
         # advanced view button
         self.layout.separator()
-        self.prop_toggle(active_object, 'ShowAdvancedProps', text='Advanced View', icon='VISIBLE_IPO_ON', icon_off='VISIBLE_IPO_OFF')
+        self.prop_toggle(state, 'ShowAdvancedProps', text='Advanced View', icon='VISIBLE_IPO_ON', icon_off='VISIBLE_IPO_OFF')
+        if state.get_bool('ShowAdvancedProps'):
+            self.layout.label(text='Draw time: %.2f ms avg, %.2f ms max' % (_draw_timer.average * 1000,
+                                                                              _draw_timer.worst * 1000))
+            self.layout.label(text='Over %.1f ms budget: %d of %d' % (_draw_timer.budget * 1000,
+                                                                      _draw_timer.over_budget,
+                                                                      _draw_timer.count))
 
-    def prop_toggle(self, object: bpy.types.Object, property: str, type: str = 'int',
+    def __draw_live_link(self, context: bpy.types.Context):
+        prefs = context.scene.ue4_tools_animation
+        live_link = get_live_link()
+        session = live_link.get_session() if live_link is not None else None
+        receiver = live_link.get_receiver() if live_link is not None else None
+        self.layout.label(text='Live Link')
+        layout_settings = self.layout.column()
+        layout_settings.enabled = session is None and receiver is None
+        layout_settings.prop(prefs, 'live_link_host')
+        layout_settings.prop(prefs, 'live_link_port')
+        layout_settings.prop(prefs, 'live_link_transport')
+        self.layout.operator(UE4_TOOLS_ANIMATION_OT_live_link.bl_idname,
+                             text='Stop Live Link' if session is not None else 'Start Live Link',
+                             icon='LINKED' if session is not None else 'UNLINKED', depress=session is not None)
+        if session is not None:
+            stats = session.sender.stats
+            self.layout.label(text='Sent %.1f fps, %.1f KB/s, %d dropped' % (
+                stats.fps, stats.bytes_per_second / 1024, stats.dropped))
+            if session.sender.error is not None:
+                self.layout.label(text=session.sender.error, icon='ERROR')
+        self.layout.operator(UE4_TOOLS_ANIMATION_OT_live_link_receiver.bl_idname,
+                             text='Stop Test Receiver' if receiver is not None else 'Start Test Receiver',
+                             depress=receiver is not None)
+        if receiver is not None:
+            stats = receiver.stats
+            self.layout.label(text='Received %.1f fps, latency %.2f ms avg, %.2f ms max' % (
+                stats.fps, stats.average_latency * 1000, stats.latency_worst * 1000))
+            if receiver.error is not None:
+                self.layout.label(text=receiver.error, icon='ERROR')
+
+    def prop_toggle(self, state: rig_cache.RigState, property: str, type: str = 'int',
                     text: str = None, icon: str = 'NONE', icon_off=None,
                     layout: bpy.types.UILayout = None):
 
+        enabled = state.get_bool(property)
         operator: bpy.types.OperatorProperties
         operator = (layout or self.layout).operator(UE_TOOLS_ANIMATION_OT_toggle_rig_property.bl_idname,
                                                     text=text or property,
-                                                    emboss=True, depress=property_get_bool(object, property),
-                                                    icon=icon if property_get_bool(object, property) else (icon_off or icon))
+                                                    emboss=True, depress=enabled,
+                                                    icon=icon if enabled else (icon_off or icon))
         operator.property = property
         operator.type = type
 
@@ -187,29 +346,36 @@ class UE4_TOOLS_ANIMATION_PT_main(bpy.types.Panel):
 class UE_TOOLS_ANIMATION_OT_toggle_rig_property(bpy.types.Operator):
     bl_idname = 'ue4_tools_animation.toggle_rig_property'
     bl_label = 'Toggle Rig property'
+    bl_options = {'UNDO'}
 
     property: bpy.props.StringProperty()
     type: bpy.props.StringProperty()
 
     def execute(self, context: bpy.types.Context):
         active_object = context.view_layer.objects.active
-        # toggle property enabled state
-        property_enabled = property_get_bool(active_object, self.property)
-        property_enabled = not property_enabled
+        if self.type not in ('int', 'float'):
+            raise Exception('Unsupported toggle property type: %s' % self.type)
+        # toggle property enabled state of active armature
+        # and set the same state to other selected rigs
+        property_enabled = not property_get_bool(active_object, self.property)
+        for armature_object in iter_selected_armatures(context):
+            if armature_object == active_object or self.property in armature_object.keys():
+                self.__set_property(armature_object, property_enabled)
+        return {'FINISHED'}
+
+    def __set_property(self, armature_object: bpy.types.Object, property_enabled: bool):
         if self.type == 'int':
-            property_set_int(active_object, self.property, property_enabled)
-        elif self.type == 'float':
-            property_set_float(active_object, self.property, property_enabled)
+            property_set_int(armature_object, self.property, property_enabled)
         else:
-            raise Exception('Unsupported toggle property type: %s' % self.type)
+            property_set_float(armature_object, self.property, property_enabled)
+        rig_cache.invalidate_rig_state(armature_object)
         # special callbacks for certain properties
         if self.property == 'IKMAIN':
-            self.__toggle_ikmain(active_object, property_enabled)
+            self.__toggle_ikmain(armature_object, property_enabled)
         if self.property == 'IKARMS':
-            self.__toggle_ikarms(active_object, property_enabled)
+            self.__toggle_ikarms(armature_object, property_enabled)
         if self.property == 'IKLEGS':
-            self.__toggle_iklegs(active_object, property_enabled)
-        return {'FINISHED'}
+            self.__toggle_iklegs(armature_object, property_enabled)
 
     def __toggle_ikmain(self, active_object: bpy.types.Object, property_enabled: bool):
         property_set_int(active_object, 'IKARMS', property_enabled)
@@ -235,20 +401,23 @@ class UE_TOOLS_ANIMATION_OT_toggle_rig_property(bpy.types.Operator):
 
     def __set_bone_group_visibility(self, active_object: bpy.types.Object, bone_group_name: str, visible: bool):
         """ Updates visibility for all bones that are assigned a specified group."""
-        bone_groups = active_object.pose.bone_groups
-        bone_group_index = next((i for i in range(len(bone_groups)) if bone_groups[i].name == bone_group_name), None)
-        if bone_group_index is None:
+        bone_names = rig_cache.get_bone_group_bones(active_object, bone_group_name)
+        if bone_names is None:
             self.report({'ERROR'}, 'Could not find bone group: %s' % bone_group_name)
             return
-        for bone in (bone for bone in active_object.pose.bones if bone.bone_group_index == bone_group_index):
-            # we can only set 'hide' property on EditBone
-            active_object.data.bones[bone.name].hide = not visible
+        bones = active_object.data.bones
+        for bone_name in bone_names:
+            # we can only set 'hide' property on Bone
+            bone = bones.get(bone_name)
+            if bone is not None:
+                bone.hide = not visible
 
 
 class UE4_TOOLS_ANIMATION_OT_add_ue4_rig(bpy.types.Operator):
     bl_idname = 'ue4_tools_animation.add_ue4_rig'
     bl_label = 'Add UE4 Rig'
     bl_description = 'Add rig based on UE4_Mannequin_Skeleton to current scene.'
+    bl_options = {'REGISTER', 'UNDO'}
 
     rig_name: bpy.props.StringProperty(
         name='Rig name',
@@ -265,6 +434,27 @@ class UE4_TOOLS_ANIMATION_OT_add_ue4_rig(bpy.types.Operator):
         description='If set to True, mobile versions of skeleton and mannequin will be used instead.',
         default=False
     )
+    count: bpy.props.IntProperty(
+        name='Number of rigs',
+        description='Number of rigs to add. Rig names are suffixed with a number if more than one rig is added.',
+        default=1,
+        min=1,
+        soft_max=100
+    )
+    share_data: bpy.props.BoolProperty(
+        name='Share rig data?',
+        description='If set to True, added rigs share armature and mesh data with each other. '
+                    'Pose, actions and custom properties are still independent for each rig, '
+                    'but edits to bones or mesh affect all of them.',
+        default=False
+    )
+    spacing: bpy.props.FloatProperty(
+        name='Spacing',
+        description='Distance between added rigs. If set to 0, it is calculated from rig size.',
+        default=0.0,
+        min=0.0,
+        subtype='DISTANCE'
+    )
 
     def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
         if context.view_layer.objects.active is not None:
@@ -276,142 +466,708 @@ class UE4_TOOLS_ANIMATION_OT_add_ue4_rig(bpy.types.Operator):
         if len(self.rig_name) == 0:
             self.report({'ERROR'}, 'Please, set a valid rig name')
             return {'CANCELLED'}
-        # validate skeleton name
-        skeleton_name = self.rig_name + '_Skeleton'
-        if bpy.data.objects.get(skeleton_name) is not None:
-            self.report({'ERROR'}, 'Object with name "%s" already exists in the scene.' % skeleton_name)
-            return {'CANCELLED'}
-        # validate mesh name
-        mesh_name = self.rig_name + '_Mesh'
-        if self.add_mesh and bpy.data.objects.get(mesh_name) is not None:
-            self.report({'ERROR'}, 'Object with name "%s" already exists in the scene.' % mesh_name)
-            return {'CANCELLED'}
-        # get addon location
-        import os
-        addon_dir = os.path.dirname(os.path.realpath(__file__))
-        template_path = os.path.join(addon_dir, 'UE4_Mannequinn_Template.blend')
-        template_object_path = os.path.join(template_path, 'Object')
-        if not self.use_mobile:
-            template_skeleton_name = 'UE4_Mannequin_Skeleton'
-            template_mesh_name = 'SK_Mannequin'
-        else:
-            template_skeleton_name = 'UE4_Mannequin_Skeleton_Mobile'
-            template_mesh_name = 'SK_Mannequin_Mobile'
-        # import objects from template
-        if self.add_mesh:
-            bpy.ops.wm.link(filepath=os.path.join(template_object_path, template_mesh_name),
-                            directory=template_object_path,
-                            filename=template_mesh_name,
-                            link=True,
-                            relative_path=True,
-                            autoselect=True,
-                            active_collection=True)
-        else:
-            bpy.ops.wm.link(filepath=os.path.join(template_object_path, template_skeleton_name),
-                            directory=template_object_path,
-                            filename=template_skeleton_name,
-                            link=True,
-                            relative_path=True,
-                            autoselect=True,
-                            active_collection=True)
-        # make linked objects local
-        bpy.ops.object.make_local(type='ALL')
-        # locate and setup skeleton
-        skeleton: bpy.types.Object = bpy.data.objects[template_skeleton_name]
-        skeleton.select_set(True)
-        skeleton.name = skeleton_name
-        # locate and setup mesh
-        if self.add_mesh:
-            mesh: bpy.types.Object = bpy.data.objects[template_mesh_name]
-            mesh.select_set(True)
-            mesh.name = mesh_name
-            bpy.ops.object.make_local(type='ALL')
+        # validate skeleton and mesh names
+        rig_names = self.__get_rig_names()
+        for rig_name in rig_names:
+            skeleton_name = rig_name + '_Skeleton'
+            if bpy.data.objects.get(skeleton_name) is not None:
+                self.report({'ERROR'}, 'Object with name "%s" already exists in the scene.' % skeleton_name)
+                return {'CANCELLED'}
+            mesh_name = rig_name + '_Mesh'
+            if self.add_mesh and bpy.data.objects.get(mesh_name) is not None:
+                self.report({'ERROR'}, 'Object with name "%s" already exists in the scene.' % mesh_name)
+                return {'CANCELLED'}
+        # get in-memory copy of template objects
+        from . import templates
+        template_skeleton, template_mesh = templates.get_template('MOBILE' if self.use_mobile else 'DEFAULT')
+        # lay out rigs on a square grid
+        spacing = self.spacing if self.spacing > 0 else templates.get_footprint(template_skeleton) * 1.5
+        columns = math.ceil(math.sqrt(len(rig_names)))
+        # copy template objects into active collection
+        for selected_object in context.selected_objects:
+            selected_object.select_set(False)
+        for i, rig_name in enumerate(rig_names):
+            new_objects = templates.instantiate(template_skeleton,
+                                                template_mesh if self.add_mesh else None,
+                                                context.collection,
+                                                skeleton_name=rig_name + '_Skeleton',
+                                                mesh_name=rig_name + '_Mesh',
+                                                offset=((i % columns) * spacing, -(i // columns) * spacing, 0.0),
+                                                share_data=self.share_data)
+            for new_object in new_objects:
+                new_object.select_set(True)
+            context.view_layer.objects.active = new_objects[0]
         # return success
         return {'FINISHED'}
 
+    def __get_rig_names(self):
+        if self.count == 1:
+            return [self.rig_name]
+        return ['%s_%03d' % (self.rig_name, i + 1) for i in range(self.count)]
+
 
-class UE_TOOLS_ANIMATION_OT_add_deform_bones_group(bpy.types.Operator):
+class UE_TOOLS_ANIMATION_OT_add_deform_bones_group(bpy.types.Operator, jobs.ModalJob):
     bl_idname = 'ue4_tools_animation.add_deform_bones_group'
     bl_label = 'Auto-create deform bones'
-    bl_description = 'Add \'DeformBones\' bone group to current armature to be compatible with UE4 Tools.'
+    bl_description = 'Add \'DeformBones\' bone group to selected armatures to be compatible with UE4 Tools.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Reading vertex groups'
 
-    def execute(self, context: bpy.types.Context):
-        armature_object: bpy.types.Armature = context.view_layer.objects.active
-        # find all vertex groups with non-zero weights
-        vertex_group_names = self.__get_vertex_group_names(armature_object)
-        if len(vertex_group_names) == 0:
+    def run_job(self, context: bpy.types.Context):
+        armature_objects = [armature_object for armature_object in iter_selected_armatures(context)
+                            if not rig_cache.get_rig_state(armature_object).has_deform_bones]
+        if len(armature_objects) == 0:
+            self.report({'ERROR'}, 'Selected armatures already have deform bones')
+            return {'CANCELLED'}
+        # find all vertex groups with non-zero weights in child meshes of every armature
+        mesh_objects = [[child for child in armature_object.children if child.type == 'MESH']
+                        for armature_object in armature_objects]
+        total = sum(map(len, mesh_objects))
+        done = 0
+        vertex_group_names = []
+        for armature_mesh_objects in mesh_objects:
+            names = set()
+            for armature_done, _ in self.__get_vertex_group_names(armature_mesh_objects, names):
+                yield done + armature_done, total
+            done += len(armature_mesh_objects)
+            vertex_group_names.append(names)
+        if all(len(names) == 0 for names in vertex_group_names):
             self.report({'ERROR'}, 'Could not find any matching vertex groups in child meshes')
             return {'CANCELLED'}
-        # select only armature and enter pose mode
-        bpy.ops.object.select_all(action='DESELECT')
-        armature_object.select_set(True)
-        context.view_layer.objects.active = armature_object
-        bpy.ops.object.mode_set(mode='POSE')
-        # store visible bone layer visibility so it can be restored later
-        # and set all bone layers visible
-        visible_bone_layers = [len(armature_object.data.layers)]
-        for n in range(0, len(armature_object.data.layers)):
-            visible_bone_layers[n] = armature_object.data.layers[n]
-            armature_object.data.layers[n] = True
-        # select all bones for which there is a vertex group
-        # in any of the child meshes with the same name
-        bpy.ops.pose.select_all(action='DESELECT')
-        for b in armature_object.pose.bones:
-            if b.name in vertex_group_names:
-                b.bone.select = True
-        # create and assign 'DeformBones' group
-        if len(context.selected_pose_bones) > 0:
-            new_group_index: int = len(armature_object.pose.bone_groups)
-            bpy.ops.pose.group_assign(new_group_index)
-            armature_object.pose.bone_groups[new_group_index].name = 'DeformBones'
-        else:
+        # create 'DeformBones' group and assign it to all bones for which there is
+        # a vertex group in any of the child meshes with the same name,
+        # data is changed directly, so that neither mode nor selection need to be changed
+        group_count = 0
+        for armature_object, names in zip(armature_objects, vertex_group_names):
+            pose_bones = [pose_bone for pose_bone in armature_object.pose.bones if pose_bone.name in names]
+            if len(pose_bones) > 0:
+                set_deform_bones_group(armature_object, pose_bones)
+                group_count += 1
+        if group_count == 0:
             self.report({'ERROR'}, 'No bones have corresponding vertex groups')
-        # restore layer visibility
-        for n in range(0, len(armature_object.data.layers)):
-            armature_object.data.layers[n] = visible_bone_layers[n]
-        # return to object mode
-        bpy.ops.object.mode_set(mode='OBJECT')
+            return {'CANCELLED'}
+        if len(armature_objects) > 1:
+            self.report({'INFO'}, 'Created deform bones of %d of %d armatures' % (group_count, len(armature_objects)))
         # return success
         return {'FINISHED'}
 
-    def __get_vertex_group_names(self, armature_object: bpy.types.Object):
+    def __get_vertex_group_names(self, mesh_objects: typing.List[bpy.types.Object], names: typing.Set[str]):
         """Retrieves vertex group names from children meshes.
 
-        The operator iterates through all the bones and selects those
-        for which there is vertex group with the same name.
+        Only vertex groups having at least one weight that does not
+        round to zero are taken into account. Yields progress after each mesh.
         """
-        non_zero_vertex_groups = set()
-        for child in armature_object.children:
-            if child.type == 'MESH':
-                for vertex in child.data.vertices:
-                    for vertex_group in vertex.groups:
-                        if round(vertex_group.weight, 4) > .0000:
-                            non_zero_vertex_groups.add(vertex_group.group)
-        non_zero_vertex_group_names = set()
-        for child in armature_object.children:
-            if child.type == 'MESH':
-                for vertex_group in child.vertex_groups:
-                    if vertex_group.index in non_zero_vertex_groups:
-                        non_zero_vertex_group_names.add(vertex_group.name)
-        return non_zero_vertex_group_names
+        from . import weights
+        return weights.iter_weighted_vertex_group_names(mesh_objects, names)
 
 
 class UE_TOOLS_ANIMATION_OT_set_deform_bones_group(bpy.types.Operator):
     bl_idname = 'ue4_tools_animation.set_deform_bones_group'
     bl_label = 'Set deform bones'
     bl_description = 'Create \'DeformBones\' bone group based on currently selected bones.'
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context: bpy.types.Context):
-        armature_object = context.view_layer.objects.active
-        if len(context.selected_pose_bones) > 0:
-            new_group_index: int = len(armature_object.pose.bone_groups)
-            bpy.ops.pose.group_assign(new_group_index)
-            armature_object.pose.bone_groups[new_group_index].name = 'DeformBones'
+        selected_pose_bones = context.selected_pose_bones or []
+        if len(selected_pose_bones) > 0:
+            # selected bones of every armature in pose mode
+            pose_bones: typing.Dict[bpy.types.Object, typing.List[bpy.types.PoseBone]] = {}
+            for pose_bone in selected_pose_bones:
+                pose_bones.setdefault(pose_bone.id_data, []).append(pose_bone)
+            for armature_object, armature_pose_bones in pose_bones.items():
+                if not rig_cache.get_rig_state(armature_object).has_deform_bones:
+                    set_deform_bones_group(armature_object, armature_pose_bones)
             return {'FINISHED'}
         else:
             self.report({'ERROR'}, "You have to select bones first.")
             return {'CANCELLED'}
 
 
+def set_deform_bones_group(armature_object: bpy.types.Object, pose_bones: typing.Iterable[bpy.types.PoseBone]):
+    """Creates 'DeformBones' group of an armature and assigns it to pose bones."""
+    bone_group = armature_object.pose.bone_groups.new(name='DeformBones')
+    for pose_bone in pose_bones:
+        pose_bone.bone_group = bone_group
+    rig_cache.invalidate_bone_group_index(armature_object)
+
+
+class UE4_TOOLS_ANIMATION_OT_bake_deform_bones(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.bake_deform_bones'
+    bl_label = 'Bake deform bones'
+    bl_description = 'Bake visual transformation of deform bones, driven by IK and constraints, to a new action.'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    frame_start: bpy.props.IntProperty(
+        name='Start frame',
+        description='First frame to bake.',
+        default=1
+    )
+    frame_end: bpy.props.IntProperty(
+        name='End frame',
+        description='Last frame to bake.',
+        default=250
+    )
+    disable_constraints: bpy.props.BoolProperty(
+        name='Disable constraints?',
+        description='If set to True, constraints of baked bones are muted after baking.',
+        default=True
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        self.frame_start = context.scene.frame_start
+        self.frame_end = context.scene.frame_end
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context: bpy.types.Context):
+        from . import bake
+        from . import export
+        if self.frame_end < self.frame_start:
+            self.report({'ERROR'}, 'End frame must not be less than start frame')
+            return {'CANCELLED'}
+        targets = []
+        for armature_object in iter_selected_armatures(context):
+            bone_names = export.get_deform_bone_names(armature_object)
+            if len(bone_names) > 0:
+                targets.append((armature_object, bone_names))
+        if len(targets) == 0:
+            self.report({'ERROR'}, 'Armature does not have any deform bones')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        # bake into new actions so that the original ones are kept intact
+        actions = []
+        for armature_object, bone_names in targets:
+            animation_data = armature_object.animation_data_create()
+            source_name = animation_data.action.name if animation_data.action is not None else armature_object.name
+            action = bpy.data.actions.new(source_name + '_Baked')
+            action.id_root = 'OBJECT'
+            actions.append(action)
+        # all armatures are sampled in a single pass over the frames
+        key_count = bake.bake_poses([(armature_object, bone_names, action)
+                                     for (armature_object, bone_names), action in zip(targets, actions)],
+                                    range(self.frame_start, self.frame_end + 1))
+        for (armature_object, bone_names), action in zip(targets, actions):
+            armature_object.animation_data.action = action
+            if self.disable_constraints:
+                for pose_bone in armature_object.pose.bones:
+                    if pose_bone.name in bone_names:
+                        for constraint in pose_bone.constraints:
+                            constraint.mute = True
+        self.report({'INFO'}, 'Baked %d keyframes of %d bones in %d armatures in %.2f s' % (
+            key_count, sum(len(bone_names) for _, bone_names in targets), len(targets),
+            time.perf_counter() - start))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_retarget(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.retarget'
+    bl_label = 'Retarget animation'
+    bl_description = 'Retarget action of the other selected armature onto deform bones of the active armature, ' \
+                     'matching bones by mapping text, Mixamo names or identical names.'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    mapping_text: bpy.props.StringProperty(
+        name='Mapping',
+        description='Text with "source bone = target bone" lines. Bones not listed there are matched '
+                    'by Mixamo names or identical names.',
+        default=''
+    )
+    disable_constraints: bpy.props.BoolProperty(
+        name='Disable constraints?',
+        description='If set to True, constraints of deform bones are muted after retargeting.',
+        default=True
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context: bpy.types.Context):
+        self.layout.prop_search(self, 'mapping_text', bpy.data, 'texts')
+        self.layout.prop(self, 'disable_constraints')
+
+    def execute(self, context: bpy.types.Context):
+        from . import export
+        from . import retarget
+        armature_objects = list(iter_selected_armatures(context))
+        if len(armature_objects) < 2:
+            self.report({'ERROR'}, 'Please, select an armature to retarget from, with the target armature active')
+            return {'CANCELLED'}
+        target_object, source_object = armature_objects[0], armature_objects[1]
+        deform_bone_names = export.get_deform_bone_names(target_object)
+        if len(deform_bone_names) == 0:
+            self.report({'ERROR'}, 'Armature does not have any deform bones')
+            return {'CANCELLED'}
+        source_action = source_object.animation_data.action if source_object.animation_data is not None else None
+        if source_action is None:
+            self.report({'ERROR'}, 'Armature %s does not have an action to retarget' % source_object.name)
+            return {'CANCELLED'}
+        mapping = {}
+        if len(self.mapping_text) > 0:
+            text = bpy.data.texts.get(self.mapping_text)
+            if text is None:
+                self.report({'ERROR'}, 'Text %s does not exist' % self.mapping_text)
+                return {'CANCELLED'}
+            try:
+                mapping = retarget.parse_mapping(text.as_string())
+            except ValueError as ex:
+                self.report({'ERROR'}, 'Invalid mapping in %s: %s' % (text.name, ex))
+                return {'CANCELLED'}
+        pairs = retarget.get_bone_mapping(source_object, target_object, mapping)
+        if not any(target in deform_bone_names for _, target in pairs):
+            self.report({'ERROR'}, 'None of bones of %s match deform bones of %s' % (source_object.name,
+                                                                                      target_object.name))
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        frame_start, frame_end = source_action.frame_range
+        frames = range(int(math.floor(frame_start)), int(math.ceil(frame_end)) + 1)
+        action = bpy.data.actions.new(source_action.name + '_Retargeted')
+        action.id_root = 'OBJECT'
+        key_count = retarget.retarget(source_object, target_object, pairs, frames, action)
+        target_object.animation_data_create().action = action
+        if self.disable_constraints:
+            for pose_bone in target_object.pose.bones:
+                if pose_bone.name in deform_bone_names:
+                    for constraint in pose_bone.constraints:
+                        constraint.mute = True
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, 'Retargeted %d frames using %d matched bones, %d keyframes in %.2f s (%.0f frames/s)' % (
+            len(frames), len(pairs), key_count, elapsed, len(frames) / max(elapsed, 1e-6)))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_extract_root_motion(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.extract_root_motion'
+    bl_label = 'Extract root motion'
+    bl_description = 'Move horizontal translation and yaw of pelvis to root bone in every action ' \
+                     'of selected armatures, keeping pose of the rest of the skeleton.'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    root_bone: bpy.props.StringProperty(
+        name='Root bone',
+        description='Bone receiving root motion.',
+        default='root'
+    )
+    pelvis_bone: bpy.props.StringProperty(
+        name='Pelvis bone',
+        description='Bone root motion is taken from, must be a descendant of root bone.',
+        default='pelvis'
+    )
+    extract_translation: bpy.props.BoolProperty(
+        name='Translation',
+        description='If set to True, horizontal translation of pelvis is moved to root bone.',
+        default=True
+    )
+    extract_rotation: bpy.props.BoolProperty(
+        name='Rotation',
+        description='If set to True, rotation of pelvis around vertical axis is moved to root bone.',
+        default=True
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context: bpy.types.Context):
+        from . import root_motion
+        if not self.extract_translation and not self.extract_rotation:
+            self.report({'ERROR'}, 'Nothing to extract')
+            return {'CANCELLED'}
+        armature_objects = []
+        for armature_object in iter_selected_armatures(context):
+            bones = armature_object.data.bones
+            if self.root_bone in bones and self.pelvis_bone in bones \
+                    and root_motion.is_descendant(armature_object, self.pelvis_bone, self.root_bone):
+                armature_objects.append(armature_object)
+        if len(armature_objects) == 0:
+            self.report({'ERROR'}, 'Armature does not have bone %s parented to bone %s' % (self.pelvis_bone,
+                                                                                          self.root_bone))
+            return {'CANCELLED'}
+        actions = root_motion.get_armature_actions(armature_objects)
+        if len(actions) == 0:
+            self.report({'ERROR'}, 'Armature does not have any actions animating deform bones')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        key_count = 0
+        for armature_object, action in actions:
+            key_count += root_motion.extract_root_motion(armature_object, action, self.root_bone, self.pelvis_bone,
+                                                         self.extract_translation, self.extract_rotation)
+        self.report({'INFO'}, 'Extracted root motion of %d actions in %d armatures, %d keyframes in %.2f s' % (
+            len(actions), len(armature_objects), key_count, time.perf_counter() - start))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_reduce_keyframes(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.reduce_keyframes'
+    bl_label = 'Reduce keyframes'
+    bl_description = 'Remove keyframes of deform bones that can be interpolated within given tolerance ' \
+                     'from every action animating selected armatures.'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    location_tolerance: bpy.props.FloatProperty(
+        name='Location tolerance',
+        description='Maximum allowed location error.',
+        default=0.001,
+        min=0.0,
+        precision=4,
+        subtype='DISTANCE'
+    )
+    rotation_tolerance: bpy.props.FloatProperty(
+        name='Rotation tolerance',
+        description='Maximum allowed error of rotation channels (quaternion components or euler angles in radians).',
+        default=0.001,
+        min=0.0,
+        precision=4
+    )
+    scale_tolerance: bpy.props.FloatProperty(
+        name='Scale tolerance',
+        description='Maximum allowed scale error.',
+        default=0.001,
+        min=0.0,
+        precision=4
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context: bpy.types.Context):
+        from . import export
+        from . import simplify
+        # actions may be shared by several armatures
+        action_bone_names: typing.Dict[bpy.types.Action, typing.Set[str]] = {}
+        for armature_object in iter_selected_armatures(context):
+            bone_names = export.get_deform_bone_names(armature_object)
+            for action in export.get_deform_actions(armature_object):
+                action_bone_names.setdefault(action, set()).update(bone_names)
+        actions = sorted(action_bone_names, key=lambda action: action.name)
+        if len(actions) == 0:
+            self.report({'ERROR'}, 'Could not find any actions animating deform bones')
+            return {'CANCELLED'}
+        tolerances = {
+            'location': self.location_tolerance,
+            'rotation': self.rotation_tolerance,
+            'scale': self.scale_tolerance,
+        }
+        keys_before = keys_after = 0
+        max_error = 0.0
+        for action in actions:
+            result = simplify.reduce_action(action, action_bone_names[action], tolerances)
+            print('%s: %d -> %d keys, max error %.6f' % (action.name, result.keys_before, result.keys_after,
+                                                          result.max_error))
+            keys_before += result.keys_before
+            keys_after += result.keys_after
+            max_error = max(max_error, result.max_error)
+        self.report({'INFO'}, 'Reduced %d actions from %d to %d keys, max error %.6f' % (
+            len(actions), keys_before, keys_after, max_error))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_optimize_weights(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_animation.optimize_weights'
+    bl_label = 'Optimize weights'
+    bl_description = 'Limit number of deform bone influences per vertex, normalize weights ' \
+                     'and remove unused vertex groups of meshes parented to selected armatures.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Optimizing weights'
+
+    max_influences: bpy.props.EnumProperty(
+        name='Max influences',
+        description='Maximum number of bones influencing a single vertex.',
+        items=[
+            ('4', '4', 'Default for UE4 skeletal meshes'),
+            ('8', '8', 'Requires extra bone influences enabled for the skeletal mesh'),
+        ],
+        default='4'
+    )
+    prune_groups: bpy.props.BoolProperty(
+        name='Remove unused groups',
+        description='Remove vertex groups of non-deform bones and vertex groups without any weights.',
+        default=True
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def run_job(self, context: bpy.types.Context):
+        from . import export
+        from . import weights
+        start = time.perf_counter()
+        mesh_objects = []
+        for armature_object in iter_selected_armatures(context):
+            deform_bone_names = export.get_deform_bone_names(armature_object)
+            if len(deform_bone_names) == 0:
+                # every vertex group would count as non-deform and lose its weights
+                self.report({'ERROR'}, 'Armature %s does not have any deform bones' % armature_object.name)
+                return {'CANCELLED'}
+            mesh_objects.extend((child, deform_bone_names) for child in armature_object.children
+                                if child.type == 'MESH')
+        if len(mesh_objects) == 0:
+            self.report({'ERROR'}, 'Could not find any meshes parented to selected armatures')
+            return {'CANCELLED'}
+        result = weights.OptimizationResult()
+        for progress in weights.iter_optimize_mesh_weights(mesh_objects, int(self.max_influences),
+                                                           self.prune_groups, result):
+            # meshes are only modified after all of them have been read
+            self.job_cancellable = progress[0] < len(mesh_objects)
+            yield progress
+        self.report({'INFO'}, 'Optimized %d meshes: %d -> %d influences, %d vertices over limit, '
+                              '%d vertex groups removed in %.2f s' % (
+                                  len(mesh_objects), result.influences_before, result.influences_after,
+                                  result.vertices_over_limit, result.removed_groups,
+                                  time.perf_counter() - start))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_prune_shape_keys(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_animation.prune_shape_keys'
+    bl_label = 'Prune shape keys'
+    bl_description = 'Remove shape keys of selected meshes and meshes of selected armatures which move ' \
+                     'no vertex farther than tolerance, printing sparsity and memory cost of every key.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Pruning shape keys'
+
+    tolerance: bpy.props.FloatProperty(
+        name='Tolerance',
+        description='Vertices moved by a shape key less than this are treated as not moved.',
+        default=1e-4,
+        min=0.0,
+        precision=5,
+        subtype='DISTANCE'
+    )
+    remove_keys: bpy.props.BoolProperty(
+        name='Remove empty keys',
+        description='If set to True, shape keys not moving any vertex are removed.',
+        default=True
+    )
+    export_sidecar: bpy.props.BoolProperty(
+        name='Export sparse deltas',
+        description='If set to True, offsets of moved vertices of remaining keys are written '
+                    'to <mesh>_morphs.npz file in export path.',
+        default=False
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def run_job(self, context: bpy.types.Context):
+        from . import shape_keys
+        mesh_objects = [selected_object for selected_object in context.selected_objects
+                        if selected_object.type == 'MESH']
+        for armature_object in iter_selected_armatures(context):
+            mesh_objects.extend(child for child in armature_object.children
+                                if child.type == 'MESH' and child not in mesh_objects)
+        mesh_objects = [mesh_object for mesh_object in mesh_objects if mesh_object.data.shape_keys is not None]
+        if len(mesh_objects) == 0:
+            self.report({'ERROR'}, 'Please, select meshes with shape keys or their armatures')
+            return {'CANCELLED'}
+        prefs = context.scene.ue4_tools_animation
+        if self.export_sidecar and prefs.export_path.startswith('//') and len(bpy.data.filepath) == 0:
+            self.report({'ERROR'}, 'Please, save the file or set an absolute export path')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        total = sum(len(mesh_object.data.shape_keys.key_blocks) - 1 for mesh_object in mesh_objects)
+        done = 0
+        results = []
+        for mesh_object in mesh_objects:
+            stats = []
+            deltas = []
+            for item in shape_keys.iter_shape_key_deltas(mesh_object, self.tolerance):
+                stats.append(item.stats)
+                # offsets are only kept in memory when they are exported, keys moving vertices
+                # from the basis are exported even if they add nothing over their reference key
+                if self.export_sidecar and len(item.indices) > 0:
+                    deltas.append(item)
+                done += 1
+                yield done, total
+            results.append((mesh_object, stats, deltas))
+        # meshes are only changed once all keys have been measured, so cancelling leaves them intact
+        self.job_cancellable = False
+        removed = 0
+        if self.export_sidecar:
+            export_dir = bpy.path.abspath(prefs.export_path)
+            os.makedirs(export_dir, exist_ok=True)
+        for mesh_object, stats, deltas in results:
+            for key_stats in stats:
+                print('%s/%s: %d of %d vertices moved (%.1f%% sparse), max offset %g, '
+                      '%d bytes dense, %d bytes sparse' % (
+                          mesh_object.name, key_stats.name, key_stats.moved_vertices, key_stats.vertex_count,
+                          key_stats.sparsity * 100, key_stats.max_offset, key_stats.dense_bytes,
+                          key_stats.sparse_bytes))
+            if self.remove_keys:
+                removed += shape_keys.remove_shape_keys(mesh_object, [key_stats.name for key_stats in stats
+                                                                      if key_stats.moved_vertices == 0])
+            if self.export_sidecar:
+                # keys that have just been removed are not exported
+                key_blocks = mesh_object.data.shape_keys.key_blocks
+                deltas = [item for item in deltas if item.stats.name in key_blocks]
+                sidecar_path = os.path.join(export_dir, '%s_morphs.npz' % bpy.path.clean_name(mesh_object.name))
+                shape_keys.write_sidecar(sidecar_path, len(mesh_object.data.vertices), deltas)
+        used = [key_stats for _, stats, _ in results for key_stats in stats if key_stats.moved_vertices > 0]
+        self.report({'INFO'}, 'Removed %d of %d shape keys in %.2f s, remaining keys are %.1f%% sparse on average, '
+                              '%.2f MB dense, %.2f MB sparse, see console for every key' % (
+                                  removed, total, time.perf_counter() - start,
+                                  100 * sum(key_stats.sparsity for key_stats in used) / max(len(used), 1),
+                                  sum(key_stats.dense_bytes for key_stats in used) / 2 ** 20,
+                                  sum(key_stats.sparse_bytes for key_stats in used) / 2 ** 20))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_export_actions(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.export_actions'
+    bl_label = 'Export actions'
+    bl_description = 'Export every action animating deform bones of selected armatures to its own FBX file. ' \
+                     'Export runs in background Blender processes.'
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        if not self.__start(context):
+            return {'CANCELLED'}
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(0.1, window=context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, len(self._pool.items))
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context: bpy.types.Context, event: bpy.types.Event):
+        if event.type == 'ESC':
+            recorded = self._pool.completed
+            self._pool.cancel()
+            # actions finished while workers were being stopped have been fully written
+            self.__update_manifest(self._pool.results[recorded:])
+            self.__finish(context)
+            self.report({'WARNING'}, 'Export cancelled')
+            return {'CANCELLED'}
+        if event.type == 'TIMER':
+            self.__update_manifest(self._pool.poll())
+            context.window_manager.progress_update(self._pool.completed)
+            context.workspace.status_text_set('Exporting actions: %d of %d' % (self._pool.completed,
+                                                                               len(self._pool.items)))
+            if self._pool.done:
+                self.__finish(context)
+                self.__report_result()
+                return {'FINISHED'}
+        return {'PASS_THROUGH'}
+
+    def execute(self, context: bpy.types.Context):
+        if not self.__start(context):
+            return {'CANCELLED'}
+        self._pool.wait()
+        self.__update_manifest(self._pool.results)
+        self._pool.cleanup()
+        self._manifest.save()
+        self.__report_result()
+        return {'FINISHED'}
+
+    def __start(self, context: bpy.types.Context) -> bool:
+        from . import export
+        from . import export_cache
+        from . import workers
+        prefs = context.scene.ue4_tools_animation
+        if prefs.export_path.startswith('//') and len(bpy.data.filepath) == 0:
+            self.report({'ERROR'}, 'Please, save the file or set an absolute export path')
+            return False
+        export_dir = bpy.path.abspath(prefs.export_path)
+        os.makedirs(export_dir, exist_ok=True)
+        options = {'include_mesh': prefs.export_include_mesh}
+        items = []
+        for armature_object in iter_selected_armatures(context):
+            armature_items = export.get_export_items(armature_object, export_dir)
+            export_cache.assign_hashes(armature_items, armature_object, options)
+            items.extend(armature_items)
+        if len(items) == 0:
+            self.report({'ERROR'}, 'Could not find any actions animating deform bones')
+            return False
+        # skip actions which have already been exported
+        self._manifest = export_cache.ExportManifest(export_dir)
+        if prefs.export_incremental:
+            items = [item for item in items if not self._manifest.is_up_to_date(item)]
+            if len(items) == 0:
+                self.report({'INFO'}, 'All actions are up to date')
+                return False
+        self._pool = workers.WorkerPool('export_action', items, options=options, worker_count=prefs.export_workers)
+        self._start_time = time.perf_counter()
+        self._pool.start()
+        return True
+
+    def __finish(self, context: bpy.types.Context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        self._pool.cleanup()
+        self._manifest.save()
+
+    def __update_manifest(self, results: typing.List[dict]):
+        items = {item['name']: item for item in self._pool.items}
+        for result in results:
+            if result['status'] == 'done':
+                self._manifest.update(items[result['name']])
+            else:
+                self._manifest.discard(items[result['name']])
+
+    def __report_result(self):
+        elapsed = max(time.perf_counter() - self._start_time, 1e-6)
+        for result in self._pool.failed:
+            print('Could not export %s: %s' % (result['name'], result.get('message')))
+        exported = self._pool.completed - len(self._pool.failed)
+        # items not reported at all belong to workers that have crashed
+        failed = len(self._pool.items) - exported
+        self.report({'INFO'} if failed == 0 else {'WARNING'},
+                    'Exported %d actions in %.1f s (%.2f actions/s) using %d workers, %d failed' % (
+                        exported, elapsed, exported / elapsed, self._pool.worker_count, failed))
+
+
+class UE4_TOOLS_ANIMATION_OT_live_link(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.live_link'
+    bl_label = 'Live Link'
+    bl_description = 'Start or stop streaming transforms of DeformBones of selected armatures ' \
+                     'to a live link endpoint on every frame change.'
+
+    def execute(self, context: bpy.types.Context):
+        from . import live_link
+        if live_link.get_session() is not None:
+            live_link.stop()
+            self.report({'INFO'}, 'Live link stopped')
+            return {'FINISHED'}
+        armature_objects = [armature_object for armature_object in iter_selected_armatures(context)
+                            if rig_cache.get_rig_state(armature_object).has_deform_bones]
+        if len(armature_objects) == 0:
+            self.report({'ERROR'}, 'Please, select armatures having \'DeformBones\' bone group')
+            return {'CANCELLED'}
+        prefs = context.scene.ue4_tools_animation
+        try:
+            live_link.start(context.scene, armature_objects, prefs.live_link_host, prefs.live_link_port,
+                            prefs.live_link_transport)
+        except OSError as ex:
+            self.report({'ERROR'}, 'Could not connect to %s:%d: %s' % (prefs.live_link_host,
+                                                                        prefs.live_link_port, ex))
+            return {'CANCELLED'}
+        self.report({'INFO'}, 'Streaming %d armatures to %s:%d over %s' % (
+            len(armature_objects), prefs.live_link_host, prefs.live_link_port, prefs.live_link_transport))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_ANIMATION_OT_live_link_receiver(bpy.types.Operator):
+    bl_idname = 'ue4_tools_animation.live_link_receiver'
+    bl_label = 'Live Link Test Receiver'
+    bl_description = 'Start or stop a stand-in live link endpoint measuring frame rate and latency of received poses.'
+
+    def execute(self, context: bpy.types.Context):
+        from . import live_link
+        if live_link.get_receiver() is not None:
+            live_link.stop_receiver()
+            return {'FINISHED'}
+        prefs = context.scene.ue4_tools_animation
+        try:
+            live_link.start_receiver(prefs.live_link_host, prefs.live_link_port, prefs.live_link_transport)
+        except OSError as ex:
+            self.report({'ERROR'}, 'Could not listen on %s:%d: %s' % (prefs.live_link_host,
+                                                                       prefs.live_link_port, ex))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+
 def register():
     bpy.types.Scene.ue4_tools_animation = bpy.props.PointerProperty(type=UE4_TOOLS_ANIMATION_prefs)
+
+
+def unregister():
+    live_link = get_live_link()
+    if live_link is not None:
+        live_link.stop()
+        live_link.stop_receiver()
@@ -5,6 +5,8 @@
 import os
 import bpy
 import sys
+import json
+import time
 import typing
 import inspect
 import pkgutil
@@ -15,20 +17,58 @@ __all__ = (
     "init",
     "register",
     "unregister",
+    "get_startup_report",
 )
 
+# bump when manifest layout changes
+MANIFEST_VERSION = 1
+MANIFEST_PATH = Path(__file__).parent / "__pycache__" / "auto_load_manifest.json"
+# set to 1 to print startup report, or to a file path to append it as a JSON line
+STARTUP_REPORT_VARIABLE = "UE4_TOOLS_STARTUP_REPORT"
+
 modules = None
 ordered_classes = None
+timings = {}
+# functions called with every class right before it is registered
+class_hooks = []
 
 def init():
     global modules
     global ordered_classes
 
-    modules = get_all_submodules(Path(__file__).parent)
+    start = time.perf_counter()
+    directory = Path(__file__).parent
+    signature = get_modules_signature(directory)
+    manifest = load_manifest(signature)
+    timings["scan"] = time.perf_counter() - start
+    timings["manifest_hit"] = manifest is not None
+
+    if manifest is not None:
+        # only modules with something to register are imported,
+        # helper modules are imported by operators when needed
+        start = time.perf_counter()
+        modules = [importlib.import_module("." + name, directory.name) for name in manifest["modules"]]
+        timings["import"] = time.perf_counter() - start
+        start = time.perf_counter()
+        ordered_classes = resolve_classes(manifest["classes"])
+        timings["classes"] = time.perf_counter() - start
+        if ordered_classes is not None:
+            return
+
+    start = time.perf_counter()
+    modules = get_all_submodules(directory)
+    timings["import"] = time.perf_counter() - start
+    start = time.perf_counter()
     ordered_classes = get_ordered_classes_to_register(modules)
+    modules = get_registration_modules(modules, ordered_classes)
+    save_manifest(signature, modules, ordered_classes)
+    timings["classes"] = time.perf_counter() - start
 
 def register():
+    start = time.perf_counter()
     for cls in ordered_classes:
+        for hook in class_hooks:
+            hook(cls)
         bpy.utils.register_class(cls)
 
     for module in modules:
@@ -36,6 +76,8 @@ def register():
             continue
         if hasattr(module, "register"):
             module.register()
+    timings["register"] = time.perf_counter() - start
+    write_startup_report()
 
 def unregister():
     for cls in reversed(ordered_classes):
@@ -68,6 +110,89 @@ def iter_submodule_names(path, root=""):
             yield root + module_name
 
 
+def get_registration_modules(modules, classes):
+    class_modules = set(cls.__module__ for cls in classes)
+    return [module for module in modules
+            if module.__name__ in class_modules
+            or hasattr(module, "register")
+            or hasattr(module, "unregister")]
+
+
+# Cache classes to register between launches
+#################################################
+
+def get_modules_signature(directory):
+    files = {}
+    for name in sorted(iter_submodule_names(directory)):
+        stat = (directory / (name.replace(".", os.sep) + ".py")).stat()
+        files[name] = [stat.st_mtime_ns, stat.st_size]
+    return {
+        "version": MANIFEST_VERSION,
+        "blender": list(bpy.app.version),
+        "files": files,
+    }
+
+def load_manifest(signature):
+    try:
+        with open(MANIFEST_PATH) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("signature") != signature:
+        return None
+    return manifest
+
+def save_manifest(signature, modules, classes):
+    package_prefix = Path(__file__).parent.name + "."
+    manifest = {
+        "signature": signature,
+        "modules": [module.__name__[len(package_prefix):] for module in modules],
+        "classes": [[cls.__module__, cls.__qualname__] for cls in classes],
+    }
+    try:
+        MANIFEST_PATH.parent.mkdir(exist_ok=True)
+        with open(MANIFEST_PATH, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+    except OSError:
+        # addon directory may be read-only, manifest is just not cached then
+        pass
+
+def resolve_classes(class_names):
+    classes = []
+    for module_name, class_name in class_names:
+        cls = getattr(sys.modules.get(module_name), class_name, None)
+        if not inspect.isclass(cls):
+            return None
+        classes.append(cls)
+    return classes
+
+
+# Report time spent on startup
+#################################################
+
+def get_startup_report():
+    lines = ["UE4 Tools startup: %.1f ms (manifest %s)" % (
+        sum(timings.get(phase, 0.0) for phase in ("scan", "import", "classes", "register")) * 1000,
+        "hit" if timings.get("manifest_hit") else "miss")]
+    for phase in ("scan", "import", "classes", "register"):
+        if phase in timings:
+            lines.append("  %-8s %.1f ms" % (phase, timings[phase] * 1000))
+    return "\n".join(lines)
+
+def write_startup_report():
+    target = os.environ.get(STARTUP_REPORT_VARIABLE)
+    if not target:
+        return
+    if target == "1":
+        print(get_startup_report())
+        return
+    try:
+        with open(target, "a") as report_file:
+            report_file.write(json.dumps(dict(timings, time=time.time())) + "\n")
+    except OSError as e:
+        print("UE4 Tools: could not write startup report: %s" % e)
+
+
 # Find classes to register
 #################################################
 
@@ -0,0 +1,270 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+from mathutils import Matrix
+
+
+def read_matrices(collection: bpy.types.bpy_prop_collection, attribute: str) -> numpy.ndarray:
+    """Reads a matrix attribute of every collection item into (N, 4, 4) array."""
+    values = numpy.empty(len(collection) * 16, dtype=numpy.float32)
+    collection.foreach_get(attribute, values)
+    # Blender stores matrices column by column
+    return values.reshape(-1, 4, 4).transpose(0, 2, 1)
+
+
+def sample_pose_matrices(armature_object: bpy.types.Object, frames: typing.Sequence[float],
+                         on_frame: typing.Callable[[int], None] = None) -> numpy.ndarray:
+    """Evaluates armature at each frame and returns pose space matrices of all pose bones.
+
+    Returns (frames, bones, 4, 4) array with bones in the order of armature_object.pose.bones.
+    Optional on_frame callback is called with frame index while scene is at that frame.
+    """
+    return sample_poses([armature_object], frames, on_frame)[0]
+
+
+def sample_poses(armature_objects: typing.Sequence[bpy.types.Object], frames: typing.Sequence[float],
+                 on_frame: typing.Callable[[int], None] = None) -> typing.List[numpy.ndarray]:
+    """Same as sample_pose_matrices() for several armatures, evaluating the scene once per frame."""
+    scene = bpy.context.scene
+    frame_current, frame_subframe = scene.frame_current, scene.frame_subframe
+    values = [numpy.empty((len(frames), len(armature_object.pose.bones) * 16), dtype=numpy.float32)
+              for armature_object in armature_objects]
+    try:
+        for i, frame in enumerate(frames):
+            scene.frame_set(int(frame), subframe=float(frame) - int(frame))
+            for armature_object, armature_values in zip(armature_objects, values):
+                armature_object.pose.bones.foreach_get('matrix', armature_values[i])
+            if on_frame is not None:
+                on_frame(i)
+    finally:
+        scene.frame_set(frame_current, subframe=frame_subframe)
+    return [armature_values.reshape(len(frames), -1, 4, 4).transpose(0, 1, 3, 2).astype(numpy.float64)
+            for armature_values in values]
+
+
+def pose_to_local(armature_object: bpy.types.Object, pose_matrices: numpy.ndarray,
+                  bone_indices: typing.Sequence[int]) -> numpy.ndarray:
+    """Converts pose space matrices of selected bones to local (basis) matrices.
+
+    Expects bones to inherit parent transformation fully and to use local location,
+    see inherits_fully().
+    """
+    pose_bones = armature_object.pose.bones
+    parent_indices = get_parent_indices(armature_object)[bone_indices]
+    rest = numpy.array([pose_bone.bone.matrix_local for pose_bone in pose_bones], dtype=numpy.float64)
+    # root bones get identity matrices as their parents
+    identity = numpy.eye(4)
+    parent_rest = numpy.where((parent_indices >= 0)[:, None, None], rest[parent_indices], identity)
+    parent_pose = numpy.where((parent_indices >= 0)[None, :, None, None],
+                              pose_matrices[:, parent_indices], identity)
+    # pose = parent_pose @ inv(parent_rest) @ rest @ local
+    return numpy.linalg.inv(rest[bone_indices]) @ parent_rest @ numpy.linalg.inv(parent_pose) \
+        @ pose_matrices[:, bone_indices]
+
+
+def get_parent_indices(armature_object: bpy.types.Object) -> numpy.ndarray:
+    """Returns index of parent of every pose bone, or -1 for root bones."""
+    pose_bones = armature_object.pose.bones
+    indices = {pose_bone.name: i for i, pose_bone in enumerate(pose_bones)}
+    return numpy.array([indices[pose_bone.parent.name] if pose_bone.parent is not None else -1
+                        for pose_bone in pose_bones], dtype=numpy.int64)
+
+
+def inherits_fully(bone: bpy.types.Bone) -> bool:
+    inherit_scale = getattr(bone, 'inherit_scale', None)
+    return bone.use_inherit_rotation and bone.use_local_location \
+        and (inherit_scale == 'FULL' if inherit_scale is not None else bone.use_inherit_scale)
+
+
+def decompose(matrices: numpy.ndarray) -> typing.Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Splits (..., 4, 4) matrices into locations, rotation matrices and scales."""
+    location = matrices[..., :3, 3]
+    scale = numpy.linalg.norm(matrices[..., :3, :3], axis=-2)
+    rotation = matrices[..., :3, :3] / numpy.maximum(scale, 1e-12)[..., None, :]
+    return location, rotation, scale
+
+
+def matrix_to_quaternion(rotation: numpy.ndarray) -> numpy.ndarray:
+    """Converts (..., 3, 3) rotation matrices to (..., 4) quaternions (w, x, y, z)."""
+    m = rotation
+    m00, m01, m02 = m[..., 0, 0], m[..., 0, 1], m[..., 0, 2]
+    m10, m11, m12 = m[..., 1, 0], m[..., 1, 1], m[..., 1, 2]
+    m20, m21, m22 = m[..., 2, 0], m[..., 2, 1], m[..., 2, 2]
+    # compute quaternion from its largest component for numerical stability
+    squares = numpy.stack([1 + m00 + m11 + m22,
+                           1 + m00 - m11 - m22,
+                           1 - m00 + m11 - m22,
+                           1 - m00 - m11 + m22], axis=-1)
+    s = numpy.sqrt(numpy.maximum(squares, 1e-12)) * 2
+    candidates = numpy.stack([
+        numpy.stack([s[..., 0] / 4, (m21 - m12) / s[..., 0], (m02 - m20) / s[..., 0], (m10 - m01) / s[..., 0]], -1),
+        numpy.stack([(m21 - m12) / s[..., 1], s[..., 1] / 4, (m01 + m10) / s[..., 1], (m02 + m20) / s[..., 1]], -1),
+        numpy.stack([(m02 - m20) / s[..., 2], (m01 + m10) / s[..., 2], s[..., 2] / 4, (m12 + m21) / s[..., 2]], -1),
+        numpy.stack([(m10 - m01) / s[..., 3], (m02 + m20) / s[..., 3], (m12 + m21) / s[..., 3], s[..., 3] / 4], -1),
+    ], axis=-2)
+    largest = numpy.argmax(squares, axis=-1)[..., None, None]
+    quaternion = numpy.take_along_axis(candidates, largest, axis=-2)[..., 0, :]
+    return quaternion / numpy.linalg.norm(quaternion, axis=-1, keepdims=True)
+
+
+def make_quaternions_continuous(quaternions: numpy.ndarray) -> numpy.ndarray:
+    """Flips signs of (frames, ..., 4) quaternions so that consecutive frames do not jump."""
+    dots = numpy.sum(quaternions[1:] * quaternions[:-1], axis=-1)
+    signs = numpy.cumprod(numpy.where(dots < 0, -1.0, 1.0), axis=0)
+    result = quaternions.copy()
+    result[1:] *= signs[..., None]
+    return result
+
+
+def get_rotation_channels(rotation: numpy.ndarray, rotation_mode: str) -> typing.Tuple[str, numpy.ndarray]:
+    """Converts (frames, 3, 3) rotation matrices of a bone to values of its rotation property."""
+    if rotation_mode in ('QUATERNION', 'AXIS_ANGLE'):
+        quaternion = make_quaternions_continuous(matrix_to_quaternion(rotation))
+        if rotation_mode == 'QUATERNION':
+            return 'rotation_quaternion', quaternion
+        angle = 2 * numpy.arccos(numpy.clip(quaternion[:, 0], -1, 1))
+        sin_half = numpy.sqrt(numpy.maximum(1 - quaternion[:, 0] ** 2, 0))
+        axis = numpy.where((sin_half > 1e-8)[:, None], quaternion[:, 1:] / numpy.maximum(sin_half, 1e-8)[:, None],
+                           numpy.array([0.0, 1.0, 0.0]))
+        return 'rotation_axis_angle', numpy.concatenate([angle[:, None], axis], axis=1)
+    if rotation_mode == 'XYZ':
+        euler = numpy.stack([numpy.arctan2(rotation[:, 2, 1], rotation[:, 2, 2]),
+                             numpy.arcsin(numpy.clip(-rotation[:, 2, 0], -1, 1)),
+                             numpy.arctan2(rotation[:, 1, 0], rotation[:, 0, 0])], axis=-1)
+        return 'rotation_euler', numpy.unwrap(euler, axis=0)
+    # other rotation orders are rare enough to be converted one by one
+    eulers = []
+    previous = None
+    for matrix in rotation:
+        previous = Matrix(matrix.tolist()).to_euler(rotation_mode, previous) if previous is not None \
+            else Matrix(matrix.tolist()).to_euler(rotation_mode)
+        eulers.append(previous)
+    return 'rotation_euler', numpy.array(eulers, dtype=numpy.float64)
+
+
+def write_fcurves(action: bpy.types.Action, data_path: str, frames: numpy.ndarray, values: numpy.ndarray,
+                  group: str = None):
+    """Replaces f-curves of a property with keyframes at given frames.
+
+    Values are a (frames, array length) array, keyframes are written in bulk.
+    """
+    for index in range(values.shape[1]):
+        write_fcurve(action, data_path, index, frames, values[:, index], group)
+
+
+def write_fcurve(action: bpy.types.Action, data_path: str, index: int, frames: numpy.ndarray, values: numpy.ndarray,
+                 group: str = None, interpolation: str = None) -> bpy.types.FCurve:
+    """Replaces an f-curve with keyframes at given frames, written in bulk."""
+    fcurve = action.fcurves.find(data_path, index=index)
+    if fcurve is not None:
+        action.fcurves.remove(fcurve)
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group or '')
+    fcurve.keyframe_points.add(len(frames))
+    co = numpy.empty(len(frames) * 2, dtype=numpy.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    fcurve.keyframe_points.foreach_set('co', co)
+    if interpolation is not None:
+        for point in fcurve.keyframe_points:
+            point.interpolation = interpolation
+    # recalculate automatic handles
+    fcurve.update()
+    return fcurve
+
+
+def write_local_matrices(armature_object: bpy.types.Object, action: bpy.types.Action, frames: numpy.ndarray,
+                         bone_indices: typing.Sequence[int], local: numpy.ndarray) -> int:
+    """Writes (frames, bones, 4, 4) local matrices of pose bones with given indices as keyframes of an action.
+
+    Returns number of written keyframes.
+    """
+    pose_bones = armature_object.pose.bones
+    location, rotation, scale = decompose(local)
+    key_count = 0
+    for j, i in enumerate(bone_indices):
+        pose_bone = pose_bones[i]
+        rotation_path, rotation_values = get_rotation_channels(rotation[:, j], pose_bone.rotation_mode)
+        for path, values in (('location', location[:, j]),
+                             (rotation_path, rotation_values),
+                             ('scale', scale[:, j])):
+            write_fcurves(action, pose_bone.path_from_id(path), frames, values, group=pose_bone.name)
+            key_count += values.size
+    return key_count
+
+
+def bake_pose(armature_object: bpy.types.Object, bone_names: typing.Iterable[str],
+              frames: typing.Sequence[float], action: bpy.types.Action) -> int:
+    """Bakes visual transformation of pose bones into an action.
+
+    Armature is evaluated once per frame, everything else is done with array operations
+    for all frames at once. Returns number of written keyframes.
+    """
+    return bake_poses([(armature_object, bone_names, action)], frames)
+
+
+def bake_poses(targets: typing.Sequence[typing.Tuple[bpy.types.Object, typing.Iterable[str], bpy.types.Action]],
+               frames: typing.Sequence[float]) -> int:
+    """Same as bake_pose() for several (armature, bone names, action) targets,
+    evaluating the scene once per frame for all of them."""
+    frames = numpy.asarray(frames, dtype=numpy.float64)
+    targets = [_BakeTarget(armature_object, set(bone_names), action, len(frames))
+               for armature_object, bone_names, action in targets]
+
+    def convert_fallback_bones(frame_index: int):
+        for target in targets:
+            target.convert_fallback_bones(frame_index)
+
+    pose_matrices = sample_poses([target.armature_object for target in targets], frames,
+                                 convert_fallback_bones if any(len(target.fallback_indices) > 0
+                                                               for target in targets) else None)
+    return sum(target.write(frames, matrices) for target, matrices in zip(targets, pose_matrices))
+
+
+class _BakeTarget:
+    """Bones of a single armature baked by bake_poses()."""
+
+    def __init__(self, armature_object: bpy.types.Object, bone_names: typing.Set[str], action: bpy.types.Action,
+                 frame_count: int):
+        self.armature_object = armature_object
+        self.action = action
+        pose_bones = armature_object.pose.bones
+        self.bone_indices = [i for i, pose_bone in enumerate(pose_bones) if pose_bone.name in bone_names]
+        # local transformation of bones not fully inheriting parent transformation
+        # is queried from Blender while scene is at each frame
+        self.fallback_indices = [i for i in self.bone_indices if not inherits_fully(pose_bones[i].bone)]
+        self.fallback_local = numpy.empty((frame_count, len(self.fallback_indices), 4, 4), dtype=numpy.float64)
+
+    def convert_fallback_bones(self, frame_index: int):
+        pose_bones = self.armature_object.pose.bones
+        for j, i in enumerate(self.fallback_indices):
+            pose_bone = pose_bones[i]
+            self.fallback_local[frame_index, j] = self.armature_object.convert_space(pose_bone=pose_bone,
+                                                                                     matrix=pose_bone.matrix,
+                                                                                     from_space='POSE',
+                                                                                     to_space='LOCAL')
+
+    def write(self, frames: numpy.ndarray, pose_matrices: numpy.ndarray) -> int:
+        local = pose_to_local(self.armature_object, pose_matrices, self.bone_indices)
+        positions = {i: j for j, i in enumerate(self.bone_indices)}
+        for j, i in enumerate(self.fallback_indices):
+            local[:, positions[i]] = self.fallback_local[:, j]
+        return write_local_matrices(self.armature_object, self.action, frames, self.bone_indices, local)
@@ -0,0 +1,69 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Compares baking deform bones with array operations to Blender's stock 'Bake Action'.
+
+Usage:
+
+    blender -b --factory-startup --python benchmarks/bench_bake.py
+"""
+
+import os
+import sys
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common  # noqa: E402
+import synthetic  # noqa: E402
+
+BONE_COUNT = 60
+FRAME_COUNTS = (50, 250, 1000)
+
+
+def bake_stock(rig: bpy.types.Object, frame_count: int):
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='POSE')
+    for pose_bone in rig.pose.bones:
+        pose_bone.bone.select = pose_bone.name.startswith('bone_')
+    bpy.ops.nla.bake(frame_start=1, frame_end=frame_count, only_selected=True, visual_keying=True,
+                     clear_constraints=False, use_current_action=False, bake_types={'POSE'})
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+
+def bake_arrays(bake, rig: bpy.types.Object, frame_count: int):
+    bone_names = [pose_bone.name for pose_bone in rig.pose.bones if pose_bone.name.startswith('bone_')]
+    bake.bake_pose(rig, bone_names, range(1, frame_count + 1), bpy.data.actions.new('Baked'))
+
+
+def main():
+    bake = common.load_addon_module('bake')
+    rows = []
+    for frame_count in FRAME_COUNTS:
+        rig = synthetic.create_rig(BONE_COUNT, frame_count)
+        action = rig.animation_data.action
+        stock = common.measure(lambda: bake_stock(rig, frame_count), repeat=1)
+        rig.animation_data.action = action
+        arrays = common.measure(lambda: bake_arrays(bake, rig, frame_count), repeat=1)
+        rows.append((frame_count, BONE_COUNT, '%.2f' % stock, '%.2f' % arrays, '%.1fx' % (stock / arrays)))
+        synthetic.remove_rig(rig)
+    common.print_table(('frames', 'bones', 'nla.bake, s', 'bake_pose, s', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
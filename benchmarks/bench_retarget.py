@@ -0,0 +1,62 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Measures frames retargeted per second between two synthetic rigs.
+
+Usage:
+
+    blender -b --factory-startup --python benchmarks/bench_retarget.py
+"""
+
+import os
+import sys
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common  # noqa: E402
+import synthetic  # noqa: E402
+
+BONE_COUNT = 60
+FRAME_COUNTS = (50, 250, 1000)
+
+
+def main():
+    bake = common.load_addon_module('bake')
+    retarget = common.load_addon_module('retarget')
+    rows = []
+    for frame_count in FRAME_COUNTS:
+        source = synthetic.create_rig(BONE_COUNT, frame_count, name='BenchSource')
+        target = synthetic.create_rig(BONE_COUNT, name='BenchTarget')
+        target.location = (0.0, 2.0, 0.0)
+        bpy.context.view_layer.update()
+        frames = range(1, frame_count + 1)
+        mapping = retarget.get_bone_mapping(source, target)
+        source_pose = bake.sample_pose_matrices(source, frames)
+        retargeter = retarget.Retargeter(source, target, mapping)
+        arrays = common.measure(lambda: retargeter.apply(source_pose))
+        total = common.measure(lambda: retarget.retarget(source, target, mapping, frames,
+                                                         bpy.data.actions.new('Retargeted')), repeat=1)
+        rows.append((frame_count, len(mapping), '%.0f' % (frame_count / arrays), '%.0f' % (frame_count / total)))
+        synthetic.remove_rig(target)
+        synthetic.remove_rig(source)
+    common.print_table(('frames', 'bones', 'apply, frames/s', 'retarget, frames/s'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Compares memory used by rigs added with and without shared rig data.
+
+Requires UE4_Mannequinn_Template.blend to be present in addon directory.
+
+Usage:
+
+    blender -b --factory-startup --python benchmarks/bench_rig_memory.py
+"""
+
+import gc
+import os
+import sys
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common  # noqa: E402
+
+RIG_COUNTS = (10, 100, 500)
+
+
+def remove_rigs():
+    for rig_object in [rig_object for rig_object in bpy.data.objects if rig_object.name.startswith('Bench')]:
+        bpy.data.objects.remove(rig_object)
+    # template objects are not removed, so their data is still in use
+    for collection in (bpy.data.meshes, bpy.data.armatures):
+        for datablock in [datablock for datablock in collection if datablock.users == 0]:
+            collection.remove(datablock)
+    gc.collect()
+
+
+def main():
+    addon = common.load_addon()
+    addon.register()
+    # load template into memory so that it is not accounted to the first measurement
+    common.load_addon_module('templates').get_template('DEFAULT')
+    rows = []
+    for rig_count in RIG_COUNTS:
+        row = [rig_count]
+        for share_data in (False, True):
+            memory_before = common.get_memory_usage()
+            elapsed = common.measure(lambda: bpy.ops.ue4_tools_animation.add_ue4_rig(
+                rig_name='Bench', count=rig_count, add_mesh=True, share_data=share_data), repeat=1)
+            memory_used = common.get_memory_usage() - memory_before
+            row += ['%.1f' % (memory_used / 2 ** 20), '%.2f' % elapsed]
+            remove_rigs()
+        rows.append(row)
+    common.print_table(('rigs', 'copied, MiB', 'copied, s', 'shared, MiB', 'shared, s'), rows)
+    addon.unregister()
+
+
+if __name__ == '__main__':
+    main()
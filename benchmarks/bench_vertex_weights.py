@@ -0,0 +1,86 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Compares vertex weight scan used by 'Auto-create deform bones' with per-vertex iteration.
+
+Both read weights with a Python loop over vertices, 'read' column shows how much of
+the scan that loop takes.
+
+Usage:
+
+    blender -b --factory-startup --python benchmarks/bench_vertex_weights.py
+"""
+
+import os
+import sys
+
+import bpy
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common  # noqa: E402
+
+VERTEX_COUNTS = (1000, 10000, 50000, 150000)
+GROUP_COUNT = 64
+INFLUENCES = 8
+
+
+def create_weighted_mesh(vertex_count: int) -> bpy.types.Object:
+    mesh = bpy.data.meshes.new('BenchWeights')
+    mesh.vertices.add(vertex_count)
+    mesh.vertices.foreach_set('co', numpy.random.random(vertex_count * 3).astype(numpy.float32))
+    mesh_object = bpy.data.objects.new('BenchWeights', mesh)
+    bpy.context.scene.collection.objects.link(mesh_object)
+    vertex_indices = numpy.arange(vertex_count)
+    for group in range(GROUP_COUNT):
+        vertex_group = mesh_object.vertex_groups.new(name='bone_%02d' % group)
+        # every vertex gets INFLUENCES consecutive groups, the last group only gets zero weights
+        assigned = vertex_indices[(group - vertex_indices) % GROUP_COUNT < INFLUENCES]
+        weight = 0.00001 if group == GROUP_COUNT - 1 else 1.0 / INFLUENCES
+        vertex_group.add(assigned.tolist(), weight, 'REPLACE')
+    return mesh_object
+
+
+def scan_per_vertex(mesh_object: bpy.types.Object):
+    """Scan as it was implemented before weights were reduced with NumPy."""
+    non_zero_vertex_groups = set()
+    for vertex in mesh_object.data.vertices:
+        for vertex_group in vertex.groups:
+            if round(vertex_group.weight, 4) > .0000:
+                non_zero_vertex_groups.add(vertex_group.group)
+    return {vertex_group.name for vertex_group in mesh_object.vertex_groups
+            if vertex_group.index in non_zero_vertex_groups}
+
+
+def main():
+    weights = common.load_addon_module('weights')
+    rows = []
+    for vertex_count in VERTEX_COUNTS:
+        mesh_object = create_weighted_mesh(vertex_count)
+        assert scan_per_vertex(mesh_object) == weights.get_weighted_vertex_group_names([mesh_object])
+        per_vertex = common.measure(lambda: scan_per_vertex(mesh_object))
+        read = common.measure(lambda: weights.read_vertex_weights(mesh_object.data))
+        total = common.measure(lambda: weights.get_weighted_vertex_group_names([mesh_object]))
+        rows.append((vertex_count, '%.3f' % per_vertex, '%.3f' % read, '%.3f' % total,
+                     '%.1fx' % (per_vertex / total)))
+        bpy.data.objects.remove(mesh_object)
+    common.print_table(('vertices', 'per-vertex, s', 'read, s', 'scan, s', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Helpers shared by benchmark scripts.
+
+Benchmarks are meant to be run by Blender in background mode, e.g.:
+
+    blender -b --factory-startup --python benchmarks/bench_vertex_weights.py
+"""
+
+import os
+import sys
+import time
+import importlib
+import importlib.util
+from pathlib import Path
+
+ADDON_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_addon():
+    """Imports addon package from the repository without registering it."""
+    name = ADDON_DIR.name
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, str(ADDON_DIR / '__init__.py'),
+                                                      submodule_search_locations=[str(ADDON_DIR)])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def load_addon_module(name: str):
+    """Imports addon submodule, helper modules are not imported until addon needs them."""
+    return importlib.import_module('%s.%s' % (load_addon().__name__, name))
+
+
+def measure(function, repeat: int = 3, setup=None) -> float:
+    """Returns best wall clock time of several function calls, in seconds.
+
+    Optional setup function is called before each call and is not timed.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def get_memory_usage() -> int:
+    """Returns resident set size of current process, in bytes (Linux only)."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + list(rows):
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,250 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Times addon operators on synthetic scenes of increasing size.
+
+Results can be written to a JSON file and compared against results of a previous run:
+
+    blender -b --factory-startup --python benchmarks/run.py -- --output results.json
+    blender -b --factory-startup --python benchmarks/run.py -- --baseline results.json
+
+When a baseline is given, Blender exits with code 1 if any case is slower than
+the baseline by more than the threshold.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common  # noqa: E402
+import synthetic  # noqa: E402
+
+RESULTS_VERSION = 1
+BONE_COUNT = 60
+
+
+def select_only(objects):
+    for selected_object in bpy.context.selected_objects:
+        selected_object.select_set(False)
+    for selected_object in objects:
+        selected_object.select_set(True)
+    bpy.context.view_layer.objects.active = objects[0] if len(objects) > 0 else None
+
+
+def run_operator(operator, **kwargs):
+    result = operator(**kwargs)
+    if 'FINISHED' not in result:
+        raise RuntimeError('%s did not finish: %s' % (operator.idname_py(), result))
+
+
+def bench_add_deform_bones_group(repeat: int, bone_count: int, vertex_count: int) -> float:
+    rig = synthetic.create_rig(bone_count, deform_group=False)
+    synthetic.create_skinned_mesh(rig, vertex_count)
+    select_only([rig])
+
+    def remove_group():
+        bone_group = rig.pose.bone_groups.get('DeformBones')
+        if bone_group is not None:
+            rig.pose.bone_groups.remove(bone_group)
+        common.load_addon_module('rig_cache').invalidate_bone_group_index(rig)
+
+    try:
+        return common.measure(lambda: run_operator(bpy.ops.ue4_tools_animation.add_deform_bones_group),
+                              repeat, setup=remove_group)
+    finally:
+        synthetic.remove_rig(rig)
+
+
+def bench_toggle_rig_property(repeat: int, rig_count: int) -> float:
+    rigs = [synthetic.create_rig(BONE_COUNT, name='BenchRig_%03d' % i) for i in range(rig_count)]
+    for rig in rigs:
+        synthetic.add_rig_properties(rig)
+    select_only(rigs)
+    try:
+        return common.measure(lambda: run_operator(bpy.ops.ue4_tools_animation.toggle_rig_property,
+                                                   property='IKMAIN', type='int'), repeat)
+    finally:
+        for rig in rigs:
+            synthetic.remove_rig(rig)
+
+
+def bench_add_ue4_rig(repeat: int, rig_count: int) -> float:
+    def remove_rigs():
+        for rig_object in [rig_object for rig_object in bpy.data.objects if rig_object.name.startswith('Bench')]:
+            bpy.data.objects.remove(rig_object)
+
+    try:
+        return common.measure(lambda: run_operator(bpy.ops.ue4_tools_animation.add_ue4_rig,
+                                                   rig_name='Bench', count=rig_count, add_mesh=True),
+                              repeat, setup=remove_rigs)
+    finally:
+        remove_rigs()
+
+
+def bench_set_ue4_scale(repeat: int, rig_count: int, frame_count: int) -> float:
+    rigs = [synthetic.create_rig(BONE_COUNT, frame_count, name='BenchRig_%03d' % i) for i in range(rig_count)]
+    for rig in rigs:
+        synthetic.create_skinned_mesh(rig, 10000)
+    select_only(rigs)
+    transform = common.load_addon_module('transform')
+    try:
+        # scale objects back down before each run, so that every run does the same work
+        return common.measure(lambda: run_operator(bpy.ops.ue4_tools_scene.set_ue4_scale, scale_selected=True),
+                              repeat, setup=lambda: transform.scale_objects(rigs, 0.01))
+    finally:
+        for rig in rigs:
+            synthetic.remove_rig(rig)
+
+
+def bench_validate_scene(repeat: int, object_count: int) -> float:
+    mesh_objects = synthetic.create_grid_meshes(object_count, 10)
+    bpy.ops.ue4_tools_validation.validate()
+    vertices = mesh_objects[0].data.vertices
+
+    def edit_one_mesh():
+        # only the edited mesh is checked again
+        vertices[0].co.z += 0.01
+        mesh_objects[0].data.update()
+        bpy.context.view_layer.update()
+
+    try:
+        return common.measure(lambda: run_operator(bpy.ops.ue4_tools_validation.validate), repeat,
+                              setup=edit_one_mesh)
+    finally:
+        synthetic.remove_meshes(mesh_objects)
+
+
+# case name: (benchmark function, sizes passed to it as keyword arguments)
+CASES = {
+    'add_deform_bones_group': (bench_add_deform_bones_group, (
+        {'bone_count': 60, 'vertex_count': 10000},
+        {'bone_count': 240, 'vertex_count': 50000},
+        {'bone_count': 960, 'vertex_count': 200000},
+    )),
+    'toggle_rig_property': (bench_toggle_rig_property, (
+        {'rig_count': 1},
+        {'rig_count': 10},
+        {'rig_count': 40},
+    )),
+    'add_ue4_rig': (bench_add_ue4_rig, (
+        {'rig_count': 1},
+        {'rig_count': 10},
+        {'rig_count': 50},
+    )),
+    'set_ue4_scale': (bench_set_ue4_scale, (
+        {'rig_count': 1, 'frame_count': 250},
+        {'rig_count': 10, 'frame_count': 250},
+        {'rig_count': 40, 'frame_count': 1000},
+    )),
+    'validate_scene': (bench_validate_scene, (
+        {'object_count': 200},
+        {'object_count': 2000},
+    )),
+}
+
+
+def get_case_id(name: str, size: dict) -> str:
+    return '%s[%s]' % (name, ','.join('%s=%d' % item for item in sorted(size.items())))
+
+
+def run(names, repeat: int) -> dict:
+    template_path = common.load_addon_module('templates').get_template_path()
+    results = {}
+    for name in names:
+        function, sizes = CASES[name]
+        if function is bench_add_ue4_rig and not os.path.exists(template_path):
+            print('Skipping %s: %s not found' % (name, template_path))
+            continue
+        for size in sizes:
+            case_id = get_case_id(name, size)
+            results[case_id] = function(repeat, **size)
+            print('%s: %.4f s' % (case_id, results[case_id]))
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """Prints results next to baseline ones and returns number of regressed cases."""
+    rows = []
+    regressions = 0
+    for case_id, seconds in results.items():
+        baseline_seconds = baseline.get(case_id)
+        if baseline_seconds is None:
+            rows.append((case_id, '-', '%.4f' % seconds, '-', 'new'))
+            continue
+        change = seconds / max(baseline_seconds, 1e-9) - 1
+        if change > threshold:
+            status = 'SLOWER'
+            regressions += 1
+        else:
+            status = 'faster' if change < -threshold else 'ok'
+        rows.append((case_id, '%.4f' % baseline_seconds, '%.4f' % seconds, '%+.1f%%' % (change * 100), status))
+    common.print_table(('case', 'baseline, s', 'current, s', 'change', 'status'), rows)
+    return regressions
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='run.py', description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare results to this JSON file written by a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as regression (default: 0.2)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of each case, best is taken')
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help='run only given cases')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    addon = common.load_addon()
+    addon.register()
+    try:
+        results = run(args.case or list(CASES), args.repeat)
+    finally:
+        addon.unregister()
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({
+                'version': RESULTS_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'environment': {
+                    'blender': bpy.app.version_string,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count(),
+                },
+                'results': results,
+            }, output_file, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('version') != RESULTS_VERSION:
+            print('Baseline %s has unsupported version' % args.baseline)
+            sys.exit(2)
+        if compare(results, baseline['results'], args.threshold) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Builders of synthetic rigs used by benchmarks."""
+
+import math
+import typing
+
+import bpy
+import numpy
+
+# deform bones are created in chains of this length, each chain ending with IK
+CHAIN_LENGTH = 10
+
+
+def create_rig(bone_count: int, frame_count: int = 0, name: str = 'BenchRig',
+               deform_group: bool = True) -> bpy.types.Object:
+    """Creates an armature with deform bone chains driven by IK towards animated control bones.
+
+    Deform bones are assigned to 'DeformBones' group, unless deform_group is False.
+    """
+    armature = bpy.data.armatures.new(name)
+    rig = bpy.data.objects.new(name, armature)
+    bpy.context.scene.collection.objects.link(rig)
+    bpy.context.view_layer.objects.active = rig
+    bpy.ops.object.mode_set(mode='EDIT')
+    edit_bones = armature.edit_bones
+    for i in range(bone_count):
+        chain, link = divmod(i, CHAIN_LENGTH)
+        bone = edit_bones.new('bone_%04d' % i)
+        bone.head = (chain * 0.5, 0.0, link * 0.2)
+        bone.tail = (chain * 0.5, 0.0, (link + 1) * 0.2)
+        if link > 0:
+            bone.parent = edit_bones['bone_%04d' % (i - 1)]
+            bone.use_connect = True
+        if link == CHAIN_LENGTH - 1 or i == bone_count - 1:
+            control = edit_bones.new('control_%04d' % chain)
+            control.head = (chain * 0.5 + 0.3, 0.0, (link + 1) * 0.2)
+            control.tail = (chain * 0.5 + 0.3, 0.0, (link + 1) * 0.2 + 0.1)
+            control.use_deform = False
+    bpy.ops.object.mode_set(mode='POSE')
+    deform_bones = rig.pose.bone_groups.new(name='DeformBones') if deform_group else None
+    for pose_bone in rig.pose.bones:
+        if pose_bone.name.startswith('bone_'):
+            if deform_bones is not None:
+                pose_bone.bone_group = deform_bones
+            chain, link = divmod(int(pose_bone.name[5:]), CHAIN_LENGTH)
+            if link == CHAIN_LENGTH - 1 or int(pose_bone.name[5:]) == bone_count - 1:
+                constraint = pose_bone.constraints.new('IK')
+                constraint.target = rig
+                constraint.subtarget = 'control_%04d' % chain
+                constraint.chain_count = link + 1
+    # animate control bones
+    if frame_count > 0:
+        for pose_bone in rig.pose.bones:
+            if pose_bone.name.startswith('control_'):
+                for frame in range(0, frame_count + 1, 10):
+                    pose_bone.location = (math.sin(frame * 0.1) * 0.3, math.cos(frame * 0.1) * 0.3, 0.0)
+                    pose_bone.keyframe_insert('location', frame=frame)
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return rig
+
+
+def create_skinned_mesh(rig: bpy.types.Object, vertex_count: int, influences: int = 4) -> bpy.types.Object:
+    """Creates a point cloud mesh parented to a rig, each vertex weighted to several of its deform bones."""
+    bone_names = [bone.name for bone in rig.data.bones if bone.name.startswith('bone_')]
+    mesh = bpy.data.meshes.new(rig.name + '_Mesh')
+    mesh.vertices.add(vertex_count)
+    mesh.vertices.foreach_set('co', numpy.random.random(vertex_count * 3).astype(numpy.float32))
+    mesh_object = bpy.data.objects.new(rig.name + '_Mesh', mesh)
+    bpy.context.scene.collection.objects.link(mesh_object)
+    mesh_object.parent = rig
+    mesh_object.modifiers.new('Armature', 'ARMATURE').object = rig
+    vertex_indices = numpy.arange(vertex_count)
+    for group, bone_name in enumerate(bone_names):
+        vertex_group = mesh_object.vertex_groups.new(name=bone_name)
+        assigned = vertex_indices[(group - vertex_indices) % len(bone_names) < influences]
+        vertex_group.add(assigned.tolist(), 1.0 / influences, 'REPLACE')
+    return mesh_object
+
+
+def add_rig_properties(rig: bpy.types.Object):
+    """Adds custom properties and control bone groups of UE4 rig, toggled from the Animation panel."""
+    for property in ('Constraints_ON_OFF', 'IKMAIN', 'IKARMS', 'IKLEGS'):
+        rig[property] = 1
+    for property in ('Ik Arm R', 'IK Arm L', 'Ik hand R Lock', 'Ik Hand L Lock',
+                     'Ik Leg R', 'Ik Leg L', 'Foot Lock R', 'Foot Lock L'):
+        rig[property] = 1.0
+    control_bones = [pose_bone for pose_bone in rig.pose.bones if pose_bone.name.startswith('control_')]
+    group_names = ('Ik_Arm_controls', 'roll_Arms_controls', 'Ik_Leg_controls', 'roll_Legs_controls')
+    for i, group_name in enumerate(group_names):
+        bone_group = rig.pose.bone_groups.new(name=group_name)
+        for pose_bone in control_bones[i::len(group_names)]:
+            pose_bone.bone_group = bone_group
+
+
+def remove_rig(rig: bpy.types.Object):
+    """Removes a rig along with its child meshes."""
+    for child in list(rig.children):
+        data = child.data
+        bpy.data.objects.remove(child)
+        if isinstance(data, bpy.types.Mesh) and data.users == 0:
+            bpy.data.meshes.remove(data)
+    armature = rig.data
+    action = rig.animation_data.action if rig.animation_data is not None else None
+    bpy.data.objects.remove(rig)
+    bpy.data.armatures.remove(armature)
+    if action is not None and action.users == 0:
+        bpy.data.actions.remove(action)
+
+
+def create_grid_meshes(count: int, size: int) -> typing.List[bpy.types.Object]:
+    """Creates objects with their own size x size quad grid meshes, laid out in a row."""
+    x, y = numpy.meshgrid(numpy.arange(size + 1, dtype=numpy.float32), numpy.arange(size + 1, dtype=numpy.float32))
+    vertices = numpy.stack([x.ravel(), y.ravel(), numpy.zeros(x.size, dtype=numpy.float32)], axis=1).tolist()
+    corners = numpy.arange((size + 1) * (size + 1)).reshape(size + 1, size + 1)[:-1, :-1].ravel()
+    faces = numpy.stack([corners, corners + 1, corners + size + 2, corners + size + 1], axis=1).tolist()
+    mesh_objects = []
+    for i in range(count):
+        mesh = bpy.data.meshes.new('BenchGrid_%04d' % i)
+        mesh.from_pydata(vertices, [], faces)
+        mesh_object = bpy.data.objects.new(mesh.name, mesh)
+        mesh_object.location = (i * (size + 1), 0.0, 0.0)
+        bpy.context.scene.collection.objects.link(mesh_object)
+        mesh_objects.append(mesh_object)
+    return mesh_objects
+
+
+def remove_meshes(mesh_objects: typing.Iterable[bpy.types.Object]):
+    for mesh_object in list(mesh_objects):
+        mesh = mesh_object.data
+        bpy.data.objects.remove(mesh_object)
+        if mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
@@ -0,0 +1,222 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import math
+import typing
+
+import bpy
+import bmesh
+import numpy
+
+# UE4 recognizes collision meshes by this name prefix
+COLLISION_PREFIX = 'UCX_'
+# a split is kept only if it reduces total hull volume at least by this fraction
+MIN_SPLIT_GAIN = 0.1
+# split positions tried along the longest axis of a part, relative to its extent
+SPLIT_POSITIONS = (0.25, 0.5, 0.75)
+
+
+def get_collision_name(name: str, index: int) -> str:
+    """Returns name of a collision mesh following UE convention, e.g. UCX_SM_Chair_01."""
+    return '%s%s_%02d' % (COLLISION_PREFIX, name, index + 1)
+
+
+def get_collision_items(mesh_objects: typing.Iterable[bpy.types.Object], output_dir: str) -> typing.List[dict]:
+    """Returns work items for building collision hulls of every mesh object in background workers.
+
+    Library files are numbered, since different object names may get the same clean name.
+    """
+    return [{
+        'name': mesh_object.name,
+        'object': mesh_object.name,
+        'filepath': os.path.join(output_dir, '%s_%d.blend' % (bpy.path.clean_name(mesh_object.name), index)),
+    } for index, mesh_object in enumerate(mesh_objects)]
+
+
+def get_fibonacci_directions(count: int) -> numpy.ndarray:
+    """Returns (count, 3) unit vectors evenly spread over a sphere."""
+    i = numpy.arange(count) + 0.5
+    z = 1 - 2 * i / count
+    radius = numpy.sqrt(1 - z * z)
+    angle = math.pi * (1 + math.sqrt(5)) * i
+    return numpy.stack([radius * numpy.cos(angle), radius * numpy.sin(angle), z], axis=1)
+
+
+def get_extreme_points(points: numpy.ndarray, vertex_budget: int) -> numpy.ndarray:
+    """Returns at most vertex_budget points farthest along evenly spread directions.
+
+    All of them are vertices of the convex hull of points, and the hull of them
+    approximates the full hull from inside.
+    """
+    if len(points) <= vertex_budget:
+        return points
+    directions = get_fibonacci_directions(vertex_budget)
+    center = (points.min(axis=0) + points.max(axis=0)) / 2
+    indices = numpy.unique(numpy.argmax((points - center) @ directions.T, axis=0))
+    return points[indices]
+
+
+def build_hull(points: numpy.ndarray) -> typing.Optional[bmesh.types.BMesh]:
+    """Returns convex hull of points, or None if points do not enclose any volume."""
+    if len(points) < 4:
+        return None
+    bm = bmesh.new()
+    for point in points.tolist():
+        bm.verts.new(point)
+    result = bmesh.ops.convex_hull(bm, input=bm.verts)
+    unused = [element for element in result['geom_interior'] + result['geom_unused']
+              if isinstance(element, bmesh.types.BMVert)]
+    bmesh.ops.delete(bm, geom=unused, context='VERTS')
+    if len(bm.faces) < 4 or bm.calc_volume() <= 0:
+        bm.free()
+        return None
+    return bm
+
+
+def get_hull_volume(points: numpy.ndarray, vertex_budget: int) -> float:
+    bm = build_hull(get_extreme_points(points, vertex_budget))
+    if bm is None:
+        return 0.0
+    volume = bm.calc_volume()
+    bm.free()
+    return volume
+
+
+def split_part(points: numpy.ndarray, edges: numpy.ndarray, axis: int,
+               value: float) -> typing.List[typing.Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Splits mesh vertices and edges by an axis aligned plane.
+
+    Points where edges cross the plane are added to both halves, so that hulls
+    of the halves meet at the plane without gaps.
+    """
+    below = points[:, axis] <= value
+    first, second = edges[:, 0], edges[:, 1]
+    crossing = below[first] != below[second]
+    first_points, second_points = points[first[crossing]], points[second[crossing]]
+    t = (value - first_points[:, axis]) / (second_points[:, axis] - first_points[:, axis])
+    cut_points = first_points + (second_points - first_points) * t[:, None]
+    parts = []
+    for side in (below, ~below):
+        indices = numpy.full(len(points), -1, dtype=numpy.int64)
+        indices[side] = numpy.arange(numpy.count_nonzero(side))
+        side_count = numpy.count_nonzero(side)
+        # crossing edges are cut at the plane
+        inner = numpy.where(side[first[crossing]], first[crossing], second[crossing])
+        cut_edges = numpy.stack([indices[inner], side_count + numpy.arange(len(cut_points))], axis=1)
+        parts.append((numpy.concatenate([points[side], cut_points]),
+                      numpy.concatenate([indices[edges[side[first] & side[second]]], cut_edges]).reshape(-1, 2)))
+    return parts
+
+
+def decompose(points: numpy.ndarray, edges: numpy.ndarray, max_hulls: int,
+              vertex_budget: int) -> typing.List[numpy.ndarray]:
+    """Approximately decomposes a mesh into at most max_hulls convex parts.
+
+    The part with the largest hull is split by a plane across its longest axis
+    for as long as splitting noticeably reduces total volume of hulls, which is
+    the case for concave parts. Returns points of every part.
+    """
+    parts = [(points, edges, get_hull_volume(points, vertex_budget))]
+    final = []
+    while len(parts) > 0 and len(parts) + len(final) < max_hulls:
+        parts.sort(key=lambda part: part[2])
+        part_points, part_edges, volume = parts.pop()
+        extent = part_points.max(axis=0) - part_points.min(axis=0)
+        axis = int(numpy.argmax(extent))
+        best = None
+        for position in SPLIT_POSITIONS:
+            value = part_points[:, axis].min() + extent[axis] * position
+            halves = [(half_points, half_edges, get_hull_volume(half_points, vertex_budget))
+                      for half_points, half_edges in split_part(part_points, part_edges, axis, value)]
+            split_volume = sum(half[2] for half in halves)
+            if best is None or split_volume < best[0]:
+                best = (split_volume, halves)
+        if best is not None and best[0] < volume * (1 - MIN_SPLIT_GAIN):
+            parts.extend(half for half in best[1] if half[2] > 0)
+        else:
+            final.append((part_points, part_edges, volume))
+    return [part[0] for part in final + parts if part[2] > 0]
+
+
+def read_mesh(mesh: bpy.types.Mesh) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+    points = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+    mesh.vertices.foreach_get('co', points)
+    edges = numpy.empty(len(mesh.edges) * 2, dtype=numpy.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    return points.reshape(-1, 3).astype(numpy.float64), edges.reshape(-1, 2).astype(numpy.int64)
+
+
+def build_collision(item: dict, options: dict) -> dict:
+    """Builds collision hulls of an object and writes them to a library file.
+
+    This is run by background workers on a copy of the current file. Hulls enclose
+    the mesh with modifiers applied. No hulls are built for flat meshes.
+    """
+    from . import lods
+    source: bpy.types.Object = bpy.data.objects[item['object']]
+    evaluated_mesh = lods.new_mesh_from_object(source)
+    points, edges = read_mesh(evaluated_mesh)
+    bpy.data.meshes.remove(evaluated_mesh)
+    if options['max_hulls'] > 1:
+        parts = decompose(points, edges, options['max_hulls'], options['vertex_budget'])
+    else:
+        parts = [points]
+    meshes = []
+    for index, part_points in enumerate(parts):
+        bm = build_hull(get_extreme_points(part_points, options['vertex_budget']))
+        if bm is None:
+            continue
+        mesh = bpy.data.meshes.new(get_collision_name(source.name, index))
+        bm.to_mesh(mesh)
+        bm.free()
+        meshes.append(mesh)
+    bpy.data.libraries.write(item['filepath'], set(meshes), fake_user=True)
+    return {
+        'filepath': item['filepath'],
+        'meshes': [mesh.name for mesh in meshes],
+        'vertices': [len(mesh.vertices) for mesh in meshes],
+    }
+
+
+def add_collision(source: bpy.types.Object, filepath: str,
+                  mesh_names: typing.List[str]) -> typing.List[bpy.types.Object]:
+    """Appends collision meshes written by build_collision() and adds objects parented to source object.
+
+    Previously generated collision of the object is replaced.
+    """
+    prefix = '%s%s_' % (COLLISION_PREFIX, source.name)
+    for previous in [child for child in source.children if child.name.startswith(prefix)]:
+        previous_mesh = previous.data
+        bpy.data.objects.remove(previous)
+        if previous_mesh is not None and previous_mesh.users == 0:
+            bpy.data.meshes.remove(previous_mesh)
+    with bpy.data.libraries.load(filepath, link=False) as (data_from, data_to):
+        data_to.meshes = list(mesh_names)
+    collision_objects = []
+    for index, mesh in enumerate(data_to.meshes):
+        name = get_collision_name(source.name, index)
+        mesh.use_fake_user = False
+        mesh.name = name
+        collision_object = bpy.data.objects.new(name, mesh)
+        collision_object.parent = source
+        collision_object.display_type = 'WIRE'
+        for collection in source.users_collection:
+            collection.objects.link(collision_object)
+        collision_objects.append(collision_object)
+    return collision_objects
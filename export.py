@@ -0,0 +1,106 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import re
+import math
+import typing
+
+import bpy
+
+from . import rig_cache
+
+
+# matches bone name in pose bone f-curve data paths
+POSE_BONE_DATA_PATH = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+
+
+def get_deform_bone_names(armature_object: bpy.types.Object) -> typing.Set[str]:
+    return set(rig_cache.get_bone_group_bones(armature_object, 'DeformBones') or ())
+
+
+def get_action_bone_names(action: bpy.types.Action) -> typing.Set[str]:
+    """Returns names of pose bones animated by an action."""
+    bone_names = set()
+    for fcurve in action.fcurves:
+        match = POSE_BONE_DATA_PATH.match(fcurve.data_path)
+        if match is not None:
+            bone_names.add(match.group(1).replace('\\"', '"').replace('\\\\', '\\'))
+    return bone_names
+
+
+def get_deform_actions(armature_object: bpy.types.Object) -> typing.List[bpy.types.Action]:
+    """Returns actions animating any of armature's deform bones."""
+    deform_bone_names = get_deform_bone_names(armature_object)
+    return [action for action in bpy.data.actions
+            if action.id_root in ('OBJECT', 'NONE') and not deform_bone_names.isdisjoint(get_action_bone_names(action))]
+
+
+def get_export_items(armature_object: bpy.types.Object, export_dir: str) -> typing.List[dict]:
+    """Returns work items for exporting every deform action of an armature to its own FBX file."""
+    return [{
+        'name': '%s/%s' % (armature_object.name, action.name),
+        'armature': armature_object.name,
+        'action': action.name,
+        'filepath': os.path.join(export_dir, '%s_%s.fbx' % (bpy.path.clean_name(armature_object.name),
+                                                            bpy.path.clean_name(action.name))),
+    } for action in get_deform_actions(armature_object)]
+
+
+def export_action(item: dict, options: dict) -> dict:
+    """Exports a single action to FBX file.
+
+    This is run by background workers on a copy of the current file,
+    so the armature is freely modified to fit export.
+    """
+    context = bpy.context
+    armature_object: bpy.types.Object = bpy.data.objects[item['armature']]
+    action: bpy.types.Action = bpy.data.actions[item['action']]
+    # FBX exporter limits exported bones by deform flag
+    deform_bone_names = get_deform_bone_names(armature_object)
+    for bone in armature_object.data.bones:
+        bone.use_deform = bone.name in deform_bone_names
+    # select objects to be exported
+    for selected_object in context.selected_objects:
+        selected_object.select_set(False)
+    armature_object.select_set(True)
+    context.view_layer.objects.active = armature_object
+    object_types = {'ARMATURE'}
+    if options.get('include_mesh'):
+        object_types.add('MESH')
+        for child in armature_object.children:
+            if child.type == 'MESH':
+                child.select_set(True)
+    # play only the exported action
+    animation_data = armature_object.animation_data_create()
+    animation_data.use_nla = False
+    animation_data.action = action
+    frame_start, frame_end = action.frame_range
+    context.scene.frame_start = int(math.floor(frame_start))
+    context.scene.frame_end = int(math.ceil(frame_end))
+    bpy.ops.export_scene.fbx(filepath=item['filepath'],
+                             use_selection=True,
+                             object_types=object_types,
+                             apply_unit_scale=True,
+                             use_armature_deform_only=True,
+                             add_leaf_bones=False,
+                             bake_anim=True,
+                             bake_anim_use_all_actions=False,
+                             bake_anim_use_nla_strips=False,
+                             bake_anim_force_startend_keying=True)
+    return {'filepath': item['filepath']}
@@ -0,0 +1,218 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import json
+import typing
+import hashlib
+
+import bpy
+import numpy
+
+from . import export
+from . import weights
+
+
+MANIFEST_NAME = 'ue4_tools_export.json'
+# bump when anything affecting exported files changes, e.g. exporter settings
+MANIFEST_VERSION = 1
+
+# (attribute, size) of pose bone transforms read for hashing
+POSE_BONE_TRANSFORMS = (
+    ('location', 3),
+    ('rotation_quaternion', 4),
+    ('rotation_euler', 3),
+    ('rotation_axis_angle', 4),
+    ('scale', 3),
+)
+
+
+class ExportManifest:
+    """Content hashes of files exported to a directory.
+
+    Manifest is stored next to exported files, so each output directory
+    keeps track of its own content.
+    """
+
+    def __init__(self, export_dir: str):
+        self.path = os.path.join(export_dir, MANIFEST_NAME)
+        self.files: typing.Dict[str, str] = {}
+        try:
+            with open(self.path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.files = manifest['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def is_up_to_date(self, item: dict) -> bool:
+        return os.path.exists(item['filepath']) and self.files.get(os.path.basename(item['filepath'])) == item['hash']
+
+    def update(self, item: dict):
+        self.files[os.path.basename(item['filepath'])] = item['hash']
+
+    def discard(self, item: dict):
+        self.files.pop(os.path.basename(item['filepath']), None)
+
+    def save(self):
+        with open(self.path, 'w') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, manifest_file, indent=1, sort_keys=True)
+
+
+def assign_hashes(items: typing.List[dict], armature_object: bpy.types.Object, options: dict):
+    """Sets 'hash' of export items of an armature.
+
+    Hash covers action f-curves, DeformBones membership, armature rest pose
+    and transformation, everything else affecting the baked pose (pose bone
+    transforms, constraints, drivers and custom properties), exported meshes
+    with their UVs, normals, materials, shape keys, modifiers and weights,
+    and export options.
+    """
+    armature_hash = hashlib.blake2b(digest_size=16)
+    armature_hash.update(json.dumps(options, sort_keys=True).encode())
+    _update_armature_hash(armature_hash, armature_object)
+    if options.get('include_mesh'):
+        for child in sorted(armature_object.children, key=lambda child: child.name):
+            if child.type == 'MESH':
+                _update_mesh_hash(armature_hash, child)
+    for item in items:
+        item_hash = armature_hash.copy()
+        _update_action_hash(item_hash, bpy.data.actions[item['action']])
+        item['hash'] = item_hash.hexdigest()
+
+
+def _update_armature_hash(content_hash, armature_object: bpy.types.Object):
+    content_hash.update('\0'.join(sorted(export.get_deform_bone_names(armature_object))).encode())
+    bones = armature_object.data.bones
+    content_hash.update('\0'.join(bone.name for bone in bones).encode())
+    content_hash.update(_read_floats(bones, 'matrix_local', 16))
+    content_hash.update(numpy.array(armature_object.matrix_world, dtype=numpy.float32).tobytes())
+    # exporter bakes the evaluated pose, so everything the pose depends on is hashed
+    pose_bones = armature_object.pose.bones
+    for attribute, size in POSE_BONE_TRANSFORMS:
+        content_hash.update(_read_floats(pose_bones, attribute, size))
+    content_hash.update(','.join(pose_bone.rotation_mode for pose_bone in pose_bones).encode())
+    for owner in (armature_object, armature_object.data) + tuple(pose_bones):
+        _update_id_properties_hash(content_hash, owner)
+        # armature data has no constraints
+        for constraint in getattr(owner, 'constraints', ()):
+            _update_struct_hash(content_hash, constraint)
+    for owner in (armature_object, armature_object.data):
+        if owner.animation_data is not None:
+            for fcurve in sorted(owner.animation_data.drivers,
+                                 key=lambda fcurve: (fcurve.data_path, fcurve.array_index)):
+                _update_fcurve_hash(content_hash, fcurve)
+                _update_struct_hash(content_hash, fcurve.driver)
+                for variable in fcurve.driver.variables:
+                    _update_struct_hash(content_hash, variable)
+                    for target in variable.targets:
+                        _update_struct_hash(content_hash, target)
+
+
+def _update_id_properties_hash(content_hash, owner: bpy.types.bpy_struct):
+    """Hashes custom properties of an ID or a struct supporting them, such as a pose bone."""
+    for key in sorted(owner.keys()):
+        value = owner[key]
+        if hasattr(value, 'to_dict'):
+            value = value.to_dict()
+        elif hasattr(value, 'to_list'):
+            value = value.to_list()
+        content_hash.update(('%s=%r;' % (key, value)).encode())
+
+
+def _update_mesh_hash(content_hash, mesh_object: bpy.types.Object):
+    mesh = mesh_object.data
+    content_hash.update(mesh_object.name.encode())
+    content_hash.update(numpy.array(mesh_object.matrix_world, dtype=numpy.float32).tobytes())
+    content_hash.update(_read_floats(mesh.vertices, 'co', 3))
+    content_hash.update(_read_ints(mesh.loops, 'vertex_index'))
+    content_hash.update(_read_ints(mesh.polygons, 'loop_total'))
+    content_hash.update(_read_ints(mesh.polygons, 'material_index'))
+    content_hash.update(_read_bools(mesh.polygons, 'use_smooth'))
+    content_hash.update(_read_bools(mesh.edges, 'use_edge_sharp'))
+    content_hash.update(('%d%f' % (mesh.use_auto_smooth, mesh.auto_smooth_angle)).encode())
+    if mesh.has_custom_normals:
+        mesh.calc_normals_split()
+        content_hash.update(_read_floats(mesh.loops, 'normal', 3))
+    for uv_layer in mesh.uv_layers:
+        content_hash.update(uv_layer.name.encode())
+        content_hash.update(_read_floats(uv_layer.data, 'uv', 2))
+    content_hash.update('\0'.join('%s:%s' % (slot.link, slot.material.name if slot.material is not None else '')
+                                   for slot in mesh_object.material_slots).encode())
+    if mesh.shape_keys is not None:
+        for key_block in mesh.shape_keys.key_blocks:
+            content_hash.update(('%s:%s:%f:%d' % (key_block.name, key_block.relative_key.name,
+                                                  key_block.value, key_block.mute)).encode())
+            content_hash.update(_read_floats(key_block.data, 'co', 3))
+    for modifier in mesh_object.modifiers:
+        _update_struct_hash(content_hash, modifier)
+    content_hash.update('\0'.join(vertex_group.name for vertex_group in mesh_object.vertex_groups).encode())
+    vertex_weights = weights.read_vertex_weights(mesh)
+    for array in (vertex_weights.counts, vertex_weights.groups, vertex_weights.weights):
+        content_hash.update(array.tobytes())
+
+
+def _update_struct_hash(content_hash, struct: bpy.types.bpy_struct):
+    """Hashes values of all properties of a struct, e.g. a modifier, with ID references by name."""
+    content_hash.update(struct.bl_rna.identifier.encode())
+    for prop in struct.bl_rna.properties:
+        if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+            continue
+        value = getattr(struct, prop.identifier)
+        if prop.type == 'POINTER':
+            value = value.name if isinstance(value, bpy.types.ID) else None
+        elif isinstance(value, set):
+            # enum flags
+            value = sorted(value)
+        elif getattr(prop, 'is_array', False):
+            value = tuple(value)
+        content_hash.update(('%s=%r;' % (prop.identifier, value)).encode())
+
+
+def _update_action_hash(content_hash, action: bpy.types.Action):
+    for fcurve in sorted(action.fcurves, key=lambda fcurve: (fcurve.data_path, fcurve.array_index)):
+        _update_fcurve_hash(content_hash, fcurve)
+
+
+def _update_fcurve_hash(content_hash, fcurve: bpy.types.FCurve):
+    content_hash.update(('%s[%d]%d%s' % (fcurve.data_path, fcurve.array_index,
+                                         fcurve.mute, fcurve.extrapolation)).encode())
+    points = fcurve.keyframe_points
+    for attribute in ('co', 'handle_left', 'handle_right'):
+        content_hash.update(_read_floats(points, attribute, 2))
+    content_hash.update(','.join(point.interpolation for point in points).encode())
+    for modifier in fcurve.modifiers:
+        _update_struct_hash(content_hash, modifier)
+
+
+def _read_floats(collection: bpy.types.bpy_prop_collection, attribute: str, size: int) -> bytes:
+    values = numpy.empty(len(collection) * size, dtype=numpy.float32)
+    collection.foreach_get(attribute, values)
+    return values.tobytes()
+
+
+def _read_bools(collection: bpy.types.bpy_prop_collection, attribute: str) -> bytes:
+    values = numpy.empty(len(collection), dtype=bool)
+    collection.foreach_get(attribute, values)
+    return values.tobytes()
+
+
+def _read_ints(collection: bpy.types.bpy_prop_collection, attribute: str) -> bytes:
+    values = numpy.empty(len(collection), dtype=numpy.int32)
+    collection.foreach_get(attribute, values)
+    return values.tobytes()
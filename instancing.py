@@ -0,0 +1,192 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import json
+import typing
+import hashlib
+
+import bpy
+import numpy
+from mathutils import Matrix
+
+from . import layout
+
+
+LAYOUT_VERSION = 1
+# instance transforms are rounded to this number of decimal places in layout files
+LAYOUT_PRECISION = 4
+# static mesh actor of T3D layout, as copied from UE level editor
+T3D_ACTOR = '''      Begin Actor Class=StaticMeshActor Name=%(name)s Archetype=StaticMeshActor'/Script/Engine.Default__StaticMeshActor'
+         Begin Object Class=StaticMeshComponent Name="StaticMeshComponent0" Archetype=StaticMeshComponent'/Script/Engine.Default__StaticMeshActor:StaticMeshComponent0'
+         End Object
+         Begin Object Name="StaticMeshComponent0"
+            StaticMesh=StaticMesh'%(asset)s'
+            RelativeLocation=%(location)s
+            RelativeRotation=%(rotation)s
+            RelativeScale3D=%(scale)s
+         End Object
+         StaticMeshComponent=StaticMeshComponent0
+         RootComponent=StaticMeshComponent0
+         ActorLabel="%(label)s"
+      End Actor
+'''
+
+
+class MeshGroup:
+    """Objects sharing identical mesh geometry, exported as a single mesh."""
+    __slots__ = ('hash', 'name', 'objects')
+
+    def __init__(self, geometry_hash: str, name: str):
+        self.hash = geometry_hash
+        self.name = name
+        self.objects: typing.List[bpy.types.Object] = []
+
+
+def _read_array(collection: bpy.types.bpy_prop_collection, attribute: str, size: int, dtype) -> numpy.ndarray:
+    values = numpy.empty(len(collection) * size, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    return values
+
+
+def hash_mesh(mesh: bpy.types.Mesh) -> str:
+    """Returns hash of mesh geometry, UVs and materials, read with bulk array access."""
+    content_hash = hashlib.blake2b(digest_size=16)
+    content_hash.update(_read_array(mesh.vertices, 'co', 3, numpy.float32).tobytes())
+    content_hash.update(_read_array(mesh.loops, 'vertex_index', 1, numpy.int32).tobytes())
+    content_hash.update(_read_array(mesh.polygons, 'loop_total', 1, numpy.int32).tobytes())
+    content_hash.update(_read_array(mesh.polygons, 'material_index', 1, numpy.int32).tobytes())
+    content_hash.update(_read_array(mesh.polygons, 'use_smooth', 1, numpy.bool_).tobytes())
+    for uv_layer in mesh.uv_layers:
+        content_hash.update(uv_layer.name.encode())
+        content_hash.update(_read_array(uv_layer.data, 'uv', 2, numpy.float32).tobytes())
+    content_hash.update('\0'.join(material.name if material is not None else ''
+                                  for material in mesh.materials).encode())
+    return content_hash.hexdigest()
+
+
+def iter_mesh_groups(mesh_objects: typing.Sequence[bpy.types.Object],
+                     groups: typing.List[MeshGroup]) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Groups objects with identical geometry, appending groups to a list.
+
+    Each mesh datablock is hashed once. Objects with modifiers, or with materials
+    linked to the object, are not grouped with others, since their exported
+    geometry is not defined by the mesh alone. Yields (done, total) progress.
+    """
+    mesh_hashes: typing.Dict[str, str] = {}
+    groups_by_hash: typing.Dict[str, MeshGroup] = {}
+    names = set()
+    for i, mesh_object in enumerate(mesh_objects):
+        mesh = mesh_object.data
+        geometry_hash = mesh_hashes.get(mesh.name)
+        if geometry_hash is None:
+            geometry_hash = mesh_hashes[mesh.name] = hash_mesh(mesh)
+        if len(mesh_object.modifiers) > 0 or any(slot.link == 'OBJECT' for slot in mesh_object.material_slots):
+            geometry_hash = hashlib.blake2b((geometry_hash + mesh_object.name).encode(), digest_size=16).hexdigest()
+        group = groups_by_hash.get(geometry_hash)
+        if group is None:
+            name = bpy.path.clean_name(mesh.name)
+            # different meshes may get the same clean name
+            unique_name, n = name, 1
+            while unique_name in names:
+                unique_name = '%s_%d' % (name, n)
+                n += 1
+            names.add(unique_name)
+            group = groups_by_hash[geometry_hash] = MeshGroup(geometry_hash, unique_name)
+            groups.append(group)
+        group.objects.append(mesh_object)
+        yield i + 1, len(mesh_objects)
+
+
+def get_export_items(groups: typing.Iterable[MeshGroup], export_dir: str) -> typing.List[dict]:
+    """Returns work items for exporting one object of every group to its own FBX file."""
+    return [{
+        'name': group.name,
+        'object': group.objects[0].name,
+        'filepath': os.path.join(export_dir, '%s.fbx' % group.name),
+        'hash': group.hash,
+    } for group in groups]
+
+
+def export_mesh(item: dict, options: dict) -> dict:
+    """Exports a single mesh object to FBX file, with its transformation cleared.
+
+    This is run by background workers on a copy of the current file.
+    """
+    context = bpy.context
+    mesh_object: bpy.types.Object = bpy.data.objects[item['object']]
+    mesh_object.parent = None
+    mesh_object.matrix_world = Matrix.Identity(4)
+    for selected_object in context.selected_objects:
+        selected_object.select_set(False)
+    mesh_object.select_set(True)
+    context.view_layer.objects.active = mesh_object
+    bpy.ops.export_scene.fbx(filepath=item['filepath'],
+                             use_selection=True,
+                             object_types={'MESH'},
+                             apply_unit_scale=True,
+                             use_mesh_modifiers=True,
+                             bake_anim=False)
+    return {'filepath': item['filepath']}
+
+
+def get_instance_transforms(group: MeshGroup, unit_scale: float) -> numpy.ndarray:
+    """Returns (N, 9) UE location, rotator and scale of every object of a group."""
+    location, rotator, scale = layout.to_ue_transforms(layout.read_world_matrices(group.objects), unit_scale)
+    return numpy.round(numpy.concatenate([location, rotator, scale], axis=1), LAYOUT_PRECISION)
+
+
+def write_json_layout(filepath: str, groups: typing.Sequence[MeshGroup], content_path: str, unit_scale: float):
+    """Writes instance transforms of every mesh, meant to be loaded as instanced static meshes.
+
+    Each instance is [x, y, z, pitch, yaw, roll, scale x, scale y, scale z] in UE units.
+    """
+    meshes = []
+    for group in groups:
+        meshes.append({
+            'name': group.name,
+            'asset': get_asset_path(content_path, group.name),
+            'file': '%s.fbx' % group.name,
+            'objects': [obj.name for obj in group.objects],
+            'instances': get_instance_transforms(group, unit_scale).tolist(),
+        })
+    with open(filepath, 'w') as layout_file:
+        json.dump({'version': LAYOUT_VERSION, 'meshes': meshes}, layout_file, separators=(',', ':'))
+
+
+def write_t3d_layout(filepath: str, groups: typing.Sequence[MeshGroup], content_path: str, unit_scale: float):
+    """Writes static mesh actors in T3D format, which can be pasted into UE level editor."""
+    with open(filepath, 'w') as layout_file:
+        layout_file.write('Begin Map\n   Begin Level\n')
+        for group in groups:
+            asset = get_asset_path(content_path, group.name)
+            for obj, transform in zip(group.objects, get_instance_transforms(group, unit_scale).tolist()):
+                layout_file.write(T3D_ACTOR % {
+                    'name': bpy.path.clean_name(obj.name),
+                    'label': obj.name.replace('"', ''),
+                    'asset': asset,
+                    'location': '(X=%g,Y=%g,Z=%g)' % tuple(transform[0:3]),
+                    'rotation': '(Pitch=%g,Yaw=%g,Roll=%g)' % tuple(transform[3:6]),
+                    'scale': '(X=%g,Y=%g,Z=%g)' % tuple(transform[6:9]),
+                })
+        layout_file.write('   End Level\nBegin Surface\nEnd Surface\nEnd Map\n')
+
+
+def get_asset_path(content_path: str, name: str) -> str:
+    return '%s/%s.%s' % (content_path.rstrip('/'), name, name)
+
@@ -0,0 +1,119 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import time
+import typing
+
+import bpy
+
+
+# events passed through to the user interface while a job is running,
+# view can be navigated, but nothing that could change data the job works on
+NAVIGATION_EVENTS = {
+    'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE',
+    'TRACKPADPAN', 'TRACKPADZOOM', 'MOUSEROTATE', 'NDOF_MOTION',
+    'NUMPAD_0', 'NUMPAD_1', 'NUMPAD_2', 'NUMPAD_3', 'NUMPAD_4', 'NUMPAD_5',
+    'NUMPAD_6', 'NUMPAD_7', 'NUMPAD_8', 'NUMPAD_9', 'NUMPAD_PERIOD', 'NUMPAD_PLUS', 'NUMPAD_MINUS',
+    'WINDOW_DEACTIVATE',
+}
+
+
+class ModalJob:
+    """Mixin for operators doing long work in time-sliced chunks.
+
+    Operators must implement run_job(context) as a generator doing a small piece
+    of work between yields. Each yield reports progress as a (done, total) tuple.
+    Value returned by the generator is the operator result, {'FINISHED'} if
+    it returns nothing. The mixin does not declare run_job() itself, since abstract
+    base classes cannot be combined with the metaclass of Blender operators.
+
+    When the operator is invoked from the user interface, the job is run from
+    a modal timer with progress shown in the status bar, and Esc cancels it by
+    closing the generator at its current yield. Jobs should only change data
+    after their last cancellable yield, or clear job_cancellable before
+    doing work that must not be interrupted.
+    Otherwise, e.g. when called from a script, the job runs to completion
+    in execute().
+    """
+    job_title = 'Working'
+    # seconds of work done per timer event
+    job_time_slice = 0.05
+    job_cancellable = True
+
+    def execute(self, context: bpy.types.Context):
+        self._job = self.run_job(context)
+        self._job_progress = None
+        self.job_cancellable = True
+        if not self.options.is_invoke or bpy.app.background:
+            return self._job_step(float('inf'))
+        # short jobs finish without going modal
+        result = self._job_step(self.job_time_slice)
+        if result is not None:
+            return result
+        window_manager = context.window_manager
+        self._job_timer = window_manager.event_timer_add(0.01, window=context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+        self._job_update_status(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context: bpy.types.Context, event: bpy.types.Event):
+        if event.type == 'ESC' and self.job_cancellable:
+            self._job_end(context)
+            self._job.close()
+            self.report({'WARNING'}, '%s cancelled' % self.job_title)
+            return {'CANCELLED'}
+        if event.type == 'TIMER':
+            try:
+                result = self._job_step(self.job_time_slice)
+            except Exception:
+                self._job_end(context)
+                raise
+            if result is not None:
+                self._job_end(context)
+                return result
+            self._job_update_status(context)
+        if event.type in NAVIGATION_EVENTS:
+            return {'PASS_THROUGH'}
+        # block editing of data the job is working on
+        return {'RUNNING_MODAL'}
+
+    def _job_step(self, time_slice: float) -> typing.Optional[set]:
+        """Advances the job for given number of seconds, returns its result once it is done."""
+        deadline = time.perf_counter() + time_slice
+        try:
+            while True:
+                self._job_progress = next(self._job)
+                if time.perf_counter() >= deadline:
+                    return None
+        except StopIteration as stop:
+            return stop.value or {'FINISHED'}
+
+    def _job_update_status(self, context: bpy.types.Context):
+        if self._job_progress is None:
+            return
+        done, total = self._job_progress
+        context.window_manager.progress_update(100 * done // max(total, 1))
+        context.workspace.status_text_set('%s: %d of %d%s' % (self.job_title, done, total,
+                                                              ', Esc to cancel' if self.job_cancellable else ''))
+
+    def _job_end(self, context: bpy.types.Context):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._job_timer)
+        window_manager.progress_end()
+        context.workspace.status_text_set(None)
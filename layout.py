@@ -0,0 +1,104 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Conversion of Blender transforms to Unreal Engine conventions.
+
+Unreal Engine uses centimeters, a left-handed coordinate system with Y axis
+pointing the opposite way, and rotators of pitch, yaw and roll in degrees.
+"""
+
+import typing
+
+import bpy
+import numpy
+
+# Blender units are meters
+UNITS_PER_METER = 100.0
+# flips Y axis between Blender and Unreal Engine coordinate systems
+FLIP_Y = numpy.diag([1.0, -1.0, 1.0])
+
+
+def get_unit_scale(scene: bpy.types.Scene) -> float:
+    """Returns factor converting Blender units of a scene to centimeters.
+
+    Matches FBX export with apply_unit_scale, so scenes set up with
+    'Set UE4 Scale' (1 unit = 1 cm) are not scaled at all.
+    """
+    return scene.unit_settings.scale_length * UNITS_PER_METER
+
+
+def read_world_matrices(objects: typing.Sequence[bpy.types.Object]) -> numpy.ndarray:
+    """Returns (N, 4, 4) world matrices of objects."""
+    return numpy.array([obj.matrix_world for obj in objects], dtype=numpy.float64).reshape(-1, 4, 4)
+
+
+def to_ue_transforms(matrices: numpy.ndarray,
+                     unit_scale: float) -> typing.Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Converts (N, 4, 4) Blender matrices to UE locations, rotators and scales, each (N, 3).
+
+    Rotators are (pitch, yaw, roll) in degrees.
+    """
+    location = matrices[:, :3, 3] @ FLIP_Y * unit_scale
+    basis = FLIP_Y @ matrices[:, :3, :3] @ FLIP_Y
+    scale = numpy.linalg.norm(basis, axis=1)
+    # mirrored transforms get negative X scale
+    mirrored = numpy.linalg.det(basis) < 0
+    scale[mirrored, 0] *= -1
+    rotation = basis / numpy.where(scale == 0, 1.0, scale)[:, None, :]
+    return location, matrix_to_rotator(rotation), scale
+
+
+def matrix_to_rotator(rotation: numpy.ndarray) -> numpy.ndarray:
+    """Converts (N, 3, 3) rotation matrices in UE coordinates to (N, 3) rotators.
+
+    Follows FMatrix::Rotator(): axes of UE matrices are the columns of ours.
+    """
+    x_axis, y_axis, z_axis = rotation[:, :, 0], rotation[:, :, 1], rotation[:, :, 2]
+    pitch = numpy.arctan2(x_axis[:, 2], numpy.hypot(x_axis[:, 0], x_axis[:, 1]))
+    yaw = numpy.arctan2(x_axis[:, 1], x_axis[:, 0])
+    # Y axis of rotation without roll
+    rolled_y = numpy.stack([-numpy.sin(yaw), numpy.cos(yaw), numpy.zeros_like(yaw)], axis=1)
+    roll = numpy.arctan2(numpy.sum(z_axis * rolled_y, axis=1), numpy.sum(y_axis * rolled_y, axis=1))
+    return numpy.degrees(numpy.stack([pitch, yaw, roll], axis=1))
+
+
+def rotator_to_matrix(rotators: numpy.ndarray) -> numpy.ndarray:
+    """Converts (N, 3) rotators to (N, 3, 3) rotation matrices in UE coordinates.
+
+    Follows FRotationMatrix, inverse of matrix_to_rotator().
+    """
+    pitch, yaw, roll = numpy.radians(rotators).T
+    sp, cp = numpy.sin(pitch), numpy.cos(pitch)
+    sy, cy = numpy.sin(yaw), numpy.cos(yaw)
+    sr, cr = numpy.sin(roll), numpy.cos(roll)
+    # rows of FRotationMatrix are the axes, which are our columns
+    x_axis = numpy.stack([cp * cy, cp * sy, sp], axis=1)
+    y_axis = numpy.stack([sr * sp * cy - cr * sy, sr * sp * sy + cr * cy, -sr * cp], axis=1)
+    z_axis = numpy.stack([-(cr * sp * cy + sr * sy), cy * sr - cr * sp * sy, cr * cp], axis=1)
+    return numpy.stack([x_axis, y_axis, z_axis], axis=2)
+
+
+def from_ue_transforms(location: numpy.ndarray, rotators: numpy.ndarray, scale: numpy.ndarray,
+                       unit_scale: float) -> numpy.ndarray:
+    """Converts UE locations, rotators and scales to (N, 4, 4) Blender matrices."""
+    basis = rotator_to_matrix(rotators) * scale[:, None, :]
+    matrices = numpy.zeros((len(location), 4, 4), dtype=numpy.float64)
+    matrices[:, :3, :3] = FLIP_Y @ basis @ FLIP_Y
+    matrices[:, :3, 3] = location @ FLIP_Y / unit_scale
+    matrices[:, 3, 3] = 1.0
+    return matrices
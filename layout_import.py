@@ -0,0 +1,324 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import re
+import json
+import typing
+
+import bpy
+import numpy
+
+from . import layout
+
+
+# characters read from layout files at once
+CHUNK_SIZE = 1 << 20
+# actors converted to objects at once
+BATCH_SIZE = 4096
+PROTOTYPES_COLLECTION = 'UE4 Layout Prototypes'
+# data-blocks created by FBX importer, removed along with prototypes if import is cancelled
+FBX_DATA_COLLECTIONS = ('meshes', 'materials', 'images', 'armatures', 'actions')
+
+T3D_BEGIN_ACTOR = re.compile(r'^\s*Begin Actor\b')
+T3D_END_ACTOR = re.compile(r'^\s*End Actor\b')
+T3D_STATIC_MESH = re.compile(r'''^\s*StaticMesh=StaticMesh'"?([^'"]+)"?'\s*$''')
+T3D_VECTOR = re.compile(r'^\s*(RelativeLocation|RelativeRotation|RelativeScale3D)=\((.*)\)\s*$')
+T3D_LABEL = re.compile(r'^\s*ActorLabel="(.*)"\s*$')
+
+
+class Actor:
+    """Static mesh instance read from a layout file."""
+    __slots__ = ('mesh', 'name', 'transform')
+
+    def __init__(self, mesh: str, name: typing.Optional[str], transform: typing.List[float]):
+        self.mesh = mesh
+        self.name = name
+        # location, rotator and scale in UE units
+        self.transform = transform
+
+
+class JsonStream:
+    """Reads JSON values one by one, keeping only a small part of the file in memory.
+
+    Containers are walked with iter_object() and iter_array(), which stop at
+    each member, and the caller must read or walk every member.
+    """
+
+    def __init__(self, file: typing.TextIO, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        # number of characters dropped from the buffer
+        self.consumed = 0
+        self.decoder = json.JSONDecoder()
+
+    @property
+    def offset(self) -> int:
+        """Number of characters read so far."""
+        return self.consumed + self.position
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or empty string at the end of file."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.__fill():
+                return ''
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise ValueError('Expected one of "%s" at offset %d' % (characters, self.offset))
+        self.position += 1
+        return character
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.__fill()
+
+    def iter_object(self) -> typing.Iterator[str]:
+        """Yields keys of an object, the caller reads value of each key."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def iter_array(self) -> typing.Iterator[int]:
+        """Yields indices of array items, the caller reads each item."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(',]') == ']':
+                return
+
+    def __fill(self) -> bool:
+        chunk = self.file.read(self.chunk_size)
+        if len(chunk) == 0:
+            self.eof = True
+            return False
+        self.consumed += self.position
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+
+def get_mesh_name(asset: str) -> str:
+    """Returns asset name of UE object path, e.g. SM_Chair for /Game/Props/SM_Chair.SM_Chair."""
+    return asset.rsplit('/', 1)[-1].rsplit('.', 1)[-1]
+
+
+def iter_json_layout(file: typing.TextIO) -> typing.Iterator[typing.Tuple[Actor, int]]:
+    """Yields actors of a JSON layout written by instancing.write_json_layout(),
+    along with the number of characters read so far."""
+    stream = JsonStream(file)
+    for key in stream.iter_object():
+        if key != 'meshes':
+            stream.read_value()
+            continue
+        for _ in stream.iter_array():
+            mesh = None
+            object_names = []
+            for mesh_key in stream.iter_object():
+                if mesh_key == 'instances':
+                    if mesh is None:
+                        raise ValueError('Mesh name must precede its instances at offset %d' % stream.offset)
+                    for i in stream.iter_array():
+                        yield Actor(mesh, object_names[i] if i < len(object_names) else None,
+                                    stream.read_value()), stream.offset
+                elif mesh_key == 'name':
+                    mesh = stream.read_value()
+                elif mesh_key == 'objects':
+                    object_names = stream.read_value()
+                else:
+                    stream.read_value()
+
+
+def iter_t3d_layout(file: typing.TextIO) -> typing.Iterator[typing.Tuple[Actor, int]]:
+    """Yields static mesh actors of a T3D file line by line,
+    along with the number of characters read so far."""
+    offset = 0
+    depth = 0
+    mesh = name = None
+    vectors = {}
+    for line in file:
+        offset += len(line)
+        if T3D_BEGIN_ACTOR.match(line):
+            depth += 1
+            if depth == 1:
+                mesh = name = None
+                vectors = {}
+            continue
+        if depth == 0:
+            continue
+        if T3D_END_ACTOR.match(line):
+            depth -= 1
+            if depth == 0 and mesh is not None:
+                location = vectors.get('RelativeLocation', {})
+                rotation = vectors.get('RelativeRotation', {})
+                scale = vectors.get('RelativeScale3D', {})
+                yield Actor(mesh, name, [location.get('X', 0.0), location.get('Y', 0.0), location.get('Z', 0.0),
+                                         rotation.get('Pitch', 0.0), rotation.get('Yaw', 0.0),
+                                         rotation.get('Roll', 0.0),
+                                         scale.get('X', 1.0), scale.get('Y', 1.0), scale.get('Z', 1.0)]), offset
+            continue
+        # properties of nested actors are ignored
+        if depth > 1:
+            continue
+        match = T3D_STATIC_MESH.match(line)
+        if match is not None:
+            mesh = get_mesh_name(match.group(1))
+            continue
+        match = T3D_VECTOR.match(line)
+        if match is not None:
+            vectors[match.group(1)] = {component: float(value) for component, value in
+                                       (item.split('=', 1) for item in match.group(2).split(',') if '=' in item)}
+            continue
+        match = T3D_LABEL.match(line)
+        if match is not None:
+            name = match.group(1)
+
+
+class LayoutImporter:
+    """Creates collection instances of static meshes for actors read from a layout file.
+
+    Every mesh is instanced from a prototype collection of the same name: an existing
+    collection, a collection with an existing mesh, a mesh imported from FBX file
+    next to the layout file or, as a last resort, an empty marking the location.
+    """
+
+    def __init__(self, context: bpy.types.Context, filepath: str):
+        self.context = context
+        self.layout_dir = os.path.dirname(filepath)
+        self.unit_scale = layout.get_unit_scale(context.scene)
+        self.collection = bpy.data.collections.new(bpy.path.display_name_from_filepath(filepath))
+        context.scene.collection.children.link(self.collection)
+        self.prototypes: typing.Dict[str, bpy.types.Collection] = {}
+        self.new_prototypes: typing.List[bpy.types.Collection] = []
+        # set if prototypes collection has been created by this importer
+        self.new_prototypes_collection: typing.Optional[bpy.types.Collection] = None
+        # data-blocks of prototypes imported from FBX files
+        self.new_data: typing.Set[bpy.types.ID] = set()
+        self.objects: typing.List[bpy.types.Object] = []
+        self.pending: typing.List[Actor] = []
+
+    def add(self, actor: Actor):
+        self.pending.append(actor)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Creates objects of pending actors, converting their transforms with array operations."""
+        if len(self.pending) == 0:
+            return
+        transforms = numpy.array([actor.transform for actor in self.pending], dtype=numpy.float64)
+        matrices = layout.from_ue_transforms(transforms[:, 0:3], transforms[:, 3:6], transforms[:, 6:9],
+                                             self.unit_scale)
+        for actor, matrix in zip(self.pending, matrices.tolist()):
+            instance = bpy.data.objects.new(actor.name or actor.mesh, None)
+            instance.instance_type = 'COLLECTION'
+            instance.instance_collection = self.__get_prototype(actor.mesh)
+            instance.matrix_world = matrix
+            self.collection.objects.link(instance)
+            self.objects.append(instance)
+        self.pending.clear()
+
+    def discard(self):
+        """Removes everything created by the importer."""
+        removed = set(self.objects)
+        for prototype in self.new_prototypes:
+            removed.update(prototype.objects)
+            removed.add(prototype)
+        removed.add(self.collection)
+        removed.update(self.new_data)
+        if self.new_prototypes_collection is not None:
+            removed.add(self.new_prototypes_collection)
+        bpy.data.batch_remove(removed)
+        self.objects.clear()
+        self.new_prototypes.clear()
+        self.new_prototypes_collection = None
+        self.new_data.clear()
+
+    def __get_prototype(self, name: str) -> bpy.types.Collection:
+        prototype = self.prototypes.get(name)
+        if prototype is not None:
+            return prototype
+        prototype = bpy.data.collections.get(name)
+        if prototype is None:
+            prototype = self.__create_prototype(name)
+        self.prototypes[name] = prototype
+        return prototype
+
+    def __create_prototype(self, name: str) -> bpy.types.Collection:
+        prototype = bpy.data.collections.new(name)
+        self.__get_prototypes_collection().children.link(prototype)
+        self.new_prototypes.append(prototype)
+        mesh = bpy.data.meshes.get(name)
+        fbx_path = os.path.join(self.layout_dir, name + '.fbx')
+        if mesh is not None:
+            prototype.objects.link(bpy.data.objects.new(name, mesh))
+        elif os.path.exists(fbx_path):
+            previous_data = {name: set(getattr(bpy.data, name)) for name in FBX_DATA_COLLECTIONS}
+            bpy.ops.import_scene.fbx(filepath=fbx_path)
+            for name in FBX_DATA_COLLECTIONS:
+                self.new_data.update(set(getattr(bpy.data, name)) - previous_data[name])
+            for imported_object in self.context.selected_objects:
+                for collection in imported_object.users_collection:
+                    collection.objects.unlink(imported_object)
+                prototype.objects.link(imported_object)
+        else:
+            placeholder = bpy.data.objects.new(name, None)
+            placeholder.empty_display_type = 'CUBE'
+            placeholder.empty_display_size = 50.0 / self.unit_scale
+            prototype.objects.link(placeholder)
+        return prototype
+
+    def __get_prototypes_collection(self) -> bpy.types.Collection:
+        prototypes = bpy.data.collections.get(PROTOTYPES_COLLECTION)
+        if prototypes is None:
+            prototypes = bpy.data.collections.new(PROTOTYPES_COLLECTION)
+            self.new_prototypes_collection = prototypes
+            self.context.scene.collection.children.link(prototypes)
+            # prototypes are only visible through instances
+            self.context.view_layer.layer_collection.children[prototypes.name].exclude = True
+        return prototypes
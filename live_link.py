@@ -0,0 +1,167 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import time
+import typing
+
+import bpy
+import numpy
+
+from . import bake
+from . import layout
+from . import live_link_protocol
+from . import rig_cache
+
+
+class _Subject:
+    """Armature streamed by a live link session."""
+
+    def __init__(self, index: int, armature_object: bpy.types.Object):
+        self.index = index
+        self.name = armature_object.name
+        self.deform_bones: typing.Optional[typing.Tuple[str, ...]] = None
+        self.bone_names: typing.Tuple[str, ...] = ()
+        self.bone_indices = numpy.zeros(0, dtype=numpy.int64)
+        self.parent_positions = numpy.zeros(0, dtype=numpy.int64)
+        self.previous: typing.Optional[numpy.ndarray] = None
+
+    def read_pose(self, armature_object: bpy.types.Object, unit_scale: float) -> numpy.ndarray:
+        """Returns (bones, CHANNELS) transforms of deform bones relative to their deform parents."""
+        deform_bones = rig_cache.get_bone_group_bones(armature_object, 'DeformBones') or ()
+        if deform_bones != self.deform_bones:
+            self.__update_bones(armature_object, deform_bones)
+        pose_matrices = bake.read_matrices(armature_object.pose.bones, 'matrix').astype(numpy.float64)
+        matrices = pose_matrices[self.bone_indices]
+        parents = numpy.where((self.parent_positions >= 0)[:, None, None],
+                              matrices[self.parent_positions], numpy.eye(4))
+        location, rotation, scale = bake.decompose(numpy.linalg.inv(parents) @ matrices)
+        quaternion = bake.matrix_to_quaternion(rotation)
+        # keep quaternions in the same hemisphere as in the previous frame, so that deltas stay small
+        if self.previous is not None:
+            quaternion *= numpy.where(numpy.sum(quaternion * self.previous, axis=-1) < 0, -1.0, 1.0)[:, None]
+        self.previous = quaternion
+        return numpy.concatenate([location * unit_scale, quaternion, scale], axis=1).astype(numpy.float32)
+
+    def __update_bones(self, armature_object: bpy.types.Object, deform_bones: typing.Tuple[str, ...]):
+        pose_bones = armature_object.pose.bones
+        deform_names = set(deform_bones)
+        indices = [i for i, pose_bone in enumerate(pose_bones) if pose_bone.name in deform_names]
+        positions = {pose_bones[i].name: j for j, i in enumerate(indices)}
+        parent_positions = []
+        for i in indices:
+            # UE skeleton only has deform bones, so transforms are relative to the nearest deform ancestor
+            parent = pose_bones[i].parent
+            while parent is not None and parent.name not in positions:
+                parent = parent.parent
+            parent_positions.append(positions[parent.name] if parent is not None else -1)
+        self.deform_bones = deform_bones
+        self.bone_names = tuple(pose_bones[i].name for i in indices)
+        self.bone_indices = numpy.array(indices, dtype=numpy.int64)
+        self.parent_positions = numpy.array(parent_positions, dtype=numpy.int64)
+        self.previous = None
+
+
+class LiveLinkSession:
+    """Streams poses of armatures to a live link endpoint on every frame change."""
+
+    def __init__(self, armature_objects: typing.Sequence[bpy.types.Object],
+                 sender: live_link_protocol.PoseSender):
+        self.subjects = [_Subject(i, armature_object) for i, armature_object in enumerate(armature_objects)]
+        self.sender = sender
+
+    def send_frame(self, scene: bpy.types.Scene):
+        timestamp = time.time()
+        frame = scene.frame_current + scene.frame_subframe
+        unit_scale = layout.get_unit_scale(scene)
+        for subject in self.subjects:
+            armature_object = bpy.data.objects.get(subject.name)
+            if armature_object is None or armature_object.type != 'ARMATURE':
+                continue
+            values = subject.read_pose(armature_object, unit_scale)
+            self.sender.submit(live_link_protocol.Pose(subject.index, subject.name, subject.bone_names,
+                                                       frame, timestamp, values))
+
+
+_session: typing.Optional[LiveLinkSession] = None
+_receiver: typing.Optional[live_link_protocol.PoseReceiver] = None
+
+
+def get_session() -> typing.Optional[LiveLinkSession]:
+    return _session
+
+
+def get_receiver() -> typing.Optional[live_link_protocol.PoseReceiver]:
+    return _receiver
+
+
+def start(scene: bpy.types.Scene, armature_objects: typing.Sequence[bpy.types.Object],
+          host: str, port: int, transport: str) -> LiveLinkSession:
+    """Starts streaming armatures, raises OSError if the endpoint can not be connected."""
+    global _session
+    stop()
+    sender = live_link_protocol.PoseSender(host, port, transport)
+    sender.start()
+    _session = LiveLinkSession(armature_objects, sender)
+    bpy.app.handlers.frame_change_post.append(_on_frame_change)
+    bpy.app.handlers.load_pre.append(_on_load_pre)
+    # send current pose right away
+    _session.send_frame(scene)
+    return _session
+
+
+def stop():
+    global _session
+    if _session is None:
+        return
+    if _on_frame_change in bpy.app.handlers.frame_change_post:
+        bpy.app.handlers.frame_change_post.remove(_on_frame_change)
+    if _on_load_pre in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(_on_load_pre)
+    _session.sender.stop()
+    _session = None
+
+
+def start_receiver(host: str, port: int, transport: str) -> live_link_protocol.PoseReceiver:
+    """Starts a stand-in receiver in Blender, raises OSError if the port is in use."""
+    global _receiver
+    stop_receiver()
+    receiver = live_link_protocol.PoseReceiver(host, port, transport)
+    receiver.start()
+    _receiver = receiver
+    return receiver
+
+
+def stop_receiver():
+    global _receiver
+    if _receiver is not None:
+        _receiver.stop()
+        _receiver = None
+
+
+def _on_frame_change(scene: bpy.types.Scene, *args):
+    if _session is None:
+        return
+    if not _session.sender.running:
+        # connection has been lost, sender error is shown in the panel
+        return
+    _session.send_frame(scene)
+
+
+def _on_load_pre(*args):
+    # armatures of the current file are about to go away
+    stop()
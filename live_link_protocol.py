@@ -0,0 +1,408 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+"""Binary protocol streaming armature poses to a live link endpoint.
+
+Every packet carries transforms of all streamed bones of one armature (subject)
+as 10 floats per bone: location, rotation quaternion (w, x, y, z) and scale,
+relative to the parent bone. Keyframe packets carry bone names and all values,
+delta packets carry a bit mask of channels that differ from the last keyframe
+and differences of those channels only, so a lost delta packet never affects
+following ones. Over UDP the keyframe is repeated every few packets along with
+a delta, so that a lost keyframe only affects packets until the next repeat.
+
+Over UDP every datagram is a packet, over TCP every packet is prefixed by its
+length. This module does not depend on Blender, running it as a script starts
+a stand-in receiver printing frame rate and latency of received poses:
+
+    python live_link_protocol.py --port 54321 --transport UDP
+"""
+
+import time
+import queue
+import socket
+import struct
+import typing
+import argparse
+import threading
+import collections
+
+import numpy
+
+
+MAGIC = b'UE4L'
+VERSION = 2
+DEFAULT_PORT = 54321
+# packet carries names and values of a keyframe
+FLAG_KEYFRAME = 1
+# packet carries differences from a keyframe
+FLAG_DELTA = 2
+# location, rotation quaternion and scale
+CHANNELS = 10
+# magic, version, flags, subject, bone count, sequence, keyframe sequence, frame, send time
+HEADER = struct.Struct('<4sBBHHIIdd')
+NAMES_LENGTH = struct.Struct('<I')
+TCP_LENGTH = struct.Struct('<I')
+# delta packets sent between keyframes
+KEYFRAME_INTERVAL = 30
+# packets after which the last keyframe is sent again over UDP, where packets may be lost
+KEYFRAME_REPEAT = 5
+# channels changed less than this are not sent in delta packets
+DELTA_TOLERANCE = 1e-5
+# poses waiting to be sent, older poses are dropped when sender falls behind
+QUEUE_SIZE = 4
+# seconds over which frame rate is measured
+STATS_WINDOW = 1.0
+# seconds socket operations block, so that threads notice they have been stopped
+SOCKET_TIMEOUT = 0.2
+
+
+class Pose:
+    """Transforms of streamed bones of one armature at a single frame."""
+    __slots__ = ('subject', 'name', 'bone_names', 'frame', 'timestamp', 'values')
+
+    def __init__(self, subject: int, name: str, bone_names: typing.Tuple[str, ...], frame: float,
+                 timestamp: float, values: numpy.ndarray):
+        self.subject = subject
+        self.name = name
+        self.bone_names = bone_names
+        self.frame = frame
+        # time.time() when the pose was read
+        self.timestamp = timestamp
+        # (bones, CHANNELS) array
+        self.values = values
+
+
+class PoseEncoder:
+    """Encodes consecutive poses of a single subject into packets."""
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL, tolerance: float = DELTA_TOLERANCE,
+                 keyframe_repeat: int = 0):
+        self.keyframe_interval = keyframe_interval
+        self.tolerance = tolerance
+        # if set, every keyframe_repeat-th delta packet carries the keyframe as well
+        self.keyframe_repeat = keyframe_repeat
+        self.sequence = 0
+        self.keyframe: typing.Optional[numpy.ndarray] = None
+        self.keyframe_names: typing.Optional[typing.Tuple[str, ...]] = None
+        self.keyframe_sequence = 0
+        self.since_keyframe = 0
+
+    def encode(self, pose: Pose) -> bytes:
+        values = numpy.ascontiguousarray(pose.values, dtype='<f4').reshape(-1)
+        self.sequence = (self.sequence + 1) & 0xffffffff
+        if self.keyframe is None or pose.bone_names != self.keyframe_names \
+                or self.since_keyframe >= self.keyframe_interval:
+            self.keyframe = values
+            self.keyframe_names = pose.bone_names
+            self.keyframe_sequence = self.sequence
+            self.since_keyframe = 0
+            return self.__pack(pose, FLAG_KEYFRAME, self.__pack_keyframe(pose))
+        self.since_keyframe += 1
+        delta = values - self.keyframe
+        changed = numpy.abs(delta) > self.tolerance
+        parts = [numpy.packbits(changed).tobytes(), delta[changed].tobytes()]
+        if self.keyframe_repeat > 0 and self.since_keyframe % self.keyframe_repeat == 0:
+            return self.__pack(pose, FLAG_KEYFRAME | FLAG_DELTA, self.__pack_keyframe(pose), *parts)
+        return self.__pack(pose, FLAG_DELTA, *parts)
+
+    def __pack(self, pose: Pose, flags: int, *parts: bytes) -> bytes:
+        return b''.join((HEADER.pack(MAGIC, VERSION, flags, pose.subject, len(pose.bone_names), self.sequence,
+                                     self.keyframe_sequence, pose.frame, pose.timestamp),) + parts)
+
+    def __pack_keyframe(self, pose: Pose) -> bytes:
+        names = '\0'.join((pose.name,) + self.keyframe_names).encode('utf-8')
+        return b''.join((NAMES_LENGTH.pack(len(names)), names, self.keyframe.tobytes()))
+
+
+class PoseDecoder:
+    """Decodes packets of any number of subjects back into poses."""
+
+    def __init__(self):
+        # subject -> (names, values, sequence) of its last keyframe
+        self.keyframes: typing.Dict[int, typing.Tuple[typing.List[str], numpy.ndarray, int]] = {}
+
+    def decode(self, packet: bytes) -> typing.Optional[Pose]:
+        """Returns decoded pose, or None if keyframe the packet refers to has not been received."""
+        if len(packet) < HEADER.size:
+            raise ValueError('Packet is too short')
+        magic, version, flags, subject, bone_count, sequence, keyframe_sequence, frame, timestamp = \
+            HEADER.unpack_from(packet)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Unsupported packet')
+        offset = HEADER.size
+        value_count = bone_count * CHANNELS
+        if flags & FLAG_KEYFRAME:
+            (names_length,) = NAMES_LENGTH.unpack_from(packet, offset)
+            offset += NAMES_LENGTH.size
+            names = packet[offset:offset + names_length].decode('utf-8').split('\0')
+            offset += names_length
+            values = numpy.frombuffer(packet, dtype='<f4', count=value_count, offset=offset).copy()
+            offset += value_count * 4
+            self.keyframes[subject] = (names, values, keyframe_sequence)
+        if flags & FLAG_DELTA:
+            keyframe = self.keyframes.get(subject)
+            if keyframe is None or keyframe[2] != keyframe_sequence:
+                return None
+            names = keyframe[0]
+            mask_size = (value_count + 7) // 8
+            changed = numpy.unpackbits(numpy.frombuffer(packet, dtype=numpy.uint8, count=mask_size,
+                                                        offset=offset))[:value_count].astype(bool)
+            offset += mask_size
+            values = keyframe[1].copy()
+            values[changed] += numpy.frombuffer(packet, dtype='<f4', count=int(numpy.count_nonzero(changed)),
+                                                offset=offset)
+        return Pose(subject, names[0], tuple(names[1:]), frame, timestamp, values.reshape(bone_count, CHANNELS))
+
+
+class StreamStats:
+    """Frame rate, bandwidth and latency of a pose stream."""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_worst = 0.0
+        # (time, packet size) of packets within the last STATS_WINDOW seconds
+        self.recent: typing.Deque[typing.Tuple[float, int]] = collections.deque()
+
+    def add(self, size: int, latency: float = 0.0):
+        now = time.perf_counter()
+        self.frames += 1
+        self.bytes += size
+        self.latency_total += latency
+        self.latency_worst = max(self.latency_worst, latency)
+        self.recent.append((now, size))
+        while self.recent[0][0] < now - STATS_WINDOW:
+            self.recent.popleft()
+
+    @property
+    def fps(self) -> float:
+        recent = list(self.recent)
+        if len(recent) == 0 or recent[-1][0] < time.perf_counter() - STATS_WINDOW:
+            return 0.0
+        return len(recent) / STATS_WINDOW
+
+    @property
+    def bytes_per_second(self) -> float:
+        return sum(size for _, size in list(self.recent)) / STATS_WINDOW if self.fps > 0 else 0.0
+
+    @property
+    def average_latency(self) -> float:
+        return self.latency_total / self.frames if self.frames > 0 else 0.0
+
+
+class PoseSender:
+    """Encodes and sends poses from a background thread.
+
+    Poses are submitted from Blender's main thread, which never waits for the network.
+    """
+
+    def __init__(self, host: str, port: int, transport: str = 'UDP'):
+        self.address = (host, port)
+        self.transport = transport
+        self.stats = StreamStats()
+        self.error: typing.Optional[str] = None
+        self.__queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.__encoders: typing.Dict[int, PoseEncoder] = {}
+        self.__socket: typing.Optional[socket.socket] = None
+        self.__thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        """Connects to the receiver, raises OSError if TCP connection could not be made."""
+        if self.transport == 'TCP':
+            self.__socket = socket.create_connection(self.address, timeout=SOCKET_TIMEOUT * 5)
+            self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__socket.connect(self.address)
+        self.__thread = threading.Thread(target=self.__run, name='UE4 Tools live link sender', daemon=True)
+        self.__thread.start()
+
+    def submit(self, pose: Pose):
+        try:
+            self.__queue.put_nowait(pose)
+        except queue.Full:
+            # send the latest pose rather than a stale one
+            try:
+                self.__queue.get_nowait()
+                self.stats.dropped += 1
+            except queue.Empty:
+                pass
+            self.__queue.put_nowait(pose)
+
+    def stop(self):
+        if self.__thread is not None:
+            try:
+                self.__queue.put(None, timeout=SOCKET_TIMEOUT)
+            except queue.Full:
+                pass
+            self.__thread.join(SOCKET_TIMEOUT * 5)
+            self.__thread = None
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def __run(self):
+        while True:
+            pose = self.__queue.get()
+            if pose is None:
+                return
+            encoder = self.__encoders.get(pose.subject)
+            if encoder is None:
+                encoder = self.__encoders[pose.subject] = PoseEncoder(
+                    keyframe_repeat=KEYFRAME_REPEAT if self.transport == 'UDP' else 0)
+            packet = encoder.encode(pose)
+            try:
+                if self.transport == 'TCP':
+                    self.__socket.sendall(TCP_LENGTH.pack(len(packet)) + packet)
+                else:
+                    self.__socket.send(packet)
+            except ConnectionRefusedError:
+                # nobody listens to UDP packets yet
+                self.stats.dropped += 1
+                continue
+            except OSError as ex:
+                self.error = str(ex)
+                return
+            self.stats.add(len(packet))
+
+
+class PoseReceiver:
+    """Stand-in for the UE endpoint, decodes received poses measuring frame rate and latency."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, transport: str = 'UDP'):
+        self.address = (host, port)
+        self.transport = transport
+        self.stats = StreamStats()
+        self.last_pose: typing.Optional[Pose] = None
+        self.error: typing.Optional[str] = None
+        self.__decoder = PoseDecoder()
+        self.__socket: typing.Optional[socket.socket] = None
+        self.__thread: typing.Optional[threading.Thread] = None
+        self.__stopped = threading.Event()
+
+    def start(self):
+        """Binds to the address, raises OSError if it is in use."""
+        if self.transport == 'TCP':
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.__socket.bind(self.address)
+            self.__socket.listen(1)
+        else:
+            self.__socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__socket.bind(self.address)
+        self.__socket.settimeout(SOCKET_TIMEOUT)
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, name='UE4 Tools live link receiver', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join(SOCKET_TIMEOUT * 5)
+            self.__thread = None
+        if self.__socket is not None:
+            self.__socket.close()
+            self.__socket = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def __run(self):
+        try:
+            if self.transport == 'TCP':
+                self.__run_tcp()
+            else:
+                while not self.__stopped.is_set():
+                    try:
+                        packet = self.__socket.recv(65536)
+                    except socket.timeout:
+                        continue
+                    self.__receive(packet)
+        except (OSError, ValueError) as ex:
+            if not self.__stopped.is_set():
+                self.error = str(ex)
+
+    def __run_tcp(self):
+        while not self.__stopped.is_set():
+            try:
+                connection, _ = self.__socket.accept()
+            except socket.timeout:
+                continue
+            connection.settimeout(SOCKET_TIMEOUT)
+            buffer = b''
+            with connection:
+                while not self.__stopped.is_set():
+                    try:
+                        data = connection.recv(65536)
+                    except socket.timeout:
+                        continue
+                    if len(data) == 0:
+                        # sender has disconnected, wait for the next one
+                        break
+                    buffer += data
+                    while len(buffer) >= TCP_LENGTH.size:
+                        (length,) = TCP_LENGTH.unpack_from(buffer)
+                        if len(buffer) < TCP_LENGTH.size + length:
+                            break
+                        self.__receive(buffer[TCP_LENGTH.size:TCP_LENGTH.size + length])
+                        buffer = buffer[TCP_LENGTH.size + length:]
+
+    def __receive(self, packet: bytes):
+        pose = self.__decoder.decode(packet)
+        if pose is None:
+            self.stats.dropped += 1
+            return
+        self.last_pose = pose
+        self.stats.add(len(packet), time.time() - pose.timestamp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Receives live link poses and prints their frame rate and latency.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--transport', choices=('UDP', 'TCP'), default='UDP')
+    args = parser.parse_args()
+    receiver = PoseReceiver(args.host, args.port, args.transport)
+    receiver.start()
+    print('Listening on %s:%d over %s, press Ctrl+C to stop' % (args.host, args.port, args.transport))
+    try:
+        while receiver.running:
+            time.sleep(1.0)
+            stats = receiver.stats
+            pose = receiver.last_pose
+            print('%s: %.1f fps, %.1f KB/s, latency %.2f ms avg, %.2f ms max, %d frames, %d skipped' % (
+                pose.name if pose is not None else '-', stats.fps, stats.bytes_per_second / 1024,
+                stats.average_latency * 1000, stats.latency_worst * 1000, stats.frames, stats.dropped))
+        if receiver.error is not None:
+            print('Receiver failed: %s' % receiver.error)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import typing
+
+import bpy
+import numpy
+
+
+def get_lod_name(name: str, lod: int) -> str:
+    """Returns name of a LOD following UE convention, e.g. SM_Chair_LOD1."""
+    return '%s_LOD%d' % (name, lod)
+
+
+def get_lod_items(mesh_objects: typing.Iterable[bpy.types.Object], ratios: typing.Sequence[float],
+                  output_dir: str) -> typing.List[dict]:
+    """Returns work items for building LODs of every mesh object in background workers.
+
+    Library files are numbered, since different object names may get the same clean name.
+    """
+    return [{
+        'name': mesh_object.name,
+        'object': mesh_object.name,
+        'ratios': list(ratios),
+        'filepath': os.path.join(output_dir, '%s_%d.blend' % (bpy.path.clean_name(mesh_object.name), index)),
+    } for index, mesh_object in enumerate(mesh_objects)]
+
+
+def count_triangles(mesh: bpy.types.Mesh) -> int:
+    loop_totals = numpy.empty(len(mesh.polygons), dtype=numpy.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    return int(numpy.sum(loop_totals - 2))
+
+
+def new_mesh_from_object(mesh_object: bpy.types.Object) -> bpy.types.Mesh:
+    """Returns a new mesh with modifiers of an object applied, keeping vertex weights."""
+    context = bpy.context
+    if bpy.app.version < (2, 81, 0):
+        context.view_layer.update()
+        return mesh_object.to_mesh(context.depsgraph, True)
+    depsgraph = context.evaluated_depsgraph_get()
+    return bpy.data.meshes.new_from_object(mesh_object.evaluated_get(depsgraph),
+                                           preserve_all_data_layers=True, depsgraph=depsgraph)
+
+
+def decimate_lods(item: dict, options: dict) -> dict:
+    """Builds decimated meshes of an object and writes them to a library file.
+
+    This is run by background workers on a copy of the current file. Vertex weights
+    are interpolated by Decimate modifier, vertex groups themselves belong to
+    the object and are copied from the original object when LODs are added.
+    """
+    source: bpy.types.Object = bpy.data.objects[item['object']]
+    meshes = []
+    for lod, ratio in enumerate(item['ratios'], start=1):
+        lod_object = source.copy()
+        bpy.context.scene.collection.objects.link(lod_object)
+        # decimate undeformed mesh, other modifiers are applied to LODs
+        for lod_modifier in [lod_modifier for lod_modifier in lod_object.modifiers if lod_modifier.type == 'ARMATURE']:
+            lod_object.modifiers.remove(lod_modifier)
+        modifier = lod_object.modifiers.new('Decimate', 'DECIMATE')
+        modifier.decimate_type = 'COLLAPSE'
+        modifier.ratio = ratio
+        modifier.use_collapse_triangulate = True
+        mesh = new_mesh_from_object(lod_object)
+        mesh.name = get_lod_name(source.name, lod)
+        meshes.append(mesh)
+        bpy.data.objects.remove(lod_object)
+    bpy.data.libraries.write(item['filepath'], set(meshes), fake_user=True)
+    return {
+        'filepath': item['filepath'],
+        'meshes': [mesh.name for mesh in meshes],
+        'triangles': [count_triangles(source.data)] + [count_triangles(mesh) for mesh in meshes],
+    }
+
+
+def add_lods(source: bpy.types.Object, filepath: str, mesh_names: typing.List[str]) -> typing.List[bpy.types.Object]:
+    """Appends LOD meshes written by decimate_lods() and adds objects using them.
+
+    LOD objects are copies of the source object, so they keep its parent, armature
+    modifiers and vertex groups. Other modifiers have been applied to LOD meshes and
+    are removed. Previously generated LODs are replaced.
+    """
+    with bpy.data.libraries.load(filepath, link=False) as (data_from, data_to):
+        data_to.meshes = list(mesh_names)
+    lod_objects = []
+    for lod, mesh in enumerate(data_to.meshes, start=1):
+        name = get_lod_name(source.name, lod)
+        previous = bpy.data.objects.get(name)
+        if previous is not None:
+            previous_mesh = previous.data
+            bpy.data.objects.remove(previous)
+            if previous_mesh is not None and previous_mesh.users == 0:
+                bpy.data.meshes.remove(previous_mesh)
+        mesh.use_fake_user = False
+        mesh.name = name
+        lod_object = source.copy()
+        lod_object.data = mesh
+        lod_object.name = name
+        for lod_modifier in [lod_modifier for lod_modifier in lod_object.modifiers if lod_modifier.type != 'ARMATURE']:
+            lod_object.modifiers.remove(lod_modifier)
+        for collection in source.users_collection:
+            collection.objects.link(lod_object)
+        lod_objects.append(lod_object)
+    return lod_objects
@@ -0,0 +1,321 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import json
+import time
+import typing
+import inspect
+import functools
+
+import bpy
+
+from . import auto_load
+
+
+# set to 1 to instrument addon classes right from Blender startup
+PROFILE_VARIABLE = 'UE4_TOOLS_PROFILE'
+INSTRUMENTED_METHODS = ('execute', 'invoke', 'modal', 'draw')
+# number of slowest entries shown in the panel
+PANEL_ENTRY_COUNT = 10
+
+
+class CallStats:
+    """Timings of a single instrumented method."""
+    __slots__ = ('count', 'total', 'worst')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.worst = max(self.worst, elapsed)
+
+
+_classes: typing.List[type] = []
+# original methods replaced by instrumented ones, None if method was inherited
+_originals: typing.Dict[typing.Tuple[type, str], typing.Optional[typing.Callable]] = {}
+_stats: typing.Dict[str, CallStats] = {}
+# cProfile.Profile per instrumented method
+_profiles: typing.Dict[str, typing.Any] = {}
+_enabled = False
+_use_cprofile = False
+
+
+def instrument_class(cls: type):
+    """Class hook of auto_load, called before each addon class is registered."""
+    if cls.__module__ == __name__ or cls in _classes:
+        return
+    _classes.append(cls)
+    if _enabled:
+        _wrap_class(cls)
+
+
+def set_enabled(enabled: bool):
+    """Wraps methods of all addon classes with timing, or restores original methods."""
+    global _enabled
+    _enabled = enabled
+    for cls in _classes:
+        if enabled:
+            _wrap_class(cls)
+        else:
+            _unwrap_class(cls)
+
+
+def set_cprofile_enabled(enabled: bool):
+    global _use_cprofile
+    _use_cprofile = enabled
+
+
+def reset():
+    _stats.clear()
+    _profiles.clear()
+
+
+def get_stats() -> typing.List[typing.Tuple[str, CallStats]]:
+    """Returns timings of instrumented methods, the most time consuming first."""
+    return sorted(_stats.items(), key=lambda item: item[1].total, reverse=True)
+
+
+def _wrap_class(cls: type):
+    for name in INSTRUMENTED_METHODS:
+        function = getattr(cls, name, None)
+        if not inspect.isfunction(function) or (cls, name) in _originals:
+            continue
+        _originals[(cls, name)] = cls.__dict__.get(name)
+        setattr(cls, name, _make_wrapper(function, '%s.%s' % (cls.__name__, name)))
+
+
+def _unwrap_class(cls: type):
+    for name in INSTRUMENTED_METHODS:
+        if (cls, name) not in _originals:
+            continue
+        original = _originals.pop((cls, name))
+        if original is not None:
+            setattr(cls, name, original)
+        else:
+            delattr(cls, name)
+
+
+def _make_wrapper(function: typing.Callable, key: str) -> typing.Callable:
+    # Blender checks number of arguments of registered methods,
+    # so wrappers take exactly the same arguments
+    if function.__code__.co_argcount == 3:
+        @functools.wraps(function)
+        def wrapper(self, context, event):
+            return _call(key, function, self, context, event)
+    else:
+        @functools.wraps(function)
+        def wrapper(self, context):
+            return _call(key, function, self, context)
+    return wrapper
+
+
+def _call(key: str, function: typing.Callable, *args):
+    start = time.perf_counter()
+    try:
+        if _use_cprofile:
+            profile = _profiles.get(key)
+            if profile is None:
+                import cProfile
+                profile = _profiles[key] = cProfile.Profile()
+            return profile.runcall(function, *args)
+        return function(*args)
+    finally:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = CallStats()
+        stats.add(time.perf_counter() - start)
+
+
+def write_json(filepath: str):
+    """Writes timings, and the most expensive functions found by cProfile, to a JSON file."""
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'blender': bpy.app.version_string,
+        'calls': {key: {'count': stats.count, 'total': stats.total, 'average': stats.average, 'max': stats.worst}
+                  for key, stats in get_stats()},
+        'profiles': {},
+    }
+    for key, functions in _iter_profile_functions():
+        functions = sorted(functions.items(), key=lambda item: item[1][3], reverse=True)[:50]
+        report['profiles'][key] = [{'function': _get_function_name(function), 'calls': calls,
+                                    'own': own_time, 'cumulative': cumulative_time}
+                                   for function, (_, calls, own_time, cumulative_time, _) in functions]
+    with open(filepath, 'w') as report_file:
+        json.dump(report, report_file, indent=1)
+
+
+def write_folded(filepath: str):
+    """Writes cProfile data in folded stacks format accepted by flame graph tools.
+
+    cProfile only records direct callers, so each function is placed on the stack
+    of its most expensive caller. Sample counts are own time in microseconds.
+    """
+    lines = []
+    for key, functions in _iter_profile_functions():
+        for function, (_, _, own_time, _, _) in functions.items():
+            if own_time <= 0:
+                continue
+            stack = [_get_function_name(function)]
+            visited = {function}
+            caller = _get_heaviest_caller(functions, function)
+            while caller is not None and caller not in visited:
+                stack.append(_get_function_name(caller))
+                visited.add(caller)
+                caller = _get_heaviest_caller(functions, caller)
+            stack.append(key)
+            lines.append('%s %d' % (';'.join(reversed(stack)), round(own_time * 1e6)))
+    # also include timings of methods which were not profiled
+    for key, stats in get_stats():
+        if key not in _profiles:
+            lines.append('%s %d' % (key, round(stats.total * 1e6)))
+    with open(filepath, 'w') as folded_file:
+        folded_file.write('\n'.join(lines) + '\n')
+
+
+def _iter_profile_functions():
+    import pstats
+    for key, profile in sorted(_profiles.items()):
+        yield key, pstats.Stats(profile).stats
+
+
+def _get_heaviest_caller(functions: dict, function: tuple) -> typing.Optional[tuple]:
+    callers = functions[function][4]
+    # the outermost function called by the instrumented method has no recorded callers
+    callers = [caller for caller in callers if caller in functions]
+    if len(callers) == 0:
+        return None
+    return max(callers, key=lambda caller: functions[function][4][caller][3])
+
+
+def _get_function_name(function: tuple) -> str:
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return '%s:%d(%s)' % (os.path.basename(filename), line, name)
+
+
+class UE4_TOOLS_PROFILING_prefs(bpy.types.PropertyGroup):
+    """Profiling settings, stored in the addon rather than in blend files."""
+    enabled: bpy.props.BoolProperty(
+        name='Measure operators and panels',
+        description='Measure time spent in execute, invoke, modal and draw methods of addon classes.',
+        get=lambda self: _enabled,
+        set=lambda self, value: set_enabled(value)
+    )
+    use_cprofile: bpy.props.BoolProperty(
+        name='Use cProfile',
+        description='Profile called functions with cProfile. Adds noticeable overhead.',
+        get=lambda self: _use_cprofile,
+        set=lambda self, value: set_cprofile_enabled(value)
+    )
+
+
+class UE4_TOOLS_PROFILING_PT_main(bpy.types.Panel):
+    """Addon performance panel."""
+    bl_label = 'Performance'
+    bl_region_type = 'UI'
+    bl_category = 'Unreal Engine 4'
+    bl_space_type = 'VIEW_3D'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context: bpy.types.Context):
+        layout: bpy.types.UILayout = self.layout
+        prefs = context.window_manager.ue4_tools_profiling
+        layout.prop(prefs, 'enabled')
+        layout.prop(prefs, 'use_cprofile')
+        stats = get_stats()
+        if len(stats) > 0:
+            column = layout.column(align=True)
+            for key, call_stats in stats[:PANEL_ENTRY_COUNT]:
+                column.label(text=key)
+                column.label(text='    %d calls, %.2f ms avg, %.2f ms max, %.1f ms total' % (
+                    call_stats.count, call_stats.average * 1000, call_stats.worst * 1000, call_stats.total * 1000))
+        row = layout.row(align=True)
+        row.operator(UE4_TOOLS_PROFILING_OT_export.bl_idname, text='Export JSON').format = 'JSON'
+        row.operator(UE4_TOOLS_PROFILING_OT_export.bl_idname, text='Export Flame Graph').format = 'FOLDED'
+        layout.operator(UE4_TOOLS_PROFILING_OT_reset.bl_idname)
+
+
+class UE4_TOOLS_PROFILING_OT_reset(bpy.types.Operator):
+    bl_idname = 'ue4_tools_profiling.reset'
+    bl_label = 'Reset measurements'
+    bl_description = 'Discard collected timings and profiles.'
+
+    def execute(self, context: bpy.types.Context):
+        reset()
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_PROFILING_OT_export(bpy.types.Operator):
+    bl_idname = 'ue4_tools_profiling.export'
+    bl_label = 'Export measurements'
+    bl_description = 'Export collected timings as JSON, or cProfile data as folded stacks for flame graph tools.'
+
+    filepath: bpy.props.StringProperty(
+        subtype='FILE_PATH'
+    )
+    format: bpy.props.EnumProperty(
+        name='Format',
+        items=[
+            ('JSON', 'JSON', 'Timings and the most expensive profiled functions'),
+            ('FOLDED', 'Folded stacks', 'Input for flamegraph.pl, speedscope and similar tools'),
+        ],
+        default='JSON'
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        self.filepath = 'ue4_tools_profile' + ('.json' if self.format == 'JSON' else '.folded')
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context: bpy.types.Context):
+        if len(_stats) == 0:
+            self.report({'ERROR'}, 'Nothing has been measured yet')
+            return {'CANCELLED'}
+        if self.format == 'JSON':
+            write_json(self.filepath)
+        else:
+            write_folded(self.filepath)
+        self.report({'INFO'}, 'Saved %s' % self.filepath)
+        return {'FINISHED'}
+
+
+# instrument classes as they are registered
+auto_load.class_hooks[:] = [hook for hook in auto_load.class_hooks if hook.__module__ != __name__]
+auto_load.class_hooks.append(instrument_class)
+if os.environ.get(PROFILE_VARIABLE) == '1':
+    _enabled = True
+
+
+def register():
+    bpy.types.WindowManager.ue4_tools_profiling = bpy.props.PointerProperty(type=UE4_TOOLS_PROFILING_prefs)
+
+
+def unregister():
+    set_enabled(False)
+    _classes.clear()
+    del bpy.types.WindowManager.ue4_tools_profiling
@@ -0,0 +1,187 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+
+from . import bake
+from . import export
+
+
+MIXAMO_FINGERS = (('Thumb', 'thumb'), ('Index', 'index'), ('Middle', 'middle'), ('Ring', 'ring'), ('Pinky', 'pinky'))
+
+
+def get_mixamo_mapping() -> typing.Dict[str, str]:
+    """Returns Mixamo bone names, without namespace prefix, mapped to UE4 mannequin bone names."""
+    mapping = {
+        'Hips': 'pelvis',
+        'Spine': 'spine_01',
+        'Spine1': 'spine_02',
+        'Spine2': 'spine_03',
+        'Neck': 'neck_01',
+        'Head': 'head',
+    }
+    for side, suffix in (('Left', 'l'), ('Right', 'r')):
+        for source, target in (('Shoulder', 'clavicle'), ('Arm', 'upperarm'), ('ForeArm', 'lowerarm'),
+                               ('Hand', 'hand'), ('UpLeg', 'thigh'), ('Leg', 'calf'), ('Foot', 'foot'),
+                               ('ToeBase', 'ball')):
+            mapping[side + source] = '%s_%s' % (target, suffix)
+        for finger, target in MIXAMO_FINGERS:
+            for i in range(1, 4):
+                mapping['%sHand%s%d' % (side, finger, i)] = '%s_%02d_%s' % (target, i, suffix)
+    return mapping
+
+
+def parse_mapping(text: str) -> typing.Dict[str, str]:
+    """Parses 'source bone = target bone' lines, empty lines and lines starting with # are ignored."""
+    mapping = {}
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+        source, separator, target = line.partition('=')
+        if len(separator) == 0 or len(source.strip()) == 0 or len(target.strip()) == 0:
+            raise ValueError('Line %d is not in "source bone = target bone" format' % number)
+        mapping[source.strip()] = target.strip()
+    return mapping
+
+
+def get_bone_mapping(source_object: bpy.types.Object, target_object: bpy.types.Object,
+                     mapping: typing.Dict[str, str] = None) -> typing.List[typing.Tuple[str, str]]:
+    """Returns (source bone, target bone) pairs of bones existing in both armatures.
+
+    Bones are matched by the given mapping first, then by Mixamo names and then by identical names.
+    """
+    mapping = mapping or {}
+    mixamo_mapping = get_mixamo_mapping()
+    target_bones = target_object.pose.bones
+    pairs = []
+    mapped_targets = set()
+    for pose_bone in source_object.pose.bones:
+        name = pose_bone.name
+        target = mapping.get(name) or mixamo_mapping.get(name.rsplit(':', 1)[-1]) or name
+        if target in target_bones and target not in mapped_targets:
+            pairs.append((name, target))
+            mapped_targets.add(target)
+    return pairs
+
+
+def read_rest_matrices(armature_object: bpy.types.Object) -> numpy.ndarray:
+    """Returns (bones, 4, 4) armature space rest matrices in the order of pose bones."""
+    return numpy.array([pose_bone.bone.matrix_local for pose_bone in armature_object.pose.bones],
+                       dtype=numpy.float64).reshape(-1, 4, 4)
+
+
+class Retargeter:
+    """Transfers poses between armatures with rest pose corrections computed once.
+
+    World space rotation of every mapped target bone follows rotation of its source bone
+    relative to their rest poses. The topmost mapped bone also follows source translation,
+    scaled by the ratio of rest heights of both bones. Other target bones keep their rest
+    offsets from parents.
+    """
+
+    def __init__(self, source_object: bpy.types.Object, target_object: bpy.types.Object,
+                 mapping: typing.Sequence[typing.Tuple[str, str]]):
+        source_indices = {pose_bone.name: i for i, pose_bone in enumerate(source_object.pose.bones)}
+        target_indices = {pose_bone.name: i for i, pose_bone in enumerate(target_object.pose.bones)}
+        self.source_indices = numpy.array([source_indices[source] for source, _ in mapping], dtype=numpy.int64)
+        self.mapped = {target_indices[target]: j for j, (_, target) in enumerate(mapping)}
+        self.source_world = numpy.array(source_object.matrix_world, dtype=numpy.float64)
+        target_world = numpy.array(target_object.matrix_world, dtype=numpy.float64)
+        self.target_world_inverse = numpy.linalg.inv(target_world)
+        # corrections from source to target bone rest rotations, in world space
+        source_rest = self.source_world @ read_rest_matrices(source_object)[self.source_indices]
+        target_rest_all = read_rest_matrices(target_object)
+        target_rest = target_world @ target_rest_all[[target_indices[target] for _, target in mapping]]
+        _, source_rest_rotation, _ = bake.decompose(source_rest)
+        _, target_rest_rotation, _ = bake.decompose(target_rest)
+        self.correction = numpy.linalg.inv(source_rest_rotation) @ target_rest_rotation
+        self.target_world_rotation_inverse = numpy.linalg.inv(bake.decompose(target_world)[1])
+        # topmost mapped source bone carries translation
+        source_depths = get_depths(bake.get_parent_indices(source_object))
+        self.root_position = int(numpy.argmin(source_depths[self.source_indices])) if len(mapping) > 0 else -1
+        if self.root_position >= 0:
+            self.source_root_head = source_rest[self.root_position, :3, 3]
+            self.target_root_head = target_rest[self.root_position, :3, 3]
+            source_height = self.source_root_head[2] - self.source_world[2, 3]
+            target_height = self.target_root_head[2] - target_world[2, 3]
+            self.height_ratio = target_height / source_height if abs(source_height) > 1e-6 else 1.0
+        # target hierarchy, parents are processed before children
+        self.parent_indices = bake.get_parent_indices(target_object)
+        self.order = numpy.argsort(get_depths(self.parent_indices), kind='stable').tolist()
+        self.target_rest = target_rest_all
+        self.parent_offsets = numpy.array([
+            numpy.linalg.inv(target_rest_all[parent]) @ target_rest_all[i] if parent >= 0 else target_rest_all[i]
+            for i, parent in enumerate(self.parent_indices.tolist())]).reshape(-1, 4, 4)
+
+    def apply(self, source_pose: numpy.ndarray) -> numpy.ndarray:
+        """Converts (frames, source bones, 4, 4) source pose matrices to target pose matrices."""
+        frame_count = len(source_pose)
+        source_world = self.source_world @ source_pose[:, self.source_indices]
+        _, source_rotation, _ = bake.decompose(source_world)
+        rotation = self.target_world_rotation_inverse @ source_rotation @ self.correction
+        if self.root_position >= 0:
+            root_head = self.target_root_head \
+                + (source_world[:, self.root_position, :3, 3] - self.source_root_head) * self.height_ratio
+            root_location = root_head @ self.target_world_inverse[:3, :3].T + self.target_world_inverse[:3, 3]
+        target_pose = numpy.empty((frame_count, len(self.parent_indices), 4, 4), dtype=numpy.float64)
+        for i in self.order:
+            parent = self.parent_indices[i]
+            if parent >= 0:
+                pose = target_pose[:, parent] @ self.parent_offsets[i]
+            else:
+                pose = numpy.repeat(self.parent_offsets[i][None], frame_count, axis=0)
+            j = self.mapped.get(i)
+            if j is not None:
+                scale = numpy.linalg.norm(pose[:, :3, :3], axis=-2)
+                pose[:, :3, :3] = rotation[:, j] * scale[:, None, :]
+                if j == self.root_position:
+                    pose[:, :3, 3] = root_location
+            target_pose[:, i] = pose
+        return target_pose
+
+
+def get_depths(parent_indices: numpy.ndarray) -> numpy.ndarray:
+    """Returns number of ancestors of every bone."""
+    depths = numpy.zeros(len(parent_indices), dtype=numpy.int64)
+    ancestors = parent_indices.copy()
+    while numpy.any(ancestors >= 0):
+        has_parent = ancestors >= 0
+        depths += has_parent
+        ancestors = numpy.where(has_parent, parent_indices[numpy.maximum(ancestors, 0)], -1)
+    return depths
+
+
+def retarget(source_object: bpy.types.Object, target_object: bpy.types.Object,
+             mapping: typing.Sequence[typing.Tuple[str, str]], frames: typing.Sequence[float],
+             action: bpy.types.Action) -> int:
+    """Retargets animation of source armature at given frames to keyframes of target deform bones.
+
+    Source is evaluated once per frame, everything else is done with array operations
+    for all frames at once. Returns number of written keyframes.
+    """
+    frames = numpy.asarray(frames, dtype=numpy.float64)
+    retargeter = Retargeter(source_object, target_object, mapping)
+    target_pose = retargeter.apply(bake.sample_pose_matrices(source_object, frames))
+    deform_bone_names = export.get_deform_bone_names(target_object)
+    bone_indices = [i for i, pose_bone in enumerate(target_object.pose.bones) if pose_bone.name in deform_bone_names]
+    local = bake.pose_to_local(target_object, target_pose, bone_indices)
+    return bake.write_local_matrices(target_object, action, frames, bone_indices, local)
@@ -0,0 +1,213 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+
+
+# operators which change bone group assignments without notifying message bus
+BONE_GROUP_OPERATORS = {
+    'POSE_OT_group_add',
+    'POSE_OT_group_remove',
+    'POSE_OT_group_assign',
+    'POSE_OT_group_unassign',
+    'POSE_OT_group_move',
+    'POSE_OT_group_sort',
+}
+
+# custom properties of UE4 mannequin rig controlled from animation panel
+RIG_PROPERTIES = (
+    'Constraints_ON_OFF',
+    'IKMAIN',
+    'IKARMS',
+    'IKLEGS',
+    'Ik Arm R',
+    'IK Arm L',
+    'Ik hand R Lock',
+    'Ik Hand L Lock',
+    'Ik Leg R',
+    'Ik Leg L',
+    'Foot Lock R',
+    'Foot Lock L',
+    'Head inherit Rotation',
+    'Arms inherit Rotation',
+    'Waist Inherit Rotation',
+    'ShowAdvancedProps',
+)
+
+
+class RigState:
+    """Snapshot of armature state drawn by animation panel."""
+    __slots__ = ('has_deform_bones', 'values')
+
+    def __init__(self, armature_object: bpy.types.Object):
+        self.has_deform_bones: bool = 'DeformBones' in armature_object.pose.bone_groups
+        self.values: typing.Dict[str, bool] = {property: bool(armature_object.get(property, False))
+                                               for property in RIG_PROPERTIES}
+
+    def get_bool(self, property: str) -> bool:
+        return self.values.get(property, False)
+
+
+# armature object pointer -> {bone group name -> names of bones assigned to that group}
+_bone_group_index: typing.Dict[int, typing.Dict[str, typing.Tuple[str, ...]]] = {}
+# armature object pointer -> rig state snapshot
+_rig_states: typing.Dict[int, RigState] = {}
+# pointer to the last registered operator that has already been handled
+_last_operator: typing.Optional[int] = None
+# owner of all message bus subscriptions made by this module
+_msgbus_owner = object()
+
+
+def get_bone_group_bones(armature_object: bpy.types.Object, bone_group_name: str) -> typing.Optional[typing.Tuple[str, ...]]:
+    """Returns names of bones assigned to a bone group, or None if there is no such group.
+
+    Bone group membership is indexed once per armature and reused
+    until bone group assignments change.
+    """
+    key = armature_object.as_pointer()
+    index = _bone_group_index.get(key)
+    if index is None:
+        index = _bone_group_index[key] = _build_bone_group_index(armature_object)
+    return index.get(bone_group_name)
+
+
+def invalidate_bone_group_index(armature_object: bpy.types.Object = None):
+    """Drops cached bone group membership of an armature, or of all armatures if none is specified.
+
+    Rig state snapshots depend on bone groups, so they are dropped as well.
+    """
+    if armature_object is None:
+        _bone_group_index.clear()
+    else:
+        _bone_group_index.pop(armature_object.as_pointer(), None)
+    invalidate_rig_state(armature_object)
+
+
+def get_rig_state(armature_object: bpy.types.Object) -> RigState:
+    """Returns rig state snapshot of an armature, taking a new one only if rig properties have changed."""
+    key = armature_object.as_pointer()
+    state = _rig_states.get(key)
+    if state is None:
+        state = _rig_states[key] = RigState(armature_object)
+    return state
+
+
+def invalidate_rig_state(armature_object: bpy.types.Object = None):
+    """Drops rig state snapshot of an armature, or of all armatures if none is specified.
+
+    Custom properties assigned from Python do not trigger depsgraph updates,
+    so code changing rig properties has to call this explicitly.
+    """
+    if armature_object is None:
+        _rig_states.clear()
+    else:
+        _rig_states.pop(armature_object.as_pointer(), None)
+
+
+def get_depsgraph(context: bpy.types.Context) -> bpy.types.Depsgraph:
+    """Returns evaluated dependency graph of a context.
+
+    Depsgraph update handlers only receive it from Blender 2.81.
+    """
+    if bpy.app.version < (2, 81, 0):
+        return context.depsgraph
+    return context.evaluated_depsgraph_get()
+
+
+def _build_bone_group_index(armature_object: bpy.types.Object) -> typing.Dict[str, typing.Tuple[str, ...]]:
+    bone_groups = armature_object.pose.bone_groups
+    members = [[] for _ in range(len(bone_groups))]
+    for pose_bone in armature_object.pose.bones:
+        if 0 <= pose_bone.bone_group_index < len(members):
+            members[pose_bone.bone_group_index].append(pose_bone.name)
+    return {bone_group.name: tuple(names) for bone_group, names in zip(bone_groups, members)}
+
+
+def _on_bone_groups_changed(*args):
+    invalidate_bone_group_index()
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene: bpy.types.Scene, depsgraph: bpy.types.Depsgraph = None):
+    global _last_operator
+    # rig properties changed from user interface tag owning objects for update
+    if depsgraph is None:
+        depsgraph = get_depsgraph(bpy.context)
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Object):
+            _rig_states.pop(update.id.original.as_pointer(), None)
+    window_manager = bpy.context.window_manager
+    if window_manager is None or len(window_manager.operators) == 0:
+        return
+    operators = window_manager.operators
+    last_operator = operators[-1]
+    if last_operator.as_pointer() != _last_operator:
+        _last_operator = last_operator.as_pointer()
+        if last_operator.bl_idname in BONE_GROUP_OPERATORS:
+            invalidate_bone_group_index()
+
+
+@bpy.app.handlers.persistent
+def _on_frame_change(*args):
+    # rig properties may be animated
+    invalidate_rig_state()
+
+
+@bpy.app.handlers.persistent
+def _on_undo(*args):
+    # undo may reallocate objects, so none of cached pointers can be trusted
+    invalidate_bone_group_index()
+
+
+@bpy.app.handlers.persistent
+def _on_load(*args):
+    global _last_operator
+    _last_operator = None
+    invalidate_bone_group_index()
+    # message bus subscriptions are cleared when a file is loaded
+    _subscribe()
+
+
+def _subscribe():
+    for key in ((bpy.types.PoseBone, 'bone_group'),
+                (bpy.types.PoseBone, 'bone_group_index'),
+                (bpy.types.Pose, 'bone_groups'),
+                (bpy.types.BoneGroup, 'name'),
+                (bpy.types.Bone, 'name')):
+        bpy.msgbus.subscribe_rna(key=key, owner=_msgbus_owner, args=(), notify=_on_bone_groups_changed)
+
+
+def register():
+    _subscribe()
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.frame_change_post.append(_on_frame_change)
+    bpy.app.handlers.undo_post.append(_on_undo)
+    bpy.app.handlers.redo_post.append(_on_undo)
+    bpy.app.handlers.load_post.append(_on_load)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(_on_load)
+    bpy.app.handlers.redo_post.remove(_on_undo)
+    bpy.app.handlers.undo_post.remove(_on_undo)
+    bpy.app.handlers.frame_change_post.remove(_on_frame_change)
+    bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    invalidate_bone_group_index()
@@ -0,0 +1,124 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import math
+import typing
+
+import bpy
+import numpy
+
+from . import bake
+from . import export
+
+
+def get_yaw(rotation: numpy.ndarray) -> numpy.ndarray:
+    """Returns continuous angles of (frames, 3, 3) rotations around Z axis, ignoring tilt around other axes."""
+    quaternion = bake.matrix_to_quaternion(rotation)
+    # twist part of swing-twist decomposition around Z
+    twist = 2 * numpy.arctan2(quaternion[:, 3], quaternion[:, 0])
+    return numpy.unwrap(numpy.arctan2(numpy.sin(twist), numpy.cos(twist)))
+
+
+def get_yaw_matrices(yaw: numpy.ndarray) -> numpy.ndarray:
+    """Returns (frames, 3, 3) rotations around Z axis."""
+    cos, sin = numpy.cos(yaw), numpy.sin(yaw)
+    matrices = numpy.zeros((len(yaw), 3, 3), dtype=numpy.float64)
+    matrices[:, 0, 0] = cos
+    matrices[:, 0, 1] = -sin
+    matrices[:, 1, 0] = sin
+    matrices[:, 1, 1] = cos
+    matrices[:, 2, 2] = 1.0
+    return matrices
+
+
+def get_root_poses(root_rest: numpy.ndarray, pelvis_rest: numpy.ndarray, pelvis_pose: numpy.ndarray,
+                   translation: bool, rotation: bool) -> numpy.ndarray:
+    """Returns (frames, 4, 4) pose matrices of root bone following horizontal motion of pelvis.
+
+    Root moves by horizontal offset of pelvis from its rest position and turns by pelvis yaw
+    relative to its rest rotation.
+    """
+    root_pose = numpy.repeat(root_rest[None], len(pelvis_pose), axis=0)
+    if translation:
+        root_pose[:, :2, 3] += pelvis_pose[:, :2, 3] - pelvis_rest[:2, 3]
+    if rotation:
+        _, pelvis_rotation, _ = bake.decompose(pelvis_pose)
+        _, pelvis_rest_rotation, _ = bake.decompose(pelvis_rest)
+        yaw = get_yaw(pelvis_rotation @ pelvis_rest_rotation.T)
+        root_pose[:, :3, :3] = get_yaw_matrices(yaw) @ root_rest[:3, :3]
+    return root_pose
+
+
+def extract_root_motion(armature_object: bpy.types.Object, action: bpy.types.Action, root_name: str,
+                        pelvis_name: str, translation: bool = True, rotation: bool = True) -> int:
+    """Moves horizontal translation and yaw of pelvis to root bone in an action.
+
+    Armature is evaluated once per frame of the action, root curves and curves of root children
+    keeping their pose are computed for all frames at once and written in bulk.
+    Returns number of written keyframes.
+    """
+    pose_bones = armature_object.pose.bones
+    indices = {pose_bone.name: i for i, pose_bone in enumerate(pose_bones)}
+    root, pelvis = indices[root_name], indices[pelvis_name]
+    frame_start, frame_end = action.frame_range
+    frames = numpy.arange(math.floor(frame_start), math.ceil(frame_end) + 1, dtype=numpy.float64)
+    animation_data = armature_object.animation_data_create()
+    previous_action = animation_data.action
+    animation_data.action = action
+    try:
+        pose = bake.sample_pose_matrices(armature_object, frames)
+    finally:
+        animation_data.action = previous_action
+    rest = numpy.array([pose_bone.bone.matrix_local for pose_bone in pose_bones], dtype=numpy.float64)
+    new_pose = pose.copy()
+    new_pose[:, root] = get_root_poses(rest[root], rest[pelvis], pose[:, pelvis], translation, rotation)
+    # children of root keep their pose if they are animated or lead to pelvis,
+    # other children such as IK bones move along with root
+    parent_indices = bake.get_parent_indices(armature_object)
+    pelvis_chain = set()
+    i = pelvis
+    while i >= 0 and i != root:
+        pelvis_chain.add(i)
+        i = int(parent_indices[i])
+    animated = export.get_action_bone_names(action)
+    bone_indices = [root] + [i for i, parent in enumerate(parent_indices.tolist())
+                             if parent == root and (i in pelvis_chain or pose_bones[i].name in animated)]
+    local = bake.pose_to_local(armature_object, new_pose, bone_indices)
+    return bake.write_local_matrices(armature_object, action, frames, bone_indices, local)
+
+
+def is_descendant(armature_object: bpy.types.Object, bone_name: str, ancestor_name: str) -> bool:
+    bone = armature_object.data.bones[bone_name].parent
+    while bone is not None:
+        if bone.name == ancestor_name:
+            return True
+        bone = bone.parent
+    return False
+
+
+def get_armature_actions(armature_objects: typing.Iterable[bpy.types.Object]) \
+        -> typing.List[typing.Tuple[bpy.types.Object, bpy.types.Action]]:
+    """Returns (armature, action) pairs of deform actions, actions shared by armatures are processed once."""
+    pairs = []
+    seen = set()
+    for armature_object in armature_objects:
+        for action in export.get_deform_actions(armature_object):
+            if action.name not in seen:
+                seen.add(action.name)
+                pairs.append((armature_object, action))
+    return pairs
@@ -16,12 +16,49 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.###
 ###
 
+import os
+import time
+import shutil
+import tempfile
+
 import bpy
 
+from . import jobs
+
 
 class UE4_TOOLS_SCENE_prefs(bpy.types.PropertyGroup):
     """Scene tools preferences."""
-    pass
+    export_path: bpy.props.StringProperty(
+        name='Export path',
+        description='Directory to export unique meshes and their layout to.',
+        default='//',
+        subtype='DIR_PATH'
+    )
+    content_path: bpy.props.StringProperty(
+        name='Content path',
+        description='Path of imported meshes in UE4 project content, referenced by the layout.',
+        default='/Game/Meshes'
+    )
+    layout_format: bpy.props.EnumProperty(
+        name='Layout format',
+        items=[
+            ('JSON', 'JSON', 'Instance transforms grouped by mesh, for spawning instanced static meshes'),
+            ('T3D', 'T3D', 'Static mesh actors, which can be pasted into UE4 level editor'),
+        ],
+        default='JSON'
+    )
+    export_workers: bpy.props.IntProperty(
+        name='Workers',
+        description='Number of background Blender processes used for export. If set to 0, number of CPUs is used.',
+        default=0,
+        min=0
+    )
+    export_incremental: bpy.props.BoolProperty(
+        name='Skip unchanged',
+        description='If set to True, meshes are not exported again if they have not changed '
+                    'since previous export to the same directory.',
+        default=True
+    )
 
 
 class UE4_TOOLS_SCENE_PT_main(bpy.types.Panel):
@@ -36,12 +73,25 @@ class UE4_TOOLS_SCENE_PT_main(bpy.types.Panel):
         layout.use_property_split = True
 
         layout.operator(UE4_TOOLS_SCENE_OT_set_ue4_scale.bl_idname)
+        layout.operator(UE4_TOOLS_SCENE_OT_generate_lods.bl_idname)
+        layout.operator(UE4_TOOLS_SCENE_OT_generate_collision.bl_idname)
+
+        prefs = context.scene.ue4_tools_scene
+        layout.label(text='Layout Export')
+        layout.prop(prefs, 'export_path')
+        layout.prop(prefs, 'content_path')
+        layout.prop(prefs, 'layout_format')
+        layout.prop(prefs, 'export_workers')
+        layout.prop(prefs, 'export_incremental')
+        layout.operator(UE4_TOOLS_SCENE_OT_export_layout.bl_idname, icon='EXPORT')
+        layout.operator(UE4_TOOLS_SCENE_OT_import_layout.bl_idname, icon='IMPORT')
 
 
 class UE4_TOOLS_SCENE_OT_set_ue4_scale(bpy.types.Operator):
     bl_idname = 'ue4_tools_scene.set_ue4_scale'
     bl_label = 'Set UE4 Scale'
     bl_description = 'Set scene scale in Blender to match units in Unreal Engine 4 (1 unit = 1 cm).'
+    bl_options = {'REGISTER', 'UNDO'}
 
     scale_selected: bpy.props.BoolProperty(
         name='Scale selected objects',
@@ -54,20 +104,306 @@ class UE4_TOOLS_SCENE_OT_set_ue4_scale(bpy.types.Operator):
         return context.window_manager.invoke_props_dialog(self)
 
     def execute(self, context: bpy.types.Context):
+        if self.scale_selected and context.mode != 'OBJECT':
+            self.report({'ERROR'}, 'Objects can only be scaled in Object Mode.')
+            return {'CANCELLED'}
         scene: bpy.types.Scene = context.scene
         # update scene unit settings
         scene.unit_settings.system = 'METRIC'
         scene.unit_settings.scale_length = 0.01
-        # update view space clipping settings
-        context.space_data.clip_start = 0.1
-        context.space_data.clip_end = 1000000.0
+        # update view space clipping settings,
+        # there is no 3D view when run from a script in background mode
+        if context.space_data is not None and context.space_data.type == 'VIEW_3D':
+            context.space_data.clip_start = 0.1
+            context.space_data.clip_end = 1000000.0
         # scale selected objects if needed
         if self.scale_selected:
-            bpy.ops.transform.resize(value=(100, 100, 100), center_override=(0, 0, 0))
-            bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+            from . import transform
+            result = transform.scale_objects(context.selected_objects, 100.0)
+            if len(result.shared_data) > 0:
+                self.report({'WARNING'}, 'Data shared with objects that are not selected was not scaled: %s' %
+                            ', '.join(result.shared_data))
+            if len(result.unscaled_animation) > 0:
+                self.report({'WARNING'}, 'Location animation of objects parented to objects that are not selected '
+                                         'was not scaled: %s' % ', '.join(result.unscaled_animation))
         # return success
         return {'FINISHED'}
 
 
+class UE4_TOOLS_SCENE_OT_generate_lods(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_scene.generate_lods'
+    bl_label = 'Generate UE4 LODs'
+    bl_description = 'Build LOD1 to LOD3 of selected meshes, named by UE4 convention. ' \
+                     'Meshes are decimated in background Blender processes.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Generating LODs'
+
+    lod_count: bpy.props.IntProperty(
+        name='LOD count',
+        description='Number of LODs to build in addition to the original mesh (LOD0).',
+        default=3,
+        min=1,
+        max=3
+    )
+    ratios: bpy.props.FloatVectorProperty(
+        name='Triangle ratios',
+        description='Ratio of triangles of the original mesh kept in LOD1, LOD2 and LOD3.',
+        size=3,
+        default=(0.5, 0.25, 0.125),
+        min=0.01,
+        max=1.0
+    )
+    worker_count: bpy.props.IntProperty(
+        name='Workers',
+        description='Number of background Blender processes, 0 to use one per CPU.',
+        default=0,
+        min=0
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def run_job(self, context: bpy.types.Context):
+        from . import lods
+        from . import workers
+        if context.mode != 'OBJECT':
+            self.report({'ERROR'}, 'LODs can only be generated in Object Mode.')
+            return {'CANCELLED'}
+        mesh_objects = [selected_object for selected_object in context.selected_objects
+                        if selected_object.type == 'MESH']
+        if len(mesh_objects) == 0:
+            self.report({'ERROR'}, 'Please, select meshes to generate LODs for')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        output_dir = tempfile.mkdtemp(prefix='ue4_tools_lods_')
+        try:
+            items = lods.get_lod_items(mesh_objects, self.ratios[:self.lod_count], output_dir)
+            pool = workers.WorkerPool('decimate_lods', items, worker_count=self.worker_count)
+            yield from pool.iter_progress()
+            # scene is only changed once all meshes have been decimated, so cancelling leaves it intact
+            self.job_cancellable = False
+            results = [result for result in pool.results if result['status'] == 'done']
+            triangles_before = triangles_after = 0
+            for i, result in enumerate(results):
+                for lod_object in lods.add_lods(bpy.data.objects[result['name']], result['filepath'],
+                                                result['meshes']):
+                    # keep LODs out of the way of the original mesh
+                    if context.view_layer.objects.get(lod_object.name) is not None:
+                        lod_object.hide_set(True)
+                triangles_before += result['triangles'][0] * (len(result['triangles']) - 1)
+                triangles_after += sum(result['triangles'][1:])
+                yield i + 1, len(results)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        for result in pool.failed:
+            print('Could not generate LODs of %s: %s' % (result['name'], result.get('message')))
+        failed = len(items) - len(results)
+        self.report({'INFO'} if failed == 0 else {'WARNING'},
+                    'Generated LODs of %d meshes in %.1f s using %d workers, %d failed, '
+                    'LOD triangles are %.1f%% of the original' % (
+                        len(results), time.perf_counter() - start, pool.worker_count, failed,
+                        100.0 * triangles_after / max(triangles_before, 1)))
+        return {'FINISHED'} if len(results) > 0 else {'CANCELLED'}
+
+
+class UE4_TOOLS_SCENE_OT_generate_collision(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_scene.generate_collision'
+    bl_label = 'Generate UCX Collision'
+    bl_description = 'Build UCX_ convex collision hulls of selected meshes, splitting concave meshes ' \
+                     'into several hulls. Meshes are processed in background Blender processes.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Generating collision'
+
+    max_hulls: bpy.props.IntProperty(
+        name='Max hulls',
+        description='Maximum number of convex hulls per mesh, 1 to build a single hull.',
+        default=4,
+        min=1,
+        max=32
+    )
+    vertex_budget: bpy.props.IntProperty(
+        name='Max hull vertices',
+        description='Maximum number of vertices of a single hull.',
+        default=32,
+        min=4,
+        max=255
+    )
+    worker_count: bpy.props.IntProperty(
+        name='Workers',
+        description='Number of background Blender processes, 0 to use one per CPU.',
+        default=0,
+        min=0
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def run_job(self, context: bpy.types.Context):
+        from . import collision
+        from . import workers
+        if context.mode != 'OBJECT':
+            self.report({'ERROR'}, 'Collision can only be generated in Object Mode.')
+            return {'CANCELLED'}
+        mesh_objects = [selected_object for selected_object in context.selected_objects
+                        if selected_object.type == 'MESH'
+                        and not selected_object.name.startswith(collision.COLLISION_PREFIX)]
+        if len(mesh_objects) == 0:
+            self.report({'ERROR'}, 'Please, select meshes to generate collision for')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        output_dir = tempfile.mkdtemp(prefix='ue4_tools_collision_')
+        try:
+            items = collision.get_collision_items(mesh_objects, output_dir)
+            pool = workers.WorkerPool('build_collision', items, worker_count=self.worker_count,
+                                      options={'max_hulls': self.max_hulls, 'vertex_budget': self.vertex_budget})
+            yield from pool.iter_progress()
+            # scene is only changed once all hulls have been built, so cancelling leaves it intact
+            self.job_cancellable = False
+            results = [result for result in pool.results if result['status'] == 'done']
+            # meshes without any volume keep their previous collision, if any
+            flat = [result['name'] for result in results if len(result['meshes']) == 0]
+            results = [result for result in results if len(result['meshes']) > 0]
+            for i, result in enumerate(results):
+                collision.add_collision(bpy.data.objects[result['name']], result['filepath'], result['meshes'])
+                yield i + 1, len(results)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        for result in pool.failed:
+            print('Could not generate collision of %s: %s' % (result['name'], result.get('message')))
+        failed = len(items) - len(results) - len(flat)
+        hull_count = sum(len(result['meshes']) for result in results)
+        vertex_count = sum(sum(result['vertices']) for result in results)
+        self.report({'INFO'} if failed == 0 and len(flat) == 0 else {'WARNING'},
+                    'Generated %d hulls with %d vertices in total for %d meshes in %.1f s, %d failed' % (
+                        hull_count, vertex_count, len(results), time.perf_counter() - start, failed))
+        if len(flat) > 0:
+            self.report({'WARNING'}, 'No collision for %d flat meshes: %s' % (len(flat), ', '.join(flat)))
+        return {'FINISHED'} if len(results) > 0 else {'CANCELLED'}
+
+
+class UE4_TOOLS_SCENE_OT_export_layout(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_scene.export_layout'
+    bl_label = 'Export instanced layout'
+    bl_description = 'Export every unique mesh among selected objects to its own FBX file once, ' \
+                     'along with transforms of all objects using it.'
+    job_title = 'Exporting layout'
+
+    def run_job(self, context: bpy.types.Context):
+        from . import collision
+        from . import export_cache
+        from . import instancing
+        from . import layout
+        from . import workers
+        prefs = context.scene.ue4_tools_scene
+        if prefs.export_path.startswith('//') and len(bpy.data.filepath) == 0:
+            self.report({'ERROR'}, 'Please, save the file or set an absolute export path')
+            return {'CANCELLED'}
+        mesh_objects = [selected_object for selected_object in context.selected_objects
+                        if selected_object.type == 'MESH'
+                        and not selected_object.name.startswith(collision.COLLISION_PREFIX)]
+        if len(mesh_objects) == 0:
+            self.report({'ERROR'}, 'Please, select meshes to export')
+            return {'CANCELLED'}
+        start = time.perf_counter()
+        # group objects by mesh geometry
+        groups = []
+        yield from instancing.iter_mesh_groups(mesh_objects, groups)
+        export_dir = bpy.path.abspath(prefs.export_path)
+        os.makedirs(export_dir, exist_ok=True)
+        unit_scale = layout.get_unit_scale(context.scene)
+        items = instancing.get_export_items(groups, export_dir)
+        for item in items:
+            # exported files depend on unit scale as well
+            item['hash'] = '%s:%g' % (item['hash'], unit_scale)
+        # export unique meshes, skipping ones which have already been exported
+        manifest = export_cache.ExportManifest(export_dir)
+        if prefs.export_incremental:
+            items = [item for item in items if not manifest.is_up_to_date(item)]
+        failed = 0
+        if len(items) > 0:
+            pool = workers.WorkerPool('export_mesh', items, worker_count=prefs.export_workers)
+            yield from pool.iter_progress()
+            items_by_name = {item['name']: item for item in items}
+            for result in pool.results:
+                if result['status'] == 'done':
+                    manifest.update(items_by_name[result['name']])
+                else:
+                    print('Could not export %s: %s' % (result['name'], result.get('message')))
+                    manifest.discard(items_by_name[result['name']])
+            manifest.save()
+            failed = len(items) - len(pool.results) + len(pool.failed)
+        # write transforms of all objects
+        file_name = bpy.path.display_name_from_filepath(bpy.data.filepath) or 'layout'
+        if prefs.layout_format == 'JSON':
+            layout_path = os.path.join(export_dir, file_name + '.json')
+            instancing.write_json_layout(layout_path, groups, prefs.content_path, unit_scale)
+        else:
+            layout_path = os.path.join(export_dir, file_name + '.t3d')
+            instancing.write_t3d_layout(layout_path, groups, prefs.content_path, unit_scale)
+        self.report({'INFO'} if failed == 0 else {'WARNING'},
+                    '%d objects use %d unique meshes, exported %d meshes in %.1f s, %d failed, layout saved to %s' % (
+                        len(mesh_objects), len(groups), len(items) - failed, time.perf_counter() - start,
+                        failed, layout_path))
+        return {'FINISHED'}
+
+
+class UE4_TOOLS_SCENE_OT_import_layout(bpy.types.Operator, jobs.ModalJob):
+    bl_idname = 'ue4_tools_scene.import_layout'
+    bl_label = 'Import layout'
+    bl_description = 'Import static mesh actors of a JSON or T3D layout as collection instances, ' \
+                     'so that every mesh is stored only once. The file is read piece by piece.'
+    bl_options = {'REGISTER', 'UNDO'}
+    job_title = 'Importing layout'
+
+    filepath: bpy.props.StringProperty(
+        subtype='FILE_PATH'
+    )
+    filter_glob: bpy.props.StringProperty(
+        default='*.json;*.t3d',
+        options={'HIDDEN'}
+    )
+
+    def invoke(self, context: bpy.types.Context, event: bpy.types.Event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def run_job(self, context: bpy.types.Context):
+        from . import layout_import
+        if context.mode != 'OBJECT':
+            self.report({'ERROR'}, 'Layout can only be imported in Object Mode.')
+            return {'CANCELLED'}
+        if not os.path.isfile(self.filepath):
+            self.report({'ERROR'}, 'Layout file %s does not exist' % self.filepath)
+            return {'CANCELLED'}
+        if self.filepath.lower().endswith('.t3d'):
+            iter_layout = layout_import.iter_t3d_layout
+        else:
+            iter_layout = layout_import.iter_json_layout
+        start = time.perf_counter()
+        file_size = max(os.path.getsize(self.filepath), 1)
+        importer = layout_import.LayoutImporter(context, self.filepath)
+        actor_count = 0
+        try:
+            with open(self.filepath, encoding='utf-8', errors='replace') as layout_file:
+                for actor, offset in iter_layout(layout_file):
+                    importer.add(actor)
+                    actor_count += 1
+                    if actor_count % layout_import.BATCH_SIZE == 0:
+                        yield min(offset, file_size), file_size
+            importer.flush()
+        except ValueError as ex:
+            importer.discard()
+            self.report({'ERROR'}, 'Could not read layout: %s' % ex)
+            return {'CANCELLED'}
+        except GeneratorExit:
+            # cancelled, remove actors imported so far
+            importer.discard()
+            raise
+        elapsed = time.perf_counter() - start
+        self.report({'INFO'}, 'Imported %d actors of %d unique meshes in %.1f s, %.0f actors per second' % (
+            actor_count, len(importer.prototypes), elapsed, actor_count / max(elapsed, 1e-6)))
+        return {'FINISHED'}
+
+
 def register():
     bpy.types.Scene.ue4_tools_scene = bpy.props.PointerProperty(type=UE4_TOOLS_SCENE_prefs)
@@ -0,0 +1,151 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+
+
+# shape key offsets of vertices moved less than this are treated as zero
+SHAPE_KEY_TOLERANCE = 1e-4
+# vertex index and 3 float offsets
+SPARSE_VERTEX_BYTES = 16
+DENSE_VERTEX_BYTES = 12
+SIDECAR_VERSION = 2
+
+
+class ShapeKeyStats:
+    """Sparsity and memory cost of a single shape key."""
+    __slots__ = ('name', 'vertex_count', 'moved_vertices', 'max_offset')
+
+    def __init__(self, name: str, vertex_count: int, moved_vertices: int, max_offset: float):
+        self.name = name
+        self.vertex_count = vertex_count
+        self.moved_vertices = moved_vertices
+        self.max_offset = max_offset
+
+    @property
+    def sparsity(self) -> float:
+        """Fraction of vertices not moved by the shape key."""
+        return 1.0 - self.moved_vertices / self.vertex_count if self.vertex_count > 0 else 1.0
+
+    @property
+    def dense_bytes(self) -> int:
+        return self.vertex_count * DENSE_VERTEX_BYTES
+
+    @property
+    def sparse_bytes(self) -> int:
+        return self.moved_vertices * SPARSE_VERTEX_BYTES
+
+
+class SparseDeltas:
+    """Offsets of moved vertices of a single shape key."""
+    __slots__ = ('stats', 'indices', 'offsets')
+
+    def __init__(self, stats: ShapeKeyStats, indices: numpy.ndarray, offsets: numpy.ndarray):
+        self.stats = stats
+        self.indices = indices
+        self.offsets = offsets
+
+
+def read_coordinates(key_block: bpy.types.ShapeKey, vertex_count: int) -> numpy.ndarray:
+    coordinates = numpy.empty(vertex_count * 3, dtype=numpy.float32)
+    key_block.data.foreach_get('co', coordinates)
+    return coordinates.reshape(-1, 3)
+
+
+def get_sparse_deltas(name: str, coordinates: numpy.ndarray, relative_coordinates: numpy.ndarray,
+                      tolerance: float) -> SparseDeltas:
+    offsets = coordinates - relative_coordinates
+    lengths = numpy.sqrt(numpy.einsum('ij,ij->i', offsets, offsets))
+    indices = numpy.flatnonzero(lengths > tolerance).astype(numpy.int32)
+    stats = ShapeKeyStats(name, len(coordinates), len(indices), float(lengths.max()) if len(lengths) > 0 else 0.0)
+    return SparseDeltas(stats, indices, offsets[indices])
+
+
+def iter_shape_key_deltas(mesh_object: bpy.types.Object,
+                          tolerance: float = SHAPE_KEY_TOLERANCE) -> typing.Iterator[SparseDeltas]:
+    """Yields sparse offsets of every shape key of a mesh, except the basis, relative to the basis.
+
+    UE morph targets are offsets from the base mesh, so offsets of keys relative to
+    other keys include offsets of those keys. Statistics still describe what each key
+    changes relative to its own reference key, which is what it contributes in Blender.
+    Coordinates of each key are read in bulk and only offsets of moved vertices are kept,
+    so memory use does not grow with the number of dense keys.
+    """
+    shape_keys = mesh_object.data.shape_keys
+    if shape_keys is None:
+        return
+    key_blocks = shape_keys.key_blocks
+    vertex_count = len(mesh_object.data.vertices)
+    reference_key = shape_keys.reference_key
+    reference = read_coordinates(reference_key, vertex_count)
+    for key_block in key_blocks:
+        if key_block == reference_key:
+            continue
+        coordinates = read_coordinates(key_block, vertex_count)
+        deltas = get_sparse_deltas(key_block.name, coordinates, reference, tolerance)
+        relative_key = key_block.relative_key
+        if relative_key is not None and relative_key != reference_key and relative_key != key_block:
+            relative = read_coordinates(relative_key, vertex_count)
+            deltas.stats = get_sparse_deltas(key_block.name, coordinates, relative, tolerance).stats
+        yield deltas
+
+
+def get_relative_key_names(mesh_object: bpy.types.Object) -> typing.Set[str]:
+    """Returns names of shape keys other keys are relative to."""
+    key_blocks = mesh_object.data.shape_keys.key_blocks
+    return {key_block.relative_key.name for key_block in key_blocks
+            if key_block.relative_key is not None and key_block.relative_key != key_block}
+
+
+def remove_shape_keys(mesh_object: bpy.types.Object, names: typing.Iterable[str]) -> int:
+    """Removes shape keys by name, keeping the basis and keys other keys are relative to.
+
+    Returns number of removed keys.
+    """
+    shape_keys = mesh_object.data.shape_keys
+    kept = get_relative_key_names(mesh_object) | {shape_keys.reference_key.name}
+    removed = 0
+    for name in names:
+        key_block = shape_keys.key_blocks.get(name)
+        if key_block is not None and name not in kept:
+            mesh_object.shape_key_remove(key_block)
+            removed += 1
+    return removed
+
+
+def write_sidecar(filepath: str, vertex_count: int, deltas: typing.Sequence[SparseDeltas]):
+    """Writes sparse offsets of shape keys from the basis to a compressed .npz file.
+
+    Offsets of all keys are concatenated, key i owns entries ranges[i]:ranges[i + 1]
+    of 'indices' and 'offsets' arrays.
+    """
+    ranges = numpy.zeros(len(deltas) + 1, dtype=numpy.int64)
+    ranges[1:] = numpy.cumsum([len(item.indices) for item in deltas])
+    numpy.savez_compressed(
+        filepath,
+        version=numpy.int32(SIDECAR_VERSION),
+        vertex_count=numpy.int32(vertex_count),
+        names=numpy.array([item.stats.name for item in deltas], dtype=numpy.str_),
+        ranges=ranges,
+        indices=numpy.concatenate([item.indices for item in deltas]) if len(deltas) > 0
+        else numpy.zeros(0, dtype=numpy.int32),
+        offsets=numpy.concatenate([item.offsets for item in deltas]) if len(deltas) > 0
+        else numpy.zeros((0, 3), dtype=numpy.float32))
@@ -0,0 +1,122 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+
+from . import export
+
+
+class ReductionResult:
+    """Key counts and maximum error of curves reduced in a single action."""
+    __slots__ = ('keys_before', 'keys_after', 'max_error')
+
+    def __init__(self):
+        self.keys_before = 0
+        self.keys_after = 0
+        self.max_error = 0.0
+
+
+def get_kept_indices(frames: numpy.ndarray, values: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """Returns indices of keys to keep so that linear interpolation between them
+    deviates from every original key by no more than tolerance.
+
+    Uses Ramer-Douglas-Peucker algorithm with vertical distance, each segment
+    is tested with array operations.
+    """
+    count = len(frames)
+    keep = numpy.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, count - 1)]
+    while len(segments) > 0:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        inner_frames = frames[first + 1:last]
+        interpolated = values[first] + (values[last] - values[first]) \
+            * (inner_frames - frames[first]) / (frames[last] - frames[first])
+        errors = numpy.abs(values[first + 1:last] - interpolated)
+        worst = int(numpy.argmax(errors))
+        if errors[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+    return numpy.flatnonzero(keep)
+
+
+def get_channel_tolerance(data_path: str, tolerances: typing.Dict[str, float]) -> typing.Optional[float]:
+    """Returns tolerance for an f-curve by its property: 'location', 'rotation' or 'scale'."""
+    property_name = data_path.rsplit('.', 1)[-1]
+    if property_name.startswith('rotation_'):
+        property_name = 'rotation'
+    return tolerances.get(property_name)
+
+
+def reduce_action(action: bpy.types.Action, bone_names: typing.Set[str],
+                  tolerances: typing.Dict[str, float]) -> ReductionResult:
+    """Removes keys of bone f-curves that can be linearly interpolated within per-channel tolerance.
+
+    Curves are sampled with their own interpolation at every frame and every key,
+    and error is measured against those samples. Kept keys are switched to linear
+    interpolation, so that the error bound holds.
+    """
+    result = ReductionResult()
+    for fcurve in action.fcurves:
+        match = export.POSE_BONE_DATA_PATH.match(fcurve.data_path)
+        if match is None or len(fcurve.modifiers) > 0:
+            continue
+        if match.group(1).replace('\\"', '"').replace('\\\\', '\\') not in bone_names:
+            continue
+        tolerance = get_channel_tolerance(fcurve.data_path, tolerances)
+        key_count = len(fcurve.keyframe_points)
+        if tolerance is None or key_count < 3:
+            continue
+        co = numpy.empty(key_count * 2, dtype=numpy.float32)
+        fcurve.keyframe_points.foreach_get('co', co)
+        key_frames = co[0::2].astype(numpy.float64)
+        frames = numpy.union1d(key_frames, numpy.arange(numpy.ceil(key_frames[0]), key_frames[-1]))
+        values = numpy.array([fcurve.evaluate(frame) for frame in frames.tolist()], dtype=numpy.float64)
+        kept = get_kept_indices(frames, values, tolerance)
+        result.keys_before += key_count
+        if len(kept) >= key_count:
+            # curve is not simpler than its keys when sampled at every frame
+            result.keys_after += key_count
+            continue
+        result.keys_after += len(kept)
+        result.max_error = max(result.max_error, float(numpy.max(numpy.abs(
+            numpy.interp(frames, frames[kept], values[kept]) - values))))
+        _replace_keyframes(fcurve, frames[kept], values[kept])
+    return result
+
+
+def _replace_keyframes(fcurve: bpy.types.FCurve, frames: numpy.ndarray, values: numpy.ndarray):
+    """Replaces keyframes of an f-curve with fewer linear ones in place,
+    keeping settings of the curve itself, such as extrapolation, color and lock."""
+    points = fcurve.keyframe_points
+    while len(points) > len(frames):
+        points.remove(points[-1], fast=True)
+    co = numpy.empty(len(frames) * 2, dtype=numpy.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    points.foreach_set('co', co)
+    for point in points:
+        point.interpolation = 'LINEAR'
+    fcurve.update()
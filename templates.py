@@ -0,0 +1,148 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import typing
+
+import bpy
+import numpy
+
+
+TEMPLATE_FILE_NAME = 'UE4_Mannequinn_Template.blend'
+
+# names of skeleton and mesh objects in template library
+TEMPLATE_OBJECTS = {
+    'DEFAULT': ('UE4_Mannequin_Skeleton', 'SK_Mannequin'),
+    'MOBILE': ('UE4_Mannequin_Skeleton_Mobile', 'SK_Mannequin_Mobile'),
+}
+
+# prefix of in-memory template copies, leading dot hides them from data-block lists
+CACHE_PREFIX = '.UE4Tools_'
+
+# template variant -> names of cached skeleton and mesh objects
+_cache: typing.Dict[str, typing.Tuple[str, str]] = {}
+
+
+def get_template_path() -> str:
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), TEMPLATE_FILE_NAME)
+
+
+def get_template(variant: str) -> typing.Tuple[bpy.types.Object, bpy.types.Object]:
+    """Returns in-memory skeleton and mesh objects of a template variant.
+
+    Objects are appended from template library on first use and are not linked
+    to any scene. They are looked up by name every time, since the cache may be
+    emptied by undo, file load or orphan data purge.
+    """
+    names = _cache.get(variant)
+    if names is not None:
+        skeleton = bpy.data.objects.get(names[0])
+        mesh = bpy.data.objects.get(names[1])
+        if skeleton is not None and mesh is not None:
+            return skeleton, mesh
+    # skeleton and mesh are appended together so that mesh is parented to this very skeleton
+    with bpy.data.libraries.load(get_template_path(), link=False) as (data_from, data_to):
+        data_to.objects = list(TEMPLATE_OBJECTS[variant])
+    skeleton, mesh = data_to.objects
+    for template_object in (skeleton, mesh):
+        template_object.name = CACHE_PREFIX + template_object.name
+        template_object.data.name = template_object.name
+    _cache[variant] = (skeleton.name, mesh.name)
+    return skeleton, mesh
+
+
+def get_footprint(skeleton: bpy.types.Object) -> float:
+    """Returns horizontal size of a skeleton's rest pose, in scene units."""
+    bones = skeleton.data.bones
+    if len(bones) == 0:
+        return 0.0
+    points = numpy.empty(len(bones) * 6, dtype=numpy.float32)
+    bones.foreach_get('head_local', points[:len(bones) * 3])
+    bones.foreach_get('tail_local', points[len(bones) * 3:])
+    points = points.reshape(-1, 3)
+    extent = points.max(axis=0) - points.min(axis=0)
+    return float(max(extent[0], extent[1]) * max(skeleton.scale))
+
+
+def instantiate(skeleton: bpy.types.Object, mesh: typing.Optional[bpy.types.Object],
+                collection: bpy.types.Collection, skeleton_name: str, mesh_name: str,
+                offset: typing.Sequence[float], share_data: bool = False) -> typing.List[bpy.types.Object]:
+    """Creates copies of template skeleton and (optionally) mesh in a collection.
+
+    If share_data is set, new objects use template armature and mesh data instead
+    of their own copies. Pose, actions and custom properties belong to objects,
+    so they are still independent for each rig.
+
+    Returns new objects, skeleton being the first one.
+    """
+    new_skeleton = skeleton.copy()
+    if not share_data:
+        new_skeleton.data = skeleton.data.copy()
+        new_skeleton.data.name = skeleton_name
+    new_skeleton.name = skeleton_name
+    new_skeleton.location = [a + b for a, b in zip(skeleton.location, offset)]
+    collection.objects.link(new_skeleton)
+    new_objects = [new_skeleton]
+    # copies keep referencing template skeleton, e.g. in constraints targeting its own bones
+    remapped_ids = {skeleton: new_skeleton, skeleton.data: new_skeleton.data}
+    copied_ids = [new_skeleton] + ([] if share_data else [new_skeleton.data])
+    if mesh is not None:
+        new_mesh = mesh.copy()
+        if not share_data:
+            new_mesh.data = mesh.data.copy()
+            new_mesh.data.name = mesh_name
+            copied_ids.append(new_mesh.data)
+            if new_mesh.data.shape_keys is not None:
+                copied_ids.append(new_mesh.data.shape_keys)
+        new_mesh.name = mesh_name
+        collection.objects.link(new_mesh)
+        new_objects.append(new_mesh)
+        copied_ids.append(new_mesh)
+    for copied_id in copied_ids:
+        remap_references(copied_id, remapped_ids)
+    return new_objects
+
+
+def remap_references(id_data: bpy.types.ID, remapped_ids: typing.Dict[bpy.types.ID, bpy.types.ID]):
+    """Replaces references of a single data-block to other data-blocks.
+
+    Covers parent, modifier and constraint targets of objects and driver
+    variables of any data-block. Unlike ID.user_remap(), other users of
+    remapped data-blocks, e.g. template objects, are left intact.
+    """
+    if isinstance(id_data, bpy.types.Object):
+        if id_data.parent in remapped_ids:
+            id_data.parent = remapped_ids[id_data.parent]
+        for modifier in id_data.modifiers:
+            if getattr(modifier, 'object', None) in remapped_ids:
+                modifier.object = remapped_ids[modifier.object]
+        constraints = list(id_data.constraints)
+        if id_data.pose is not None:
+            for pose_bone in id_data.pose.bones:
+                constraints.extend(pose_bone.constraints)
+        for constraint in constraints:
+            # armature constraint has a list of targets
+            for target in [constraint] + list(getattr(constraint, 'targets', ())):
+                if getattr(target, 'target', None) in remapped_ids:
+                    target.target = remapped_ids[target.target]
+    if id_data.animation_data is not None:
+        for fcurve in id_data.animation_data.drivers:
+            for variable in fcurve.driver.variables:
+                for target in variable.targets:
+                    if target.id in remapped_ids:
+                        target.id = remapped_ids[target.id]
@@ -0,0 +1,156 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+from mathutils import Matrix
+
+
+# object types which data can be transformed with a matrix
+TRANSFORMABLE_DATA_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META', 'LATTICE', 'ARMATURE'}
+
+# f-curves with values in scene units
+LOCATION_DATA_PATHS = ('location', 'delta_location')
+
+
+class ScaleResult:
+    """Objects which could not be scaled completely."""
+    __slots__ = ('shared_data', 'unscaled_animation')
+
+    def __init__(self):
+        # names of objects which data is also used by objects not being scaled
+        self.shared_data: typing.List[str] = []
+        # names of objects which location animation is not scaled
+        self.unscaled_animation: typing.List[str] = []
+
+
+def scale_objects(objects: typing.Iterable[bpy.types.Object], factor: float) -> ScaleResult:
+    """Scales objects around world origin and applies scale to their data.
+
+    Children of scaled objects are scaled as well, so that hierarchies stay intact.
+    Object scale is not changed: object data, locations, parent inverse matrices,
+    pose bone locations and location animation are scaled instead.
+
+    Data shared with objects which are not scaled is left intact, as well as
+    object location animation of objects whose parent is not scaled, since it is
+    in space of that parent. Such objects are listed in the returned result.
+    """
+    objects = set(objects)
+    for scaled_object in list(objects):
+        objects.update(_iter_descendants(scaled_object))
+    result = ScaleResult()
+    data_users = _get_data_users(objects)
+    scale_matrix = Matrix.Scale(factor, 4)
+    scaled_data = set()
+    # action -> whether its object location f-curves are scaled
+    scaled_actions: typing.Dict[bpy.types.Action, bool] = {}
+    for scaled_object in sorted(objects, key=lambda scaled_object: scaled_object.name):
+        # scale object transformation
+        parent_scaled = scaled_object.parent is None or scaled_object.parent in objects
+        if parent_scaled:
+            scaled_object.location *= factor
+            scaled_object.delta_location *= factor
+            matrix_parent_inverse = scaled_object.matrix_parent_inverse.copy()
+            matrix_parent_inverse.translation *= factor
+            scaled_object.matrix_parent_inverse = matrix_parent_inverse
+        else:
+            # parent is not scaled, so only world space location can be scaled
+            matrix_world = scaled_object.matrix_world.copy()
+            matrix_world.translation *= factor
+            scaled_object.matrix_world = matrix_world
+        # scale object data, shared data is scaled only once
+        data = scaled_object.data
+        if data is not None and data.library is None and data not in scaled_data:
+            if not data_users.get(data, set()) <= objects:
+                result.shared_data.append(scaled_object.name)
+            elif scaled_object.type in TRANSFORMABLE_DATA_TYPES:
+                scaled_data.add(data)
+                if scaled_object.type == 'MESH':
+                    data.transform(scale_matrix, shape_keys=True)
+                else:
+                    data.transform(scale_matrix)
+        if scaled_object.type == 'EMPTY':
+            scaled_object.empty_display_size *= factor
+        # bone locations are relative to bone rest pose, which is also scaled
+        if scaled_object.type == 'ARMATURE':
+            _scale_collection_vectors(scaled_object.pose.bones, 'location', factor)
+        # scale location animation
+        for action in _iter_actions(scaled_object):
+            if action.library is not None:
+                continue
+            if action not in scaled_actions:
+                scaled_actions[action] = parent_scaled
+                _scale_location_fcurves(action, factor, parent_scaled)
+            if not parent_scaled or not scaled_actions[action]:
+                if _has_object_location_fcurves(action) \
+                        and scaled_object.name not in result.unscaled_animation:
+                    result.unscaled_animation.append(scaled_object.name)
+    return result
+
+
+def _get_data_users(objects: typing.Set[bpy.types.Object]) -> typing.Dict[bpy.types.ID, typing.Set[bpy.types.Object]]:
+    """Returns all objects using data of given objects, for data used more than once."""
+    shared_data = {scaled_object.data for scaled_object in objects
+                   if scaled_object.data is not None and scaled_object.data.users > 1}
+    data_users = {}
+    if len(shared_data) > 0:
+        for user in bpy.data.objects:
+            if user.data in shared_data:
+                data_users.setdefault(user.data, set()).add(user)
+    return data_users
+
+
+def _iter_descendants(parent: bpy.types.Object) -> typing.Iterator[bpy.types.Object]:
+    for child in parent.children:
+        yield child
+        yield from _iter_descendants(child)
+
+
+def _iter_actions(animated_object: bpy.types.Object) -> typing.Iterator[bpy.types.Action]:
+    animation_data = animated_object.animation_data
+    if animation_data is None:
+        return
+    if animation_data.action is not None:
+        yield animation_data.action
+    for track in animation_data.nla_tracks:
+        for strip in track.strips:
+            if strip.action is not None:
+                yield strip.action
+
+
+def _has_object_location_fcurves(action: bpy.types.Action) -> bool:
+    return any(fcurve.data_path in LOCATION_DATA_PATHS for fcurve in action.fcurves)
+
+
+def _scale_location_fcurves(action: bpy.types.Action, factor: float, object_location: bool):
+    for fcurve in action.fcurves:
+        if (object_location and fcurve.data_path in LOCATION_DATA_PATHS) or fcurve.data_path.endswith('.location'):
+            for attribute in ('co', 'handle_left', 'handle_right'):
+                # each keyframe point stores (frame, value) pair
+                values = numpy.empty(len(fcurve.keyframe_points) * 2, dtype=numpy.float32)
+                fcurve.keyframe_points.foreach_get(attribute, values)
+                values[1::2] *= factor
+                fcurve.keyframe_points.foreach_set(attribute, values)
+
+
+def _scale_collection_vectors(collection: bpy.types.bpy_prop_collection, attribute: str, factor: float):
+    values = numpy.empty(len(collection) * 3, dtype=numpy.float32)
+    collection.foreach_get(attribute, values)
+    collection.foreach_set(attribute, values * factor)
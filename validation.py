@@ -0,0 +1,157 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+
+from . import rig_cache
+
+
+# maximum number of issues listed in the panel
+PANEL_ISSUE_COUNT = 20
+
+# mesh pointer -> (mesh signature, (severity, message) issues of the mesh)
+_mesh_cache: typing.Dict[int, typing.Tuple[tuple, typing.Tuple[typing.Tuple[str, str], ...]]] = {}
+# last validation report, validation_checks.ValidationReport
+_report = None
+# set when anything has changed since the last validation
+_outdated = False
+
+
+def get_report():
+    return _report
+
+
+def is_outdated() -> bool:
+    return _outdated
+
+
+def validate(scene: bpy.types.Scene):
+    """Validates a scene, reusing results of meshes which have not changed since they were checked."""
+    global _report, _outdated
+    from . import validation_checks
+    _report = validation_checks.validate_scene(scene, scene.ue4_tools_validation.max_bones, _mesh_cache)
+    _outdated = False
+    return _report
+
+
+def invalidate():
+    global _outdated
+    _mesh_cache.clear()
+    _outdated = True
+
+
+class UE4_TOOLS_VALIDATION_prefs(bpy.types.PropertyGroup):
+    """Validation preferences."""
+    max_bones: bpy.props.IntProperty(
+        name='Max bones',
+        description='Maximum number of deform bones of an armature.',
+        default=256,
+        min=1
+    )
+
+
+class UE4_TOOLS_VALIDATION_PT_main(bpy.types.Panel):
+    """Pre-export validation panel."""
+    bl_label = 'Validation'
+    bl_region_type = 'UI'
+    bl_category = 'Unreal Engine 4'
+    bl_space_type = 'VIEW_3D'
+
+    def draw(self, context: bpy.types.Context):
+        layout: bpy.types.UILayout = self.layout
+        layout.use_property_split = True
+        layout.prop(context.scene.ue4_tools_validation, 'max_bones')
+        layout.operator(UE4_TOOLS_VALIDATION_OT_validate.bl_idname, icon='CHECKMARK')
+        report = get_report()
+        if report is None:
+            return
+        layout.label(text='%d errors, %d warnings in %d objects%s' % (
+            report.error_count, report.warning_count, report.object_count, ' (outdated)' if _outdated else ''))
+        column = layout.column(align=True)
+        for issue in report.issues[:PANEL_ISSUE_COUNT]:
+            column.label(text='%s: %s' % (issue.object_name, issue.message),
+                         icon='ERROR' if issue.severity == 'ERROR' else 'INFO')
+        if len(report.issues) > PANEL_ISSUE_COUNT:
+            column.label(text='%d more, see console' % (len(report.issues) - PANEL_ISSUE_COUNT))
+
+
+class UE4_TOOLS_VALIDATION_OT_validate(bpy.types.Operator):
+    bl_idname = 'ue4_tools_validation.validate'
+    bl_label = 'Validate Scene'
+    bl_description = 'Check meshes and armatures of the scene for problems breaking UE4 import: unapplied scale, ' \
+                     'too many bones, n-gons, non-manifold geometry and missing UVs. ' \
+                     'Unchanged meshes are not checked again.'
+
+    def execute(self, context: bpy.types.Context):
+        report = validate(context.scene)
+        if len(report.issues) > PANEL_ISSUE_COUNT:
+            for issue in report.issues:
+                print('%s %s: %s' % (issue.severity, issue.object_name, issue.message))
+        self.report({'INFO'} if report.error_count == 0 else {'WARNING'},
+                    'Found %d errors and %d warnings in %d objects in %.1f ms, %d meshes checked, %d cached' % (
+                        report.error_count, report.warning_count, report.object_count, report.elapsed * 1000,
+                        report.checked_meshes, report.cached_meshes))
+        return {'FINISHED'}
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene: bpy.types.Scene, depsgraph: bpy.types.Depsgraph = None):
+    global _outdated
+    if depsgraph is None:
+        depsgraph = rig_cache.get_depsgraph(bpy.context)
+    for update in depsgraph.updates:
+        updated = update.id.original
+        if isinstance(updated, bpy.types.Mesh):
+            _mesh_cache.pop(updated.as_pointer(), None)
+        elif not isinstance(updated, bpy.types.Object):
+            continue
+        # evaluated geometry of objects changes with armature deformation on every frame,
+        # object updates only affect object checks, which are not cached
+        _outdated = True
+
+
+@bpy.app.handlers.persistent
+def _on_undo(*args):
+    # undo may reallocate meshes, so none of cached pointers can be trusted
+    invalidate()
+
+
+@bpy.app.handlers.persistent
+def _on_load(*args):
+    global _report
+    invalidate()
+    _report = None
+
+
+def register():
+    bpy.types.Scene.ue4_tools_validation = bpy.props.PointerProperty(type=UE4_TOOLS_VALIDATION_prefs)
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.undo_post.append(_on_undo)
+    bpy.app.handlers.redo_post.append(_on_undo)
+    bpy.app.handlers.load_post.append(_on_load)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(_on_load)
+    bpy.app.handlers.redo_post.remove(_on_undo)
+    bpy.app.handlers.undo_post.remove(_on_undo)
+    bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    invalidate()
+    del bpy.types.Scene.ue4_tools_validation
@@ -0,0 +1,137 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import time
+import typing
+
+import bpy
+import numpy
+
+from . import collision
+from . import export
+from . import rig_cache
+
+
+# object scale differing from 1 by more than this is reported as unapplied
+SCALE_TOLERANCE = 1e-4
+ERROR = 'ERROR'
+WARNING = 'WARNING'
+
+
+class Issue:
+    """Problem of an object found by validation."""
+    __slots__ = ('object_name', 'severity', 'message')
+
+    def __init__(self, object_name: str, severity: str, message: str):
+        self.object_name = object_name
+        self.severity = severity
+        self.message = message
+
+
+class ValidationReport:
+    """Issues found in a scene along with statistics of the run."""
+    __slots__ = ('issues', 'object_count', 'checked_meshes', 'cached_meshes', 'elapsed')
+
+    def __init__(self):
+        self.issues: typing.List[Issue] = []
+        self.object_count = 0
+        self.checked_meshes = 0
+        self.cached_meshes = 0
+        self.elapsed = 0.0
+
+    @property
+    def error_count(self) -> int:
+        return sum(1 for issue in self.issues if issue.severity == ERROR)
+
+    @property
+    def warning_count(self) -> int:
+        return sum(1 for issue in self.issues if issue.severity == WARNING)
+
+
+def check_mesh(mesh: bpy.types.Mesh) -> typing.Tuple[typing.Tuple[str, str], ...]:
+    """Returns (severity, message) issues of mesh geometry, read with bulk array reads."""
+    issues = []
+    polygon_count = len(mesh.polygons)
+    if polygon_count == 0:
+        return ()
+    loop_totals = numpy.empty(polygon_count, dtype=numpy.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    ngon_count = int(numpy.count_nonzero(loop_totals > 4))
+    if ngon_count > 0:
+        issues.append((WARNING, '%d n-gons' % ngon_count))
+    edge_indices = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get('edge_index', edge_indices)
+    face_counts = numpy.bincount(edge_indices, minlength=len(mesh.edges))
+    # open boundaries are fine, edges shared by more than two faces or by none are not
+    non_manifold_count = int(numpy.count_nonzero((face_counts > 2) | (face_counts == 0)))
+    if non_manifold_count > 0:
+        issues.append((WARNING, '%d non-manifold edges' % non_manifold_count))
+    if len(mesh.uv_layers) == 0:
+        issues.append((ERROR, 'No UV map'))
+    return tuple(issues)
+
+
+def validate_scene(scene: bpy.types.Scene, max_bones: int,
+                   mesh_cache: typing.Dict[int, typing.Tuple[tuple, typing.Tuple[typing.Tuple[str, str], ...]]]) \
+        -> ValidationReport:
+    """Checks every mesh and armature of a scene.
+
+    Object scales are read for all objects at once, mesh checks are cached in mesh_cache
+    by mesh pointer, so meshes are only checked again once they have changed
+    and their entries have been removed from the cache.
+    """
+    start = time.perf_counter()
+    report = ValidationReport()
+    objects = scene.objects
+    report.object_count = len(objects)
+    scales = numpy.empty(len(objects) * 3, dtype=numpy.float32)
+    objects.foreach_get('scale', scales)
+    unapplied = numpy.any(numpy.abs(scales.reshape(-1, 3) - 1.0) > SCALE_TOLERANCE, axis=1)
+    for scene_object, has_unapplied_scale in zip(objects, unapplied.tolist()):
+        object_type = scene_object.type
+        if object_type not in ('MESH', 'ARMATURE'):
+            continue
+        name = scene_object.name
+        if has_unapplied_scale:
+            report.issues.append(Issue(name, ERROR, 'Unapplied scale %.3g, %.3g, %.3g' % tuple(scene_object.scale)))
+        if object_type == 'ARMATURE':
+            if not rig_cache.get_rig_state(scene_object).has_deform_bones:
+                report.issues.append(Issue(name, WARNING, 'No \'DeformBones\' bone group'))
+                continue
+            bone_count = len(export.get_deform_bone_names(scene_object))
+            if bone_count > max_bones:
+                report.issues.append(Issue(name, ERROR, '%d deform bones, at most %d are allowed' % (bone_count,
+                                                                                                     max_bones)))
+        elif not name.startswith(collision.COLLISION_PREFIX):
+            mesh = scene_object.data
+            key = mesh.as_pointer()
+            # memory of a removed mesh may be reused by a new one
+            signature = (mesh.name, len(mesh.loops), len(mesh.edges), len(mesh.uv_layers))
+            cached = mesh_cache.get(key)
+            if cached is None or cached[0] != signature:
+                mesh_issues = check_mesh(mesh)
+                mesh_cache[key] = (signature, mesh_issues)
+                report.checked_meshes += 1
+            else:
+                mesh_issues = cached[1]
+                report.cached_meshes += 1
+            report.issues.extend(Issue(name, severity, message) for severity, message in mesh_issues)
+    # errors first
+    report.issues.sort(key=lambda issue: issue.severity != ERROR)
+    report.elapsed = time.perf_counter() - start
+    return report
@@ -0,0 +1,212 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import typing
+
+import bpy
+import numpy
+
+
+# weights that round to zero at this number of decimal places are ignored
+WEIGHT_PRECISION = 4
+
+
+class VertexWeights:
+    """Vertex group weights of a single mesh stored as flat arrays.
+
+    Influences are stored vertex by vertex: the first ``counts[0]`` entries
+    of ``groups`` and ``weights`` belong to vertex 0, the next ``counts[1]``
+    entries belong to vertex 1 and so on.
+    """
+    __slots__ = ('counts', 'groups', 'weights')
+
+    def __init__(self, counts: numpy.ndarray, groups: numpy.ndarray, weights: numpy.ndarray):
+        self.counts = counts
+        self.groups = groups
+        self.weights = weights
+
+    @property
+    def vertex_indices(self) -> numpy.ndarray:
+        """Vertex index for each influence."""
+        return numpy.repeat(numpy.arange(len(self.counts), dtype=numpy.int32), self.counts)
+
+
+def read_vertex_weights(mesh: bpy.types.Mesh) -> VertexWeights:
+    """Reads all vertex group influences of a mesh into flat arrays.
+
+    Blender does not expose vertex group weights as a single buffer, so
+    influences are gathered by a Python loop over mesh vertices and their
+    groups. Only processing of the returned arrays is vectorized.
+    """
+    vertex_groups = [vertex.groups for vertex in mesh.vertices]
+    counts = numpy.fromiter(map(len, vertex_groups), dtype=numpy.int32, count=len(vertex_groups))
+    influences = numpy.array([(element.group, element.weight) for groups in vertex_groups for element in groups],
+                             dtype=numpy.float64).reshape(-1, 2)
+    return VertexWeights(counts, influences[:, 0].astype(numpy.int32), influences[:, 1].astype(numpy.float32))
+
+
+def get_weighted_group_indices(vertex_weights: VertexWeights, precision: int = WEIGHT_PRECISION) -> numpy.ndarray:
+    """Returns sorted indices of vertex groups having at least one non-zero weight."""
+    non_zero = numpy.round(vertex_weights.weights.astype(numpy.float64), precision) > 0
+    return numpy.unique(vertex_weights.groups[non_zero])
+
+
+def get_weighted_vertex_group_names(mesh_objects: typing.Iterable[bpy.types.Object]) -> typing.Set[str]:
+    """Returns names of vertex groups having non-zero weights in any of the meshes."""
+    names = set()
+    for _ in iter_weighted_vertex_group_names(list(mesh_objects), names):
+        pass
+    return names
+
+
+def iter_weighted_vertex_group_names(mesh_objects: typing.Sequence[bpy.types.Object],
+                                     names: typing.Set[str]) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Adds names of vertex groups having non-zero weights in any of the meshes to a set.
+
+    Yields (done, total) progress after each mesh.
+    """
+    for i, mesh_object in enumerate(mesh_objects):
+        group_names = [vertex_group.name for vertex_group in mesh_object.vertex_groups]
+        group_indices = get_weighted_group_indices(read_vertex_weights(mesh_object.data))
+        # vertices may still reference groups that have been removed
+        names.update(group_names[index] for index in group_indices.tolist() if index < len(group_names))
+        yield i + 1, len(mesh_objects)
+
+
+class OptimizationResult:
+    """Statistics of weight optimization over several meshes."""
+    __slots__ = ('influences_before', 'influences_after', 'vertices_over_limit', 'removed_groups')
+
+    def __init__(self):
+        self.influences_before = 0
+        self.influences_after = 0
+        self.vertices_over_limit = 0
+        self.removed_groups = 0
+
+
+def get_deform_influences(vertex_weights: VertexWeights, deform_groups: numpy.ndarray,
+                          precision: int = WEIGHT_PRECISION) -> numpy.ndarray:
+    """Returns mask of influences of deform groups with weights not rounding to zero, the ones exported to UE4."""
+    groups = vertex_weights.groups
+    # vertices may still reference groups that have been removed
+    valid = groups < len(deform_groups)
+    is_deform = valid & deform_groups[numpy.where(valid, groups, 0)]
+    return is_deform & (numpy.round(vertex_weights.weights.astype(numpy.float64), precision) > 0)
+
+
+def optimize_weights(vertex_weights: VertexWeights, deform_groups: numpy.ndarray, max_influences: int,
+                     prune_groups: bool, precision: int = WEIGHT_PRECISION) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+    """Limits deform influences per vertex and normalizes their weights.
+
+    deform_groups tells for each vertex group index whether it deforms the mesh.
+    Influences of other groups are removed if prune_groups is set and left intact
+    otherwise. Influences rounding to zero are always removed.
+
+    Returns new weight of every influence and mask of influences to keep,
+    both in the order of vertex_weights.
+    """
+    vertex_indices = vertex_weights.vertex_indices
+    groups = vertex_weights.groups
+    weights = vertex_weights.weights.astype(numpy.float64)
+    valid = groups < len(deform_groups)
+    is_deform = valid & deform_groups[numpy.where(valid, groups, 0)]
+    candidate = get_deform_influences(vertex_weights, deform_groups, precision)
+    # rank candidate influences of each vertex by descending weight
+    order = numpy.lexsort((-weights, ~candidate, vertex_indices))
+    sorted_vertices = vertex_indices[order]
+    rank = numpy.arange(len(order)) - numpy.searchsorted(sorted_vertices, sorted_vertices, side='left')
+    keep_deform = numpy.empty(len(order), dtype=bool)
+    keep_deform[order] = candidate[order] & (rank < max_influences)
+    # normalize kept deform weights
+    new_weights = numpy.where(keep_deform, weights, 0.0)
+    sums = numpy.bincount(vertex_indices, new_weights, minlength=len(vertex_weights.counts))
+    new_weights = numpy.where(keep_deform, new_weights / numpy.maximum(sums, 1e-12)[vertex_indices], new_weights)
+    if prune_groups:
+        keep = keep_deform
+    else:
+        keep = keep_deform | (valid & ~is_deform)
+        new_weights = numpy.where(is_deform, new_weights, weights)
+    return new_weights.astype(numpy.float32), keep
+
+
+def write_vertex_weights(mesh_object: bpy.types.Object, vertex_weights: VertexWeights,
+                         new_weights: numpy.ndarray, keep: numpy.ndarray):
+    """Writes optimized weights back to a mesh read with read_vertex_weights().
+
+    Only changed weights are assigned, removed influences are removed group by group.
+    """
+    changed = numpy.flatnonzero(keep & (numpy.abs(new_weights - vertex_weights.weights) > 1e-6))
+    if len(changed) > 0:
+        elements = [element for vertex in mesh_object.data.vertices for element in vertex.groups]
+        for i, weight in zip(changed.tolist(), new_weights[changed].tolist()):
+            elements[i].weight = weight
+    removed = numpy.flatnonzero(~keep & (vertex_weights.groups < len(mesh_object.vertex_groups)))
+    removed = removed[numpy.argsort(vertex_weights.groups[removed], kind='stable')]
+    removed_groups, starts = numpy.unique(vertex_weights.groups[removed], return_index=True)
+    vertex_indices = vertex_weights.vertex_indices[removed]
+    for group, group_vertices in zip(removed_groups.tolist(), numpy.split(vertex_indices, starts[1:])):
+        mesh_object.vertex_groups[group].remove(group_vertices.tolist())
+
+
+def optimize_mesh_weights(mesh_objects: typing.Iterable[typing.Tuple[bpy.types.Object, typing.Set[str]]],
+                          max_influences: int, prune_groups: bool) -> OptimizationResult:
+    """Optimizes weights of meshes, each given with names of bones deforming it."""
+    result = OptimizationResult()
+    for _ in iter_optimize_mesh_weights(list(mesh_objects), max_influences, prune_groups, result):
+        pass
+    return result
+
+
+def iter_optimize_mesh_weights(mesh_objects: typing.Sequence[typing.Tuple[bpy.types.Object, typing.Set[str]]],
+                               max_influences: int, prune_groups: bool,
+                               result: OptimizationResult) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Optimizes weights of meshes, each given with names of bones deforming it, collecting statistics to result.
+
+    All meshes are read and optimized before any of them is written. Yields
+    (done, total) progress after each optimized and each written mesh. Meshes
+    given without any deform bones are skipped, as all their weights would be removed.
+    """
+    mesh_objects = [(mesh_object, deform_bone_names) for mesh_object, deform_bone_names in mesh_objects
+                    if len(deform_bone_names) > 0]
+    total = len(mesh_objects) * 2
+    pending = []
+    for mesh_object, deform_bone_names in mesh_objects:
+        deform_groups = numpy.array([vertex_group.name in deform_bone_names
+                                     for vertex_group in mesh_object.vertex_groups], dtype=bool)
+        vertex_weights = read_vertex_weights(mesh_object.data)
+        new_weights, keep = optimize_weights(vertex_weights, deform_groups, max_influences, prune_groups)
+        pending.append((mesh_object, deform_groups, vertex_weights, new_weights, keep))
+        yield len(pending), total
+    for i, (mesh_object, deform_groups, vertex_weights, new_weights, keep) in enumerate(pending):
+        write_vertex_weights(mesh_object, vertex_weights, new_weights, keep)
+        result.influences_before += len(keep)
+        result.influences_after += int(numpy.count_nonzero(keep))
+        # only influences exported to UE4 count towards the limit
+        exported = get_deform_influences(vertex_weights, deform_groups)
+        deform_counts = numpy.bincount(vertex_weights.vertex_indices[exported], minlength=len(vertex_weights.counts))
+        result.vertices_over_limit += int(numpy.count_nonzero(deform_counts > max_influences))
+        if prune_groups:
+            used = numpy.zeros(len(deform_groups), dtype=bool)
+            kept_groups = vertex_weights.groups[keep]
+            used[kept_groups[kept_groups < len(used)]] = True
+            # remove groups from the last one, so that indices of remaining groups stay valid
+            for group in reversed(numpy.flatnonzero(~(used & deform_groups)).tolist()):
+                mesh_object.vertex_groups.remove(mesh_object.vertex_groups[group])
+                result.removed_groups += 1
+        mesh_object.data.update()
+        yield len(pending) + i + 1, total
@@ -0,0 +1,75 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+# Entry point of background Blender processes started by workers.WorkerPool:
+#
+#     blender -b --factory-startup file.blend --python worker.py -- task.json
+
+import os
+import sys
+import json
+import importlib
+import traceback
+import importlib.util
+
+# task name -> (addon module, function called for every item)
+TASKS = {
+    'export_action': ('export', 'export_action'),
+    'decimate_lods': ('lods', 'decimate_lods'),
+    'build_collision': ('collision', 'build_collision'),
+    'export_mesh': ('instancing', 'export_mesh'),
+}
+
+
+def load_addon():
+    """Imports addon package containing this script without registering it."""
+    addon_dir = os.path.dirname(os.path.realpath(__file__))
+    name = os.path.basename(addon_dir)
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(addon_dir, '__init__.py'),
+                                                      submodule_search_locations=[addon_dir])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def report(message_prefix: str, result: dict):
+    print(message_prefix + json.dumps(result), flush=True)
+
+
+def main():
+    with open(sys.argv[sys.argv.index('--') + 1]) as task_file:
+        task = json.load(task_file)
+    addon = load_addon()
+    # results are told apart from other output by the prefix the pool reads them with
+    message_prefix = importlib.import_module('.workers', addon.__name__).MESSAGE_PREFIX
+    module_name, function_name = TASKS[task['task']]
+    function = getattr(importlib.import_module('.' + module_name, addon.__name__), function_name)
+    for item in task['items']:
+        try:
+            result = function(item, task['options']) or {}
+            report(message_prefix, dict(result, name=item['name'], status='done'))
+        except Exception as e:
+            traceback.print_exc()
+            report(message_prefix, {'name': item['name'], 'status': 'error', 'message': str(e)})
+
+
+if __name__ == '__main__':
+    main()
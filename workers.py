@@ -0,0 +1,152 @@
+###
+# Blender UE4 Tools
+# Copyright (C) 2019 Vitaly Ogoltsov
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.###
+###
+
+import os
+import json
+import queue
+import shutil
+import typing
+import tempfile
+import threading
+import subprocess
+
+import bpy
+
+
+# worker output lines starting with this prefix carry task results
+MESSAGE_PREFIX = 'UE4TOOLS:'
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'worker.py')
+
+
+class WorkerPool:
+    """Runs a task over a list of items in background Blender processes.
+
+    Current file is saved to a temporary copy, which is opened by every worker,
+    and items are split evenly between workers. Workers report each processed
+    item on their standard output, which is read by a thread per worker,
+    so polling the pool never blocks.
+    """
+
+    def __init__(self, task: str, items: typing.List[dict], options: dict = None, worker_count: int = 0):
+        self.task = task
+        self.items = items
+        self.options = options or {}
+        self.worker_count = max(1, min(worker_count or os.cpu_count() or 1, len(items)))
+        self.processes: typing.List[subprocess.Popen] = []
+        self.results: typing.List[dict] = []
+        self.temp_dir: typing.Optional[str] = None
+        self._messages: queue.Queue = queue.Queue()
+        self._readers: typing.List[threading.Thread] = []
+
+    @property
+    def completed(self) -> int:
+        return len(self.results)
+
+    @property
+    def failed(self) -> typing.List[dict]:
+        return [result for result in self.results if result.get('status') != 'done']
+
+    @property
+    def done(self) -> bool:
+        return all(process.poll() is not None for process in self.processes) \
+               and all(not reader.is_alive() for reader in self._readers) \
+               and self._messages.empty()
+
+    def start(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='ue4_tools_')
+        blend_path = os.path.join(self.temp_dir, 'workers.blend')
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+        for n in range(self.worker_count):
+            task_path = os.path.join(self.temp_dir, 'task_%d.json' % n)
+            with open(task_path, 'w') as task_file:
+                json.dump({
+                    'task': self.task,
+                    'items': self.items[n::self.worker_count],
+                    'options': self.options,
+                }, task_file)
+            process = subprocess.Popen([bpy.app.binary_path, '-b', '--factory-startup', blend_path,
+                                        '--python', WORKER_SCRIPT, '--', task_path],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       universal_newlines=True)
+            reader = threading.Thread(target=self.__read_output, args=(process,), daemon=True)
+            reader.start()
+            self.processes.append(process)
+            self._readers.append(reader)
+
+    def poll(self, timeout: float = 0) -> typing.List[dict]:
+        """Returns results reported by workers since previous call.
+
+        If timeout is given, waits up to that many seconds for the first result.
+        """
+        results = []
+        if timeout > 0:
+            try:
+                results.append(self._messages.get(timeout=timeout))
+            except queue.Empty:
+                pass
+        while True:
+            try:
+                results.append(self._messages.get_nowait())
+            except queue.Empty:
+                break
+        self.results.extend(results)
+        return results
+
+    def wait(self):
+        """Blocks until all workers exit."""
+        for process in self.processes:
+            process.wait()
+        for reader in self._readers:
+            reader.join()
+        self.poll()
+
+    def cancel(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.terminate()
+        self.wait()
+
+    def iter_progress(self) -> typing.Iterator[typing.Tuple[int, int]]:
+        """Starts the pool and yields (completed, total) progress until all workers exit.
+
+        Meant to be run as part of jobs.ModalJob: workers are terminated
+        if the job is cancelled, and temporary files are removed in any case.
+        """
+        self.start()
+        try:
+            while not self.done:
+                self.poll(timeout=0.02)
+                yield self.completed, len(self.items)
+            self.poll()
+        except GeneratorExit:
+            self.cancel()
+            raise
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def __read_output(self, process: subprocess.Popen):
+        for line in process.stdout:
+            if line.startswith(MESSAGE_PREFIX):
+                self._messages.put(json.loads(line[len(MESSAGE_PREFIX):]))
+        process.stdout.close()